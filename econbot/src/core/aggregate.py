@@ -0,0 +1,275 @@
+import pandas as pd
+
+from src.utils.database import execute_queries, get_data, upsert_table
+from src.utils.countries import get_rgdp_country
+from src.utils.exceptions import TableExistenceError
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Upper bounds of the magnitude histogram buckets; the last bucket is open-ended
+MAGNITUDE_BUCKETS = [6, 7, 8]
+
+# Pattern extracting the year from the earthquake dates (MM/DD/YYYY or ISO 8601)
+YEAR_PATTERN = '[0-9]{4}'
+
+# Fields the queries below read from the input tables
+QUAKE_FIELDS = ['id', 'date', 'magnitude', 'country']
+RGDP_FIELDS = ['Country', 'Year', 'rGDP']
+
+
+"""
+Country-year fact table
+"""
+def refresh_fact_table(quake_table_name, rgdp_table_name, fact_table_name, engine):
+    """
+    Brings the country-year fact table up to date with the geocoded earthquakes and the rGDP data.
+    Quakes are folded in incrementally (only new quakes, or quakes whose country, year or magnitude
+    changed since they were counted, touch their country-years) and rGDP values are only rewritten
+    for country-years whose value or growth actually changed, so repeated runs over mostly unchanged
+    inputs do little work.
+
+    :param quake_table_name: (str) -> the Revgeocoder output table (fields: id, date, magnitude, country)
+    :param rgdp_table_name: (str) -> the rGDP table (fields: Country, Year, rGDP)
+    :param fact_table_name: (str) -> the fact table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int, int) -> the number of new or changed quakes counted, the number of country-years whose rGDP changed
+    """
+
+    LOGGER.info(f'Refreshing {fact_table_name}...')
+    print(f'Refreshing {fact_table_name}...', flush=True)
+
+    check_fields(quake_table_name, QUAKE_FIELDS, engine)
+    check_fields(rgdp_table_name, RGDP_FIELDS, engine)
+
+    create_fact_table(fact_table_name, engine)
+    n_quakes = apply_quakes(quake_table_name, fact_table_name, engine)
+    update_country_aliases(quake_table_name, fact_table_name, engine)
+    n_rgdp = apply_rgdp(rgdp_table_name, fact_table_name, engine)
+
+    LOGGER.info(f'Counted {n_quakes} new or changed quakes and updated rGDP for {n_rgdp} country-years in {fact_table_name}')
+    print(f'Counted {n_quakes} new or changed quakes and updated rGDP for {n_rgdp} country-years in {fact_table_name}', flush=True)
+
+    return n_quakes, n_rgdp
+
+
+def check_fields(table_name, fields, engine):
+    """
+    Checks that an input table exists and holds the fields the fact table is built from, so a
+    table of another shape (e.g. Revgeocoder output of a Parquet input, or renamed fields) is
+    reported by name instead of failing inside the queries.
+
+    :param table_name: (str) -> the table name
+    :param fields: (list<str>) -> the required fields
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: None
+    """
+
+    columns = get_data(
+        'SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :table_name;',
+        engine, params={'table_name': table_name})['column_name'].tolist()
+
+    if not columns:
+        LOGGER.error(f'Table {table_name} does not exist')
+        raise TableExistenceError(f'Table {table_name} does not exist')
+
+    missing_fields = [field for field in fields if field not in columns]
+    if missing_fields:
+        LOGGER.error(f'{table_name} is missing required fields {missing_fields} (it has {columns})')
+        raise ValueError(f'{table_name} is missing required fields {missing_fields} (it has {columns})')
+
+
+def create_fact_table(fact_table_name, engine):
+    """
+    Creates the fact table and the ledger of counted quakes if they do not exist. The ledger records
+    the country-year and magnitude each quake was counted under, so a quake that changes (e.g. is
+    re-geocoded to another country) can be taken out of the country-year it was counted in.
+
+    :param fact_table_name: (str) -> the fact table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: None
+    """
+
+    bucket_definitions = ''.join(f'{name} BIGINT NOT NULL DEFAULT 0, ' for name, _ in _get_buckets())
+
+    execute_queries([
+        f'''
+        CREATE TABLE IF NOT EXISTS {fact_table_name} (
+            country TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            quake_count BIGINT NOT NULL DEFAULT 0,
+            max_magnitude DOUBLE PRECISION,
+            total_magnitude DOUBLE PRECISION NOT NULL DEFAULT 0,
+            {bucket_definitions}
+            rgdp DOUBLE PRECISION,
+            rgdp_growth DOUBLE PRECISION,
+            PRIMARY KEY (country, year)
+        );
+        ''',
+        f'CREATE TABLE IF NOT EXISTS {fact_table_name}_applied (id TEXT PRIMARY KEY, country TEXT, year INTEGER, magnitude DOUBLE PRECISION);',
+        # Ledgers created before the country-year was recorded only hold IDs
+        f'ALTER TABLE {fact_table_name}_applied ADD COLUMN IF NOT EXISTS country TEXT, ADD COLUMN IF NOT EXISTS year INTEGER, ADD COLUMN IF NOT EXISTS magnitude DOUBLE PRECISION;',
+        f'CREATE INDEX IF NOT EXISTS {fact_table_name}_applied_cell_idx ON {fact_table_name}_applied (country, year);'
+    ], engine)
+
+
+def apply_quakes(quake_table_name, fact_table_name, engine):
+    """
+    Brings the quake counters up to date. Quakes that are new, or whose country, year or magnitude
+    differ from what the ledger recorded when they were counted, form the delta; counted quakes that
+    changed or no longer have a location or a parsable date are withdrawn from the ledger. Only the
+    country-years the delta and the withdrawn quakes belong to are recounted, from the ledger, in
+    the same transaction.
+
+    :param quake_table_name: (str) -> the Revgeocoder output table
+    :param fact_table_name: (str) -> the fact table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int) -> the number of new or changed quakes counted
+    """
+
+    buckets = _get_buckets()
+    bucket_names = ''.join(f', {name}' for name, _ in buckets)
+    bucket_resets = ''.join(f', {name} = 0' for name, _ in buckets)
+    bucket_counts = ''.join(f', count(*) FILTER (WHERE {condition})' for _, condition in buckets)
+    bucket_updates = ''.join(f', {name} = EXCLUDED.{name}' for name, _ in buckets)
+
+    rowcounts = execute_queries([
+        # Ledgers that only hold IDs cannot tell where their quakes were counted, so they are recounted once
+        f'''
+        UPDATE {fact_table_name}
+        SET quake_count = 0, max_magnitude = NULL, total_magnitude = 0{bucket_resets}
+        WHERE EXISTS (SELECT 1 FROM {fact_table_name}_applied WHERE country IS NULL);
+        ''',
+        f'DELETE FROM {fact_table_name}_applied WHERE EXISTS (SELECT 1 FROM {fact_table_name}_applied l WHERE l.country IS NULL);',
+        # Quakes that are new or changed since they were counted (rows without a location or a parsable date wait for a later run)
+        f'''
+        CREATE TEMP TABLE {fact_table_name}_delta ON COMMIT DROP AS
+        SELECT d.id, d.country, d.year, d.magnitude
+        FROM (
+            SELECT DISTINCT ON (id) id, country, year, magnitude
+            FROM (
+                SELECT q."id"::text AS id,
+                       q."country" AS country,
+                       substring(q."date"::text FROM '{YEAR_PATTERN}')::int AS year,
+                       q."magnitude"::double precision AS magnitude
+                FROM {quake_table_name} q
+                WHERE q."country" IS NOT NULL
+            ) q
+            WHERE year IS NOT NULL
+        ) d
+        LEFT JOIN {fact_table_name}_applied a ON a.id = d.id
+        WHERE a.id IS NULL
+           OR (a.country, a.year, a.magnitude) IS DISTINCT FROM (d.country, d.year, d.magnitude);
+        ''',
+        # Counted quakes that changed or lost their location or date
+        f'''
+        CREATE TEMP TABLE {fact_table_name}_withdrawn ON COMMIT DROP AS
+        SELECT a.id, a.country, a.year
+        FROM {fact_table_name}_applied a
+        WHERE EXISTS (SELECT 1 FROM {fact_table_name}_delta d WHERE d.id = a.id)
+           OR NOT EXISTS (SELECT 1 FROM {quake_table_name} q
+                          WHERE q."id"::text = a.id
+                            AND q."country" IS NOT NULL
+                            AND substring(q."date"::text FROM '{YEAR_PATTERN}') IS NOT NULL);
+        ''',
+        # Record where the quakes are counted now
+        f'DELETE FROM {fact_table_name}_applied a USING {fact_table_name}_withdrawn w WHERE a.id = w.id;',
+        f'INSERT INTO {fact_table_name}_applied (id, country, year, magnitude) SELECT id, country, year, magnitude FROM {fact_table_name}_delta;',
+        # Recount the country-years the quakes left or joined
+        f'''
+        INSERT INTO {fact_table_name} AS f (country, year, quake_count, max_magnitude, total_magnitude{bucket_names})
+        SELECT c.country, c.year, count(a.id), max(magnitude), coalesce(sum(magnitude), 0){bucket_counts}
+        FROM (
+            SELECT country, year FROM {fact_table_name}_delta
+            UNION
+            SELECT country, year FROM {fact_table_name}_withdrawn
+        ) c
+        LEFT JOIN {fact_table_name}_applied a ON a.country = c.country AND a.year = c.year
+        GROUP BY c.country, c.year
+        ON CONFLICT (country, year) DO UPDATE
+        SET quake_count = EXCLUDED.quake_count,
+            max_magnitude = EXCLUDED.max_magnitude,
+            total_magnitude = EXCLUDED.total_magnitude{bucket_updates};
+        '''
+    ], engine)
+
+    n_withdrawn, n_counted = rowcounts[4], rowcounts[5]
+    if n_withdrawn:
+        LOGGER.info(f'Withdrew {n_withdrawn} changed or unlocated quakes from {fact_table_name}')
+
+    return n_counted
+
+
+def update_country_aliases(quake_table_name, fact_table_name, engine):
+    """
+    Maps the country names of the geocoded quakes onto the country names of the rGDP data,
+    which follow the FRED country codes, and merges the mapping into {fact_table_name}_countries.
+
+    :param quake_table_name: (str) -> the Revgeocoder output table
+    :param fact_table_name: (str) -> the fact table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int) -> the number of new or changed mappings
+    """
+
+    countries = get_data(f'SELECT DISTINCT "country" FROM {quake_table_name} WHERE "country" IS NOT NULL;', engine)['country']
+
+    rgdp_countries = [get_rgdp_country(c) for c in countries]
+
+    aliases = pd.DataFrame({'country': pd.Series(countries, dtype=object),
+                            'rgdp_country': pd.Series(rgdp_countries, dtype=object)})
+
+    return upsert_table(aliases, table_name=f'{fact_table_name}_countries', key_fields=['country'], engine=engine)
+
+
+def apply_rgdp(rgdp_table_name, fact_table_name, engine):
+    """
+    Joins rGDP and its year-over-year growth onto the fact table. Every rGDP year of a quake
+    country gets a row, so years without quakes show up with zero counts. Growth is only
+    computed between consecutive years.
+
+    :param rgdp_table_name: (str) -> the rGDP table
+    :param fact_table_name: (str) -> the fact table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int) -> the number of country-years whose rGDP was inserted or changed
+    """
+
+    return execute_queries([
+        f'''
+        INSERT INTO {fact_table_name} AS f (country, year, rgdp, rgdp_growth)
+        SELECT country, year, rgdp,
+               CASE WHEN lag(year) OVER w = year - 1 THEN rgdp / NULLIF(lag(rgdp) OVER w, 0) - 1 END
+        FROM (
+            SELECT a.country, r."Year"::int AS year, r."rGDP"::double precision AS rgdp
+            FROM {rgdp_table_name} r
+            JOIN {fact_table_name}_countries a ON a.rgdp_country = r."Country"
+        ) r
+        WINDOW w AS (PARTITION BY country ORDER BY year)
+        ON CONFLICT (country, year) DO UPDATE
+        SET rgdp = EXCLUDED.rgdp,
+            rgdp_growth = EXCLUDED.rgdp_growth
+        WHERE (f.rgdp, f.rgdp_growth) IS DISTINCT FROM (EXCLUDED.rgdp, EXCLUDED.rgdp_growth);
+        '''
+    ], engine)[0]
+
+
+def _get_buckets():
+    """
+    Builds the magnitude histogram columns from MAGNITUDE_BUCKETS.
+
+    :return: (list<(str, str)>) -> the column names and their SQL conditions
+    """
+
+    buckets = [(f'magnitude_lt_{MAGNITUDE_BUCKETS[0]}', f'magnitude < {MAGNITUDE_BUCKETS[0]}')]
+    for lo, hi in zip(MAGNITUDE_BUCKETS[:-1], MAGNITUDE_BUCKETS[1:]):
+        buckets.append((f'magnitude_{lo}_{hi}', f'magnitude >= {lo} AND magnitude < {hi}'))
+    buckets.append((f'magnitude_ge_{MAGNITUDE_BUCKETS[-1]}', f'magnitude >= {MAGNITUDE_BUCKETS[-1]}'))
+
+    return buckets
@@ -3,10 +3,29 @@ import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+from threading import Lock
+from queue import Queue
+
+from src.utils.fswatch import wait_for_file
+from src.utils.database import upsert_table
+from src.utils.cache import SeriesCache
+from src import INTERNAL_DATA_DIR, TOP_DIR
 
 import logging
+import tempfile
+import shutil
 import time
 import os
 
@@ -15,126 +34,451 @@ import os
 """
 Constants
 """
-BASE_URL_RGDP = 'https://fred.stlouisfed.org/searchresults/?st=gdp&t={}&ob=sr&od=desc'
-DATA_INTERNAL_DIR = '../../data/internal'
-DATA_INPUT_DIR = '../../data/user/input'
-DATA_OUTPUT_DIR = '../../data/user/output'
-DATA_CONFIG_DIR = '../../data/user/config'
+# FRED site, overridden by FRED_URL (e.g. a local stand-in server). The environment is read
+# on every call rather than at import, since main loads the .env file after importing this module
+DEFAULT_FRED_URL = 'https://fred.stlouisfed.org'
+SEARCH_PATH_RGDP = '/searchresults/?st=gdp&t={}&ob=sr&od=desc'
+FRED_CSV_PATH = '/graph/fredgraph.csv?id={}'
+DATA_INTERNAL_DIR = INTERNAL_DATA_DIR
+DATA_INPUT_DIR = os.path.join(TOP_DIR, 'data/user/input')
+DATA_OUTPUT_DIR = os.path.join(TOP_DIR, 'data/user/output')
+DATA_CONFIG_DIR = os.path.join(TOP_DIR, 'data/user/config')
+
+# Number of browsers scraping concurrently, overridden by N_DRIVERS
+DEFAULT_N_DRIVERS = 4
+
+# Maximum time (s) to wait for a page element or a download
+PAGE_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 60
+
+# Series title keywords, from highest to lowest data quality
+KEYWORDS_HIERARCHY = ['Real GDP at Constant National Prices', 'Real Gross Domestic Product for',' Gross Domestic Product for', 'GDP']
+
+# Number of concurrent HTTP requests and maximum request rate (requests/s) of the browserless fetcher
+# (overridden by N_REQUESTS and REQUESTS_PER_SECOND, read on every call like FRED_URL)
+DEFAULT_N_REQUESTS = 8
+DEFAULT_REQUESTS_PER_SECOND = 5
+
+# Maximum number of retries (with exponential backoff) per HTTP request
+MAX_RETRIES = 5
+
+# Series metadata cache used for incremental refreshes
+SERIES_CACHE_FPATH = os.path.join(DATA_INTERNAL_DIR, 'series_cache.sqlite')
 
+# Number of rGDP files parsed concurrently during consolidation
+N_PARSERS = os.cpu_count() or 4
 
-def get_driver():
+
+def get_fred_url():
+    """
+    Reads the FRED site URL from the environment.
+
+    :return: (str) -> the FRED_URL variable, DEFAULT_FRED_URL if unset
+    """
+
+    return os.getenv('FRED_URL', DEFAULT_FRED_URL).rstrip('/')
+
+
+def get_driver(download_dir=DATA_INTERNAL_DIR, headless=True):
     """
     Set up Chrome driver.
 
     :param download_dir: (str) -> the destination directory for downloads
+    :param headless: (bool) -> run without a window, with images and stylesheets disabled
 
     :return: (selenium.webdriver) -> the web driver
     """
    
-    logging.log('Setting up Chrome driver...')
+    logging.info('Setting up Chrome driver...')
 
     # Set preferences for chrome driver
     chrome_options = Options()
 
     prefs = {
-        "download.default_directory": DATA_INTERNAL_DIR,
+        "download.default_directory": os.path.abspath(download_dir),
         "download.prompt_for_download": False, # Enable auto-download
         "download.directory_upgrade": True,
         "safebrowsing.enabled": True
     }
 
+    # Skip everything the scraper never looks at
+    if headless:
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        prefs['profile.managed_default_content_settings.images'] = 2
+        prefs['profile.managed_default_content_settings.stylesheets'] = 2
+
     try:
         chrome_options.add_experimental_option("prefs", prefs)
         driver = webdriver.Chrome(options=chrome_options)
     except Exception as e:
-        logging.error('Error instantiating Chrome driver: {e}')
+        logging.error(f'Error instantiating Chrome driver: {e}')
         raise
     
     return driver
 
 
-def get_rgdp_data(country_codes, driver):
+def get_rgdp_data(country_codes, driver=None, n_drivers=None, fred_url=None):
     """
-    Collect country-level rGDP data. 
+    Collect country-level rGDP data. Countries are worked through concurrently by a
+    pool of n_drivers headless browsers; every download lands in its own temporary
+    directory, so concurrent downloads are never mixed up.
 
     :param country_codes: (list<str>) -> the codes for the target countries
-    :param driver: (selenium.webdriver) -> the Chrome driver
+    :param driver: (selenium.webdriver) -> a Chrome driver to use instead of a pool
+    :param n_drivers: (int) -> the number of concurrent browsers, the N_DRIVERS variable if None
+    :param fred_url: (str) -> the FRED site, the FRED_URL variable if None
 
     :return: (bool) -> a boolean indicating the success of the operation
     """
 
-    logging.log(f'Getting rGDP data for {len(country_codes)} countries...')
+    logging.info(f'Getting rGDP data for {len(country_codes)} countries...')
 
-    keywords_hierarchy = ['Real GDP at Constant National Prices', 'Real Gross Domestic Product for',' Gross Domestic Product for', 'GDP']
+    keywords_hierarchy = KEYWORDS_HIERARCHY
+    fred_url = fred_url or get_fred_url()
+    n_drivers = n_drivers or int(os.getenv('N_DRIVERS', DEFAULT_N_DRIVERS))
 
-    try:
+    # Single caller-provided driver: work through the countries in order
+    if driver is not None:
         for i, c in enumerate(country_codes):
-            logging.log(f'Downloading file for {c}... ({i+1} / {len(country_codes)})')
-            
+            logging.info(f'Downloading file for {c}... ({i+1} / {len(country_codes)})')
+            _download_country_rgdp(c, driver, keywords_hierarchy, fred_url)
+        return True
+
+    # Start pool of drivers
+    n_drivers = max(1, min(n_drivers, len(country_codes)))
+    drivers = Queue()
+    failures = {}
+    try:
+        for _ in range(n_drivers):
+            drivers.put(get_driver())
+
+        def work(c):
+            pooled_driver = drivers.get()
             try:
-                # Go to specific country data page
-                url = BASE_URL_RGDP.format(c)
-                driver.get(url)
-                time.sleep(5)
-
-                # Rank search results according to data quality
-                results_ranking = defaultdict(int)
-                best_result_link = None
-                best_result_title = None
-                search_results = driver.find_elements(By.CLASS_NAME, 'search-series-title-gtm')
-                for item in search_results:
-                    item_title = item.get_attribute('aria-label')
-                    item_link = item.get_attribute('href')
-                    for i, k in enumerate(keywords_hierarchy):
-                        if k in item_title:
-                            results_ranking[(item_title, item_link)] = i
-                            break
-                
-                # Identify highest quality data link
-                sorted_results_ranking = sorted(results_ranking.items(), key=lambda x: x[1])
-                if sorted_results_ranking:
-                    best_result =  sorted_results_ranking[0][0]
-                    best_result_title, best_result_link = best_result
-                
-                # Go to highest quality data link
-                driver.get(best_result_link)
-                time.sleep(5)
-
-                # Click download button
-                download_button = driver.find_element(By.ID, 'download-button')
-                download_button.click()
-                time.sleep(2)
-
-                # Download file
-                csv_download_link = driver.find_element(By.ID, 'download-data-csv')
-                driver.get(csv_download_link.get_attribute('href'))
-                time.sleep(7)
-                
-                # Determine filename
-                downloaded_fname = f'{c.replace("%20", " ").title()}_{best_result_title}_DOWNLOADED.csv'
-                downloaded_fpath = os.path.join(DATA_INTERNAL_DIR, downloaded_fname)
-
-                # Rename file by waiting for it to appear in filesystem, then calling os.rename
-                temp_fpath = None 
-                while not temp_fpath or not os.path.exists(temp_fpath):
-                    time.sleep(1)
-                    for fname in os.listdir(DATA_INTERNAL_DIR):
-                        if 'DOWNLOADED' not in fname and fname.endswith('.csv'):
-                            temp_fpath = os.path.join(DATA_INTERNAL_DIR, fname)
-                            break
-
-                # Rename file
-                os.rename(temp_fpath, downloaded_fpath)
-                logging.error(f'Downloaded file for {c}: {downloaded_fpath}\n')
-            except Exception as e: 
-                logging.error(f'Error getting rGDP data for {c}: {e}')
-                raise
-    except Exception as e:
-        logging.error(f'Error getting rGDP data: {e}')
-        raise
+                return _download_country_rgdp(c, pooled_driver, keywords_hierarchy, fred_url)
+            finally:
+                drivers.put(pooled_driver)
+
+        with ThreadPoolExecutor(max_workers=n_drivers) as executor:
+            futures = {executor.submit(work, c): c for c in country_codes}
+            for i, future in enumerate(as_completed(futures)):
+                c = futures[future]
+                try:
+                    future.result()
+                    logging.info(f'Finished {c} ({i+1} / {len(country_codes)})')
+                except Exception as e:
+                    failures[c] = e
+    finally:
+        while not drivers.empty():
+            drivers.get().quit()
+
+    if failures:
+        logging.error(f'Error getting rGDP data for {list(failures)}')
+        raise Exception(f'Error getting rGDP data for {len(failures)} countries: {failures}')
     
     return True
+
+
+def _download_country_rgdp(c, driver, keywords_hierarchy, fred_url):
+    """
+    Finds the best rGDP series for a country and downloads its CSV.
+
+    :param c: (str) -> the country code
+    :param driver: (selenium.webdriver) -> the Chrome driver
+    :param keywords_hierarchy: (list<str>) -> series title keywords, best first
+    :param fred_url: (str) -> the FRED site
+
+    :return: (str) -> the filepath of the downloaded file
+    """
+
+    download_dir = None
+    try:
+        # Go to specific country data page
+        url = fred_url + SEARCH_PATH_RGDP.format(c)
+        driver.get(url)
+        wait = WebDriverWait(driver, PAGE_TIMEOUT)
+
+        # Rank search results according to data quality
+        try:
+            search_results = wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, 'search-series-title-gtm')))
+        except TimeoutException:
+            search_results = []
+        search_results = [(item.get_attribute('aria-label'), item.get_attribute('href')) for item in search_results]
+        
+        # Identify highest quality data link
+        best_result = _rank_search_results(search_results, keywords_hierarchy)
+        if best_result is None:
+            raise ValueError(f'No matching series found at {url}')
+        best_result_title, best_result_link = best_result
         
+        # Go to highest quality data link
+        driver.get(best_result_link)
+
+        # Click download button
+        download_button = wait.until(EC.element_to_be_clickable((By.ID, 'download-button')))
+        download_button.click()
+
+        # Point this download at a private directory on the same filesystem as DATA_INTERNAL_DIR
+        download_dir = tempfile.mkdtemp(prefix='.download_', dir=DATA_INTERNAL_DIR)
+        driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': os.path.abspath(download_dir)})
+
+        # Download file
+        csv_download_link = wait.until(EC.presence_of_element_located((By.ID, 'download-data-csv')))
+        driver.get(csv_download_link.get_attribute('href'))
+        
+        # Determine filename
+        downloaded_fname = f'{c.replace("%20", " ").title()}_{best_result_title}_DOWNLOADED.csv'
+        downloaded_fpath = os.path.join(DATA_INTERNAL_DIR, downloaded_fname)
+
+        # Wait for Chrome to finish the download, then move it into place atomically
+        temp_fpath = wait_for_file(download_dir, suffix='.csv', timeout=DOWNLOAD_TIMEOUT)
+        os.replace(temp_fpath, downloaded_fpath)
+        logging.info(f'Downloaded file for {c}: {downloaded_fpath}\n')
+    except Exception as e: 
+        logging.error(f'Error getting rGDP data for {c}: {e}')
+        raise
+    finally:
+        if download_dir is not None:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    return downloaded_fpath
+
+        
+def _rank_search_results(search_results, keywords_hierarchy):
+    """
+    Picks the search result whose title matches the highest-ranked keyword.
+
+    :param search_results: (list<(str, str)>) -> the (title, link) of every search result, in page order
+    :param keywords_hierarchy: (list<str>) -> series title keywords, best first
+
+    :return: ((str, str)) -> the (title, link) of the best result, None if nothing matches
+    """
+
+    results_ranking = defaultdict(int)
+    for item_title, item_link in search_results:
+        for i, k in enumerate(keywords_hierarchy):
+            if k in (item_title or ''):
+                results_ranking[(item_title, item_link)] = i
+                break
+
+    sorted_results_ranking = sorted(results_ranking.items(), key=lambda x: x[1])
+    if not sorted_results_ranking:
+        return None
+
+    return sorted_results_ranking[0][0]
+
+
+"""
+Browserless fetcher
+"""
+class _SearchResultsParser(HTMLParser):
+    """
+    Collects the (title, link) of every series link on a FRED search results page.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.search_results = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a' and 'search-series-title-gtm' in (attrs.get('class') or '').split():
+            self.search_results.append((attrs.get('aria-label'), attrs.get('href')))
+
+
+def get_http_session(n_connections=DEFAULT_N_REQUESTS):
+    """
+    Set up a keep-alive HTTP session that retries failed requests with exponential backoff.
+
+    :param n_connections: (int) -> the number of pooled connections per host
+
+    :return: (requests.Session) -> the session
+    """
+
+    retry = Retry(total=MAX_RETRIES,
+                  backoff_factor=0.5,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=n_connections, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def get_rgdp_data_http(country_codes, session=None, n_requests=None, requests_per_second=None, cache=None):
+    """
+    Collect country-level rGDP data over plain HTTP, without a browser. Resolves each
+    country's best series from the search page and downloads its CSV, with up to
+    n_requests countries in flight at a time. Countries already in the series cache
+    skip the search and only re-download their CSV if it changed upstream.
+
+    :param country_codes: (list<str>) -> the codes for the target countries
+    :param session: (requests.Session) -> the HTTP session, a new pooled session if None
+    :param n_requests: (int) -> the number of concurrent requests, the N_REQUESTS variable if None
+    :param requests_per_second: (float) -> the maximum request rate across all workers, the REQUESTS_PER_SECOND variable if None
+    :param cache: (SeriesCache) -> the series metadata cache, the cache at SERIES_CACHE_FPATH if None
+
+    :return: (bool) -> a boolean indicating the success of the operation
+    """
+
+    logging.info(f'Getting rGDP data for {len(country_codes)} countries over HTTP...')
+
+    fred_url = get_fred_url()
+    n_requests = n_requests or int(os.getenv('N_REQUESTS', DEFAULT_N_REQUESTS))
+    if requests_per_second is None:
+        requests_per_second = float(os.getenv('REQUESTS_PER_SECOND', DEFAULT_REQUESTS_PER_SECOND))
+    session = session or get_http_session(n_requests)
+    rate_limit = _get_rate_limiter(requests_per_second)
+    owns_cache = cache is None
+    cache = cache or SeriesCache(SERIES_CACHE_FPATH)
+    failures = {}
+    n_updated = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_requests) as executor:
+            futures = {executor.submit(_fetch_country_rgdp, c, session, rate_limit, KEYWORDS_HIERARCHY, cache, fred_url): c for c in country_codes}
+            for i, future in enumerate(as_completed(futures)):
+                c = futures[future]
+                try:
+                    _, is_updated = future.result()
+                    n_updated += is_updated
+                    logging.info(f'Finished {c} ({"updated" if is_updated else "unchanged"}) ({i+1} / {len(country_codes)})')
+                except Exception as e:
+                    failures[c] = e
+    finally:
+        if owns_cache:
+            cache.close()
+
+    logging.info(f'{n_updated} series updated, {len(country_codes) - n_updated - len(failures)} unchanged')
+
+    if failures:
+        logging.error(f'Error getting rGDP data for {list(failures)}')
+        raise Exception(f'Error getting rGDP data for {len(failures)} countries: {failures}')
+
+    return True
+
+
+def _fetch_country_rgdp(c, session, rate_limit, keywords_hierarchy, cache, fred_url):
+    """
+    Finds the best rGDP series for a country and downloads its CSV over HTTP. A cached
+    series is fetched with a conditional request and left alone if unchanged.
+
+    :param c: (str) -> the country code
+    :param session: (requests.Session) -> the HTTP session
+    :param rate_limit: (function) -> blocks until the next request may be sent
+    :param keywords_hierarchy: (list<str>) -> series title keywords, best first
+    :param cache: (SeriesCache) -> the series metadata cache
+    :param fred_url: (str) -> the FRED site
+
+    :return: (str, bool) -> the filepath of the downloaded file, whether it was (re)downloaded
+    """
+
+    try:
+        cached = cache.get(c)
+        if cached is not None:
+            # Revalidate the cached series without touching the search page
+            headers = {}
+            if os.path.exists(cached['fpath']):
+                if cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    headers['If-Modified-Since'] = cached['last_modified']
+
+            rate_limit()
+            response = session.get(fred_url + FRED_CSV_PATH.format(cached['series_id']), headers=headers, timeout=DOWNLOAD_TIMEOUT)
+            if response.status_code == 304:
+                cache.put(c, cached['series_id'], cached['title'], cached['fpath'], cached['etag'], cached['last_modified'], is_updated=False)
+                return cached['fpath'], False
+            if response.ok:
+                fpath = _save_series_csv(c, cached['title'], response)
+                cache.put(c, cached['series_id'], cached['title'], fpath, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return fpath, True
+
+            # Series vanished or moved upstream, search again
+            logging.info(f'Cached series {cached["series_id"]} for {c} returned {response.status_code}, searching again...')
+            cache.delete(c)
+
+        # Get search results for country
+        url = fred_url + SEARCH_PATH_RGDP.format(c)
+        rate_limit()
+        response = session.get(url, timeout=PAGE_TIMEOUT)
+        response.raise_for_status()
+
+        parser = _SearchResultsParser()
+        parser.feed(response.text)
+
+        # Identify highest quality series
+        best_result = _rank_search_results(parser.search_results, keywords_hierarchy)
+        if best_result is None:
+            raise ValueError(f'No matching series found at {url}')
+        best_result_title, best_result_link = best_result
+        series_id = urlparse(best_result_link).path.rstrip('/').split('/')[-1]
+
+        # Download series CSV
+        rate_limit()
+        response = session.get(fred_url + FRED_CSV_PATH.format(series_id), timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+
+        downloaded_fpath = _save_series_csv(c, best_result_title, response)
+        cache.put(c, series_id, best_result_title, downloaded_fpath, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    except Exception as e:
+        logging.error(f'Error getting rGDP data for {c}: {e}')
+        raise
+
+    return downloaded_fpath, True
+
+
+def _save_series_csv(c, title, response):
+    """
+    Writes a downloaded series CSV into DATA_INTERNAL_DIR. The body goes to a temporary
+    file first so a partial download never carries the final name.
+
+    :param c: (str) -> the country code
+    :param title: (str) -> the series title
+    :param response: (requests.Response) -> the CSV response
+
+    :return: (str) -> the filepath of the downloaded file
+    """
+
+    downloaded_fname = f'{c.replace("%20", " ").title()}_{title}_DOWNLOADED.csv'
+    downloaded_fpath = os.path.join(DATA_INTERNAL_DIR, downloaded_fname)
+    temp_fpath = downloaded_fpath + '.part'
+    with open(temp_fpath, 'wb') as f:
+        f.write(response.content)
+    os.replace(temp_fpath, downloaded_fpath)
+    logging.info(f'Downloaded file for {c}: {downloaded_fpath}')
+
+    return downloaded_fpath
+
+
+def _get_rate_limiter(requests_per_second):
+    """
+    Creates a thread-safe limiter that spaces requests at least 1 / requests_per_second apart.
+
+    :param requests_per_second: (float) -> the maximum request rate
+
+    :return: (function) -> blocks until the next request may be sent
+    """
+
+    interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+    lock = Lock()
+    schedule = {'next': time.monotonic()}
+
+    def rate_limit():
+        with lock:
+            now = time.monotonic()
+            wait = schedule['next'] - now
+            schedule['next'] = max(now, schedule['next']) + interval
+        if wait > 0:
+            time.sleep(wait)
+
+    return rate_limit
+
+
 def _get_countries(data):
     """
     Get countries from database.
@@ -148,104 +492,87 @@ def _get_countries(data):
 
     return countries
 
-def _get_country_codes(countries):
+
+def consolidate_rgdp_data(fname, keywords_hierarchy, engine=None, table_name=None, n_workers=N_PARSERS):
     """
-    Translates plaintext country strings into URL country codes.
+    Consolidate country-specific rGDP data into a single dataframe.
+    Save as .CSV (or .parquet, depending on fname) to OUTPUT_DIR, and optionally
+    write it to a database table. Files are parsed in parallel and concatenated once.
 
-    :param countries: (list<str>) -> the countries in the database
+    :param filename: (str) -> filename of the output file (.csv or .parquet)
+    :param keywords_hierarchy: (list<str>) -> series title keywords, best first
+    :param engine: (SQLAlchemy.engine) -> the database engine, if the data should be written to a table
+    :param table_name: (str) -> the target table name
+    :param n_workers: (int) -> the number of files parsed concurrently
 
-    :return: (list<str>) -> the country codes
+    :return: (pd.DataFrame) -> the dataframe with all the rGDP data
     """
-    
-    # Record counter-intuitive country codes used by FRED server
-    country_to_code = {'Federated States of Micronesia': 'micronesia', 
-                         'Democratic Republic of the Congo': 'dr%20congo',
-                         'Republic of Serbia': 'serbia',
-                         'United Republic of Tanzania': 'tanzania',
-                         'United States of America': 'usa',
-                         'Northern Mariana Islands': 'cnmi',
-                         'S. Sudan': 'south%20sudan',
-                         'Vietnam': 'viet%20nam',
-                         'South Georgia and the Islands': None,
-                         'Pitcairn Islands': None,
-                         'Antarctica': None,
-                         'French Polynesia': None,
-                         'French Southern and Antarctic Lands': None,
-                         'British Indian Ocean Territory': None
-                         }
+
+    logging.info('Consolidating country-specific rGDP files into single file...')
+
     try:
-        # Map countries to codes
-        country_codes = []
-        for c in countries:
-            try:
-                if c == None: 
-                    continue
-                # Refer to map if code is counter-intuitive
-                elif c in country_to_code:
-                    code = country_to_code[c]
-                    if code is not None:
-                        country_codes.append(code)
-                # Otherwise, build code here
-                else:
-                    code = c.lower()
-                    if ' ' in c:
-                        code = code.replace(' ', '%20')
-                    country_codes.append(code)
-            except Exception as e:
-                logging.error(f'Error finding corresponding country code for {c}: {e}')
-                raise
+        # Only include rGDP at constant price
+        fnames = sorted(f for f in os.listdir(DATA_INTERNAL_DIR) if f.endswith('.csv') and keywords_hierarchy[0] in f)
+        logging.info(f'Processing {len(fnames)} files...')
+
+        # Restructure each country-level rGDP file in parallel, then concatenate once
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            country_rgdp_data = list(executor.map(_read_country_rgdp, fnames))
+
+        if country_rgdp_data:
+            rgdp_data = pd.concat(country_rgdp_data, ignore_index=True)
+        else:
+            rgdp_data = pd.DataFrame({'Country': pd.Series(dtype='str'), 'rGDP': pd.Series(dtype='float64'), 'Year': pd.Series(dtype='int64')})
+
+        # Save the consolidated DataFrame to a new file
+        os.makedirs(DATA_OUTPUT_DIR, exist_ok=True)
+        output_fpath = os.path.join(DATA_OUTPUT_DIR, fname)
+        if fname.endswith('.parquet'):
+            rgdp_data.to_parquet(output_fpath, index=False)
+        else:
+            rgdp_data.to_csv(output_fpath, index=False)
+
+        # Write straight to the database table, if requested
+        if engine is not None:
+            upsert_table(rgdp_data, table_name=table_name, key_fields=['Country', 'Year'], engine=engine)
     except Exception as e:
-        logging.error(f'Error getting country codes: {e}')
+        logging.error(f'Error consolidating rGDP data: {e}')
         raise
-    return country_codes
+
+    return rgdp_data    
 
 
-def consolidate_rgdp_data(fname, keywords_hierarchy):
+def _read_country_rgdp(filename):
     """
-    Consolidate country-specific rGDP data into a single dataframe.
-    Save as .CSV to OUTPUT_DIR.
+    Parses one downloaded country-level rGDP file into (Country, rGDP, Year) rows.
 
-    :param filename: (str) -> filename of CSV
+    :param filename: (str) -> filename of the CSV in DATA_INTERNAL_DIR
 
-    :return: (pd.DataFrame) -> the dataframe with all the rGDP data
+    :return: (pd.DataFrame) -> the country's rGDP data
     """
 
-    logging.log('Consolidating country-specific rGDP files into single .csv...')
-
     try:
-        # Consolidate rGDP data into this dataframe
-        rgdp_data = pd.DataFrame(columns=['Country', 'rGDP', 'Year'])
-        # Restructure each country-level rGDP dataframe to match rgdp_data
-        file_i = 1
-        for filename in os.listdir(DATA_INTERNAL_DIR):
-            try:
-                if filename.endswith('.csv') and keywords_hierarchy[0] in filename: # Only include rGDP at constant price
-                    logging.log(f'Processing {filename}... ({file_i})')
-                    country = filename.split('_')[0]
-                    
-                    country_rgdp_data = pd.read_csv(os.path.join(DATA_INTERNAL_DIR, filename))
-
-                    country_rgdp_data.rename(columns={country_rgdp_data.columns[1]: 'rGDP'}, inplace=True)
-                    country_rgdp_data['Year'] = pd.to_datetime(country_rgdp_data['DATE']).dt.year
-                    country_rgdp_data['Country'] = country
-
-                    country_rgdp_data = country_rgdp_data[['Country', 'rGDP', 'Year']]
-                    
-                    rgdp_data = pd.concat([rgdp_data, country_rgdp_data], ignore_index=True)
-
-                    file_i += 1
-            except Exception as e:
-                logging.error(f'Error adding rGDP data from {filename}: {e}')
-                raise
-
-        # Save the consolidated DataFrame to a new CSV file
-        rgdp_data.to_csv(os.path.join(DATA_OUTPUT_DIR, fname), index=False)
+        country = filename.split('_')[0]
+
+        # Positional columns with explicit dtypes; FRED marks missing observations with '.'
+        country_rgdp_data = pd.read_csv(os.path.join(DATA_INTERNAL_DIR, filename),
+                                        header=0,
+                                        usecols=[0, 1],
+                                        names=['DATE', 'rGDP'],
+                                        dtype={'DATE': 'str', 'rGDP': 'float64'},
+                                        na_values=['.'])
+        country_rgdp_data = country_rgdp_data.dropna(subset=['rGDP'])
+
+        # Dates are ISO formatted (YYYY-MM-DD), so the year is the leading four characters
+        return pd.DataFrame({
+            'Country': country,
+            'rGDP': country_rgdp_data['rGDP'].to_numpy(),
+            'Year': country_rgdp_data['DATE'].str.slice(0, 4).astype('int64').to_numpy()
+        })
     except Exception as e:
-        logging.error(f'Error consolidating rGDP data: {e}')
+        logging.error(f'Error adding rGDP data from {filename}: {e}')
         raise
 
-    return rgdp_data    
-
     
 
 
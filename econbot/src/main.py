@@ -3,8 +3,10 @@ from dotenv import load_dotenv
 import sys
 import os
 
-from src.utils.database import get_db_engine, write_table
+from src.utils.database import get_db_engine, upsert_table
 from src.utils.validate import validate_data
+from src.utils.countries import get_country_codes
+from src.core.aggregate import refresh_fact_table
 
 from src import INTERNAL_DATA_DIR
 from src import LOGGER
@@ -22,6 +24,13 @@ if __name__ == '__main__':
     # Get data
     rgdp_data = pd.read_csv(os.path.join(INTERNAL_DATA_DIR, 'rgdp.csv'))
 
+    # Refresh the precollected countries from FRED over HTTP (no browser needed), if requested
+    if os.getenv('FETCH_RGDP') == 'TRUE':
+        from src.core.econbot import get_rgdp_data_http, consolidate_rgdp_data, KEYWORDS_HIERARCHY
+
+        get_rgdp_data_http(get_country_codes(list(rgdp_data['Country'].unique())))
+        rgdp_data = consolidate_rgdp_data('rgdp.csv', KEYWORDS_HIERARCHY)
+
     # Validate data
     is_valid, error_message = validate_data(rgdp_data)
     if is_valid == False:
@@ -34,8 +43,14 @@ if __name__ == '__main__':
     # Get desired table name
     table_name = os.getenv('ECONOMETRICS_TABLE_NAME')
 
-    # Write data to table
-    write_table(rgdp_data, table_name=table_name, if_exists='replace', engine=engine)
+    # Merge data into table (only new or revised country-years are written)
+    upsert_table(rgdp_data, table_name=table_name, key_fields=['Country', 'Year'], engine=engine)
+
+    # Refresh the earthquake x rGDP fact table if the geocoded earthquakes are in the same database
+    fact_table_name = os.getenv('FACT_TABLE_NAME')
+    quake_table_name = os.getenv('EARTHQUAKE_TABLE_NAME')
+    if fact_table_name and quake_table_name:
+        refresh_fact_table(quake_table_name, rgdp_table_name=table_name, fact_table_name=fact_table_name, engine=engine)
 
 
 
@@ -0,0 +1,109 @@
+import sqlite3
+import logging
+import time
+
+from threading import Lock
+
+
+"""
+Constants
+"""
+SERIES_FIELDS = ['country_code', 'series_id', 'title', 'fpath', 'etag', 'last_modified', 'last_updated', 'checked_at']
+
+
+class SeriesCache:
+    """
+    SQLite-backed cache of the FRED series chosen for each country, with the validators
+    (ETag / Last-Modified) of the last download so later runs can send conditional requests.
+    Safe to share between threads.
+    """
+
+    def __init__(self, fpath):
+        """
+        :param fpath: (str) -> the SQLite database filepath
+        """
+
+        self.fpath = fpath
+        self._lock = Lock()
+        try:
+            self._connection = sqlite3.connect(fpath, check_same_thread=False)
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS series (
+                    country_code TEXT PRIMARY KEY,
+                    series_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    fpath TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    last_updated REAL,
+                    checked_at REAL
+                );
+                ''')
+            self._connection.commit()
+        except sqlite3.Error as e:
+            logging.error(f'Error opening series cache @ {fpath}: {e}')
+            raise
+
+    def get(self, country_code):
+        """
+        Looks up the cached series of a country.
+
+        :param country_code: (str) -> the country code
+
+        :return: (dict) -> the cached record (keys: SERIES_FIELDS), None if the country is not cached
+        """
+
+        with self._lock:
+            row = self._connection.execute(f'SELECT {", ".join(SERIES_FIELDS)} FROM series WHERE country_code = ?;',
+                                           (country_code,)).fetchone()
+
+        return dict(zip(SERIES_FIELDS, row)) if row is not None else None
+
+    def put(self, country_code, series_id, title, fpath, etag=None, last_modified=None, is_updated=True):
+        """
+        Records the series of a country after a successful request.
+
+        :param country_code: (str) -> the country code
+        :param series_id: (str) -> the FRED series ID
+        :param title: (str) -> the series title
+        :param fpath: (str) -> the filepath of the downloaded CSV
+        :param etag: (str) -> the ETag of the last download
+        :param last_modified: (str) -> the Last-Modified header of the last download
+        :param is_updated: (bool) -> indicates whether a new version was downloaded
+
+        :return: None
+        """
+
+        now = time.time()
+        with self._lock:
+            previous = self._connection.execute('SELECT last_updated FROM series WHERE country_code = ?;',
+                                                (country_code,)).fetchone()
+            last_updated = now if is_updated or previous is None else previous[0]
+            self._connection.execute('''
+                INSERT OR REPLACE INTO series (country_code, series_id, title, fpath, etag, last_modified, last_updated, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+                ''', (country_code, series_id, title, fpath, etag, last_modified, last_updated, now))
+            self._connection.commit()
+
+    def delete(self, country_code):
+        """
+        Forgets the series of a country (e.g. when it disappeared upstream).
+
+        :param country_code: (str) -> the country code
+
+        :return: None
+        """
+
+        with self._lock:
+            self._connection.execute('DELETE FROM series WHERE country_code = ?;', (country_code,))
+            self._connection.commit()
+
+    def close(self):
+        """
+        Closes the cache.
+
+        :return: None
+        """
+
+        with self._lock:
+            self._connection.close()
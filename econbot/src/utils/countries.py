@@ -0,0 +1,77 @@
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Counter-intuitive country codes used by the FRED server (None: FRED has no data for the country)
+COUNTRY_TO_CODE = {'Federated States of Micronesia': 'micronesia',
+                   'Democratic Republic of the Congo': 'dr%20congo',
+                   'Republic of Serbia': 'serbia',
+                   'United Republic of Tanzania': 'tanzania',
+                   'United States of America': 'usa',
+                   'Northern Mariana Islands': 'cnmi',
+                   'S. Sudan': 'south%20sudan',
+                   'Vietnam': 'viet%20nam',
+                   'South Georgia and the Islands': None,
+                   'Pitcairn Islands': None,
+                   'Antarctica': None,
+                   'French Polynesia': None,
+                   'French Southern and Antarctic Lands': None,
+                   'British Indian Ocean Territory': None
+                   }
+
+
+"""
+Country codes
+"""
+def get_country_codes(countries):
+    """
+    Translates plaintext country strings into URL country codes.
+
+    :param countries: (list<str>) -> the countries in the database
+
+    :return: (list<str>) -> the country codes
+    """
+
+    try:
+        # Map countries to codes
+        country_codes = []
+        for c in countries:
+            try:
+                if c == None:
+                    continue
+                # Refer to map if code is counter-intuitive
+                elif c in COUNTRY_TO_CODE:
+                    code = COUNTRY_TO_CODE[c]
+                    if code is not None:
+                        country_codes.append(code)
+                # Otherwise, build code here
+                else:
+                    code = c.lower()
+                    if ' ' in c:
+                        code = code.replace(' ', '%20')
+                    country_codes.append(code)
+            except Exception as e:
+                LOGGER.error(f'Error finding corresponding country code for {c}: {e}')
+                raise
+    except Exception as e:
+        LOGGER.error(f'Error getting country codes: {e}')
+        raise
+
+    return country_codes
+
+
+def get_rgdp_country(country):
+    """
+    Translates a plaintext country string into the country name of the rGDP data, which is
+    the title-cased FRED country code.
+
+    :param country: (str) -> the country
+
+    :return: (str) -> the rGDP country name, None if FRED has no data for the country
+    """
+
+    country_codes = get_country_codes([country])
+
+    return country_codes[0].replace('%20', ' ').title() if country_codes else None
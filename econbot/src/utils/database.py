@@ -10,11 +10,22 @@ from botocore.exceptions import NoCredentialsError, ClientError
 
 from prettytable import PrettyTable
 
+import psycopg2
+
+import io
 import os
 
 from src.utils.exceptions import DatabaseConnectionError, AuthenticationTokenError, DataPushError, QueryExecutionError, TableExistenceError
 from src import LOGGER
 
+
+"""
+Local Constants
+"""
+# Maximum number of duplicate keys named when a unique key cannot be created
+MAX_REPORTED_KEYS = 5
+
+
 """
 Establish database connection
 """
@@ -127,6 +138,214 @@ def write_table(data, table_name, if_exists, engine):
 
 
 
+def upsert_table(data, table_name, key_fields, engine):
+    """
+    Merges data into a table without ever dropping it. Rows are staged through COPY into a
+    temporary table and merged with INSERT ... ON CONFLICT DO UPDATE on a unique index over
+    key_fields, so only new or changed rows are written and readers never see a missing table.
+    Rows repeating a key keep their last occurrence, since one statement cannot update a row twice.
+
+    :param data: (pd.DataFrame) -> the data
+    :param table_name: (str) -> the table name
+    :param key_fields: (list<str>) -> the fields identifying a row (e.g. ['Country', 'Year'])
+    :param engine: (sqlalchemy.engine) -> the SQLAlchemy engine
+
+    :return: (int) -> the number of rows inserted or updated
+    """
+
+    print(f'Upserting into {table_name}...', flush=True)
+    LOGGER.debug(f'Upserting into {table_name}...')
+
+    if not isinstance(data, pd.DataFrame):
+        LOGGER.error('Provided data is not a pandas DataFrame')
+        raise DataPushError('Provided data is not a pandas DataFrame')
+
+    missing_fields = [f for f in key_fields if f not in data.columns]
+    if missing_fields:
+        LOGGER.error(f'Provided data is missing key fields: {missing_fields}')
+        raise DataPushError(f'Provided data is missing key fields: {missing_fields}')
+
+    # Deduplicate on the key
+    is_repeat = data.duplicated(subset=key_fields, keep='last')
+    if is_repeat.any():
+        LOGGER.info(f'Dropping {is_repeat.sum()} rows repeating a key in {key_fields}, keeping the last occurrence')
+        data = data[~is_repeat]
+
+    fields = list(data.columns)
+    quoted_fields = ', '.join(f'"{f}"' for f in fields)
+    quoted_keys = ', '.join(f'"{f}"' for f in key_fields)
+    value_fields = [f for f in fields if f not in key_fields]
+    column_definitions = ', '.join(f'"{f}" {_sql_type(data[f].dtype)}' for f in fields)
+
+    if value_fields:
+        on_conflict = f'''DO UPDATE SET {', '.join(f'"{f}" = EXCLUDED."{f}"' for f in value_fields)}
+                        WHERE ({', '.join(f'{table_name}."{f}"' for f in value_fields)})
+                              IS DISTINCT FROM ({', '.join(f'EXCLUDED."{f}"' for f in value_fields)})'''
+    else:
+        on_conflict = 'DO NOTHING'
+
+    # Serialize rows once for COPY (NaN becomes an empty field, i.e. NULL)
+    buffer = io.StringIO()
+    data.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+
+    connection = None
+    try:
+        connection = engine.raw_connection()
+        with connection.cursor() as cursor:
+            # Create table and its unique key on first load
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({column_definitions});')
+            cursor.execute('SELECT to_regclass(%s);', (f'{table_name}_key_idx',))
+            if cursor.fetchone()[0] is None:
+                _check_unique_keys(cursor, table_name, key_fields)
+                cursor.execute(f'CREATE UNIQUE INDEX {table_name}_key_idx ON {table_name} ({quoted_keys});')
+
+            # Stage rows
+            cursor.execute(f'CREATE TEMP TABLE {table_name}_stage (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP;')
+            cursor.copy_expert(f'COPY {table_name}_stage ({quoted_fields}) FROM STDIN WITH (FORMAT csv);', buffer)
+
+            # Merge rows, skipping those that did not change
+            cursor.execute(f'''
+                INSERT INTO {table_name} ({quoted_fields})
+                SELECT {quoted_fields} FROM {table_name}_stage
+                ON CONFLICT ({quoted_keys}) {on_conflict};
+                ''')
+            rowcount = cursor.rowcount
+        connection.commit()
+    except DataPushError:                       # Catch invalid existing data
+        connection.rollback()
+        raise
+    except psycopg2.Error as e:                 # Catch DB errors
+        if connection is not None:
+            connection.rollback()
+        LOGGER.error(f'Error pushing data to database: {e}')
+        raise DataPushError(f'Error pushing data to database: {e}')
+    except sqlalchemy_exc.DBAPIError as e:      # Catch DB connection error
+        LOGGER.error(f'Error connecting to database: {e}')
+        raise DatabaseConnectionError(f'Error connecting to database: {e}')
+    except Exception as e:                      # Catch-all
+        LOGGER.error(f'Unexpected error: {e}')
+        raise DataPushError(f'Unexpected error: {e}')
+    finally:
+        if connection is not None:
+            connection.close()
+
+    LOGGER.info(f'Upserted {rowcount} rows into {table_name}')
+
+    return rowcount
+
+
+def _check_unique_keys(cursor, table_name, key_fields):
+    """
+    Checks that an existing table holds no duplicate keys before a unique index is built on them,
+    so the failure names the offending keys instead of surfacing as an index build error.
+
+    :param cursor: (psycopg2.cursor) -> the cursor, inside the upsert transaction
+    :param table_name: (str) -> the table name
+    :param key_fields: (list<str>) -> the fields identifying a row
+
+    :return: None
+    """
+
+    quoted_keys = ', '.join(f'"{f}"' for f in key_fields)
+    cursor.execute(f'''
+        SELECT {quoted_keys}, count(*), count(*) OVER ()
+        FROM {table_name}
+        GROUP BY {quoted_keys}
+        HAVING count(*) > 1
+        ORDER BY {quoted_keys}
+        LIMIT {MAX_REPORTED_KEYS};
+        ''')
+    duplicates = cursor.fetchall()
+    if duplicates:
+        n_keys = duplicates[0][-1]
+        examples = ', '.join(f'{row[:-2]} x{row[-2]}' for row in duplicates)
+        LOGGER.error(f'{table_name} holds {n_keys} duplicate {key_fields} keys, e.g. {examples}')
+        raise DataPushError(f'Cannot create a unique key on {key_fields}: {table_name} already holds {n_keys} duplicate keys '
+                            f'(e.g. {examples}). Remove the duplicate rows before upserting into it.')
+
+
+def _sql_type(dtype):
+    """
+    Maps a pandas dtype to a PostgreSQL column type.
+
+    :param dtype: (np.dtype) -> the pandas dtype
+
+    :return: (str) -> the PostgreSQL type
+    """
+
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'BIGINT'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'DOUBLE PRECISION'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+
+    return 'TEXT'
+
+
+def execute_queries(queries, engine, params=None):
+    """
+    Executes a sequence of statements in a single transaction.
+
+    :param queries: (list<str>) -> the SQL statements
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param params: (dict) -> bound parameters shared by the statements, if any
+
+    :return: (list<int>) -> the number of rows affected by each statement
+    """
+
+    try:
+        with engine.connect() as connection:
+            rowcounts = []
+            for query in queries:
+                LOGGER.debug(f'Executing query: {query}...')
+                result = connection.execute(text(query), params or {})
+                rowcounts.append(result.rowcount)
+            connection.commit()
+    except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
+        LOGGER.error(f'Error connecting to database {e}')
+        raise DatabaseConnectionError(f'Error connecting to database {e}')
+    except sqlalchemy_exc.SQLAlchemyError as e: # Handle SQLAlchemy query execution error
+        LOGGER.error(f'Error executing query: {e}')
+        raise QueryExecutionError(f'Error executing query: {e}')
+    except Exception as e:                      # Catch-all
+        LOGGER.error(f'Unexpected error: {e}')
+        raise QueryExecutionError(f'Unexpected error: {e}')
+
+    return rowcounts
+
+
+def get_data(query, engine, params=None):
+    """
+    Executes SELECT statement to get data from database.
+
+    :param query: (str) -> the SQL query
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param params: (dict) -> bound parameters, if any
+
+    :return: (pd.DataFrame) -> the data
+    """
+
+    LOGGER.debug(f'Executing SELECT query: {query}...')
+
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text(query), params or {})
+            return pd.DataFrame(result.fetchall(), columns=result.keys())
+    except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
+        LOGGER.error(f'Error connecting to database {e}')
+        raise DatabaseConnectionError(f'Error connecting to database {e}')
+    except sqlalchemy_exc.SQLAlchemyError as e: # Handle SQLAlchemy query execution error
+        LOGGER.error(f'Error executing query: {e}')
+        raise QueryExecutionError(f'Error executing query: {e}')
+    except Exception as e:                      # Catch-all
+        LOGGER.error(f'Unexpected error: {e}')
+        raise QueryExecutionError(f'Unexpected error: {e}')
+
+
 def _table_exists(table_name, connection):
     """
     Checks if passed table exists.
@@ -0,0 +1,150 @@
+import ctypes
+import ctypes.util
+import logging
+import select
+import struct
+import time
+import os
+
+
+"""
+Constants
+"""
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+# Size of the fixed part of an inotify event (wd, mask, cookie, len)
+EVENT_HEADER = struct.Struct('iIII')
+
+# Polling interval (s) used where inotify is unavailable
+POLL_INTERVAL = 0.2
+
+
+def wait_for_file(directory, suffix, timeout):
+    """
+    Blocks until a finished file with the given suffix appears in the directory.
+    Uses inotify on Linux, so no directory scans happen while waiting; elsewhere the
+    directory is polled, which stays cheap as long as it is private to the caller.
+
+    :param directory: (str) -> the watched directory
+    :param suffix: (str) -> the suffix of the expected file (e.g. '.csv')
+    :param timeout: (float) -> the maximum time to wait (s)
+
+    :return: (str) -> the filepath of the finished file
+    """
+
+    deadline = time.monotonic() + timeout
+
+    libc = _get_libc()
+    if libc is None:
+        return _poll_for_file(directory, suffix, deadline)
+
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        logging.error(f'inotify_init1 failed with errno {ctypes.get_errno()}, polling {directory} instead')
+        return _poll_for_file(directory, suffix, deadline)
+
+    try:
+        if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            logging.error(f'inotify_add_watch failed with errno {ctypes.get_errno()}, polling {directory} instead')
+            return _poll_for_file(directory, suffix, deadline)
+
+        # The file may have been finished before the watch was in place
+        fpath = _find_file(directory, suffix)
+        while fpath is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'No {suffix} file appeared in {directory} within {timeout}s')
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                fpath = _read_events(fd, directory, suffix)
+    finally:
+        os.close(fd)
+
+    return fpath
+
+
+def _get_libc():
+    """
+    Loads the C library if it provides inotify.
+
+    :return: (ctypes.CDLL) -> the C library, None if inotify is unavailable
+    """
+
+    libc_name = ctypes.util.find_library('c')
+    if libc_name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+def _read_events(fd, directory, suffix):
+    """
+    Drains pending inotify events and returns the first finished file with the given suffix.
+
+    :param fd: (int) -> the inotify file descriptor
+    :param directory: (str) -> the watched directory
+    :param suffix: (str) -> the suffix of the expected file
+
+    :return: (str) -> the filepath of the finished file, None if no event matched
+    """
+
+    try:
+        buffer = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return None
+
+    offset = 0
+    while offset < len(buffer):
+        _, _, _, name_len = EVENT_HEADER.unpack_from(buffer, offset)
+        offset += EVENT_HEADER.size
+        fname = buffer[offset:offset + name_len].rstrip(b'\0').decode()
+        offset += name_len
+        if fname.endswith(suffix):
+            return os.path.join(directory, fname)
+
+    return None
+
+
+def _poll_for_file(directory, suffix, deadline):
+    """
+    Polls the directory until a file with the given suffix appears.
+
+    :param directory: (str) -> the watched directory
+    :param suffix: (str) -> the suffix of the expected file
+    :param deadline: (float) -> the time.monotonic() deadline
+
+    :return: (str) -> the filepath of the finished file
+    """
+
+    while True:
+        fpath = _find_file(directory, suffix)
+        if fpath is not None:
+            return fpath
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'No {suffix} file appeared in {directory}')
+        time.sleep(POLL_INTERVAL)
+
+
+def _find_file(directory, suffix):
+    """
+    Finds a file with the given suffix in the directory.
+
+    :param directory: (str) -> the directory
+    :param suffix: (str) -> the file suffix
+
+    :return: (str) -> the filepath, None if there is no such file
+    """
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffix) and entry.is_file():
+                return entry.path
+
+    return None
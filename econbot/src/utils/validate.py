@@ -1,36 +1,50 @@
-import pandas as pd
+from src.utils.scan import scan_data, format_rows
 from src import LOGGER
 
-def validate_data(data):
+
+"""
+Local Constants
+"""
+# Number of rows validated at a time
+CHUNK_SIZE = 100000
+
+
+"""
+Validation engine
+"""
+def validate_data(data, chunk_size=CHUNK_SIZE):
     
     LOGGER.info('Validating data...')
 
     is_valid = True
     error_message = ""
 
+    # Assuming the year should be between 1800 and 2023 and rGDP should be positive
+    n_rows, violations = scan_data(data, chunk_size,
+                                   range_fields={'Year': (1800, 2023), 'rGDP': (0, None)})
+
     # Check for missing values
-    if data.isnull().values.any():
+    if 'missing' in violations:
         is_valid = False
-        error_message += 'Validation failed: Missing values detected' + '\n' 
+        error_message += 'Validation failed: Missing values detected' + format_rows(violations['missing']) + '\n' 
 
     # Check for duplicates
-    if data.duplicated().any():
+    if 'duplicate' in violations:
         is_valid = False
-        error_message += 'Validation failed: Duplicate records found' + '\n' 
+        error_message += 'Validation failed: Duplicate records found' + format_rows(violations['duplicate']) + '\n' 
 
     # Check for empty records
-    if (data.applymap(lambda x: x == '')).any(axis=None):
+    if 'empty' in violations:
         is_valid = False
-        error_message += 'Validation failed: Empty records found' + '\n'
+        error_message += 'Validation failed: Empty records found' + format_rows(violations['empty']) + '\n'
 
     # Check for valid range of values
-    # Assuming the year should be between 1800 and 2023 and rGDP should be positive
-    if not data['Year'].between(1800, 2023).all():
+    if 'Year' in violations:
         is_valid = False
-        error_message += 'Validation failed: Year out of valid range' + '\n'
+        error_message += 'Validation failed: Year out of valid range' + format_rows(violations['Year']) + '\n'
     
-    if (data['rGDP'] < 0).any():
+    if 'rGDP' in violations:
         is_valid = False
-        error_message += 'Validation failed: rGDP contains negative values' + '\n'
+        error_message += 'Validation failed: rGDP contains negative values' + format_rows(violations['rGDP']) + '\n'
 
     return is_valid, error_message
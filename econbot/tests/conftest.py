@@ -0,0 +1,44 @@
+import pytest
+import sys
+import os
+
+# Tests import the package as src, like the driver programs
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if TOP_DIR not in sys.path:
+    sys.path.insert(0, TOP_DIR)
+
+from fred_stub import FredStub
+
+
+@pytest.fixture
+def fred_stub(monkeypatch, tmp_path):
+    """
+    Serves the FRED fixtures locally, points FRED_URL at them and redirects downloads to a
+    temporary directory.
+    """
+
+    from src.core import econbot
+
+    stub = FredStub()
+    monkeypatch.setenv('FRED_URL', stub.url)
+    monkeypatch.setattr(econbot, 'DATA_INTERNAL_DIR', str(tmp_path))
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def engine():
+    """
+    Connects to the PostgreSQL database at TEST_DATABASE_URL (any local instance will do, e.g.
+    postgresql+psycopg2://postgres@/postgres?host=/tmp/pgdata). Tests using it are skipped if unset.
+    """
+
+    from sqlalchemy import create_engine
+
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
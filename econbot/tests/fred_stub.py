@@ -0,0 +1,136 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from threading import Thread, Lock
+
+import hashlib
+import os
+
+
+"""
+Constants
+"""
+# Pages and series CSVs served by the stand-in server
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'fred')
+
+# Files the scrapers write for the best series of the fixture countries
+USA_FNAME = 'Usa_Real GDP at Constant National Prices for United States_DOWNLOADED.csv'
+VIET_NAM_FNAME = 'Viet Nam_Real GDP at Constant National Prices for Viet Nam_DOWNLOADED.csv'
+
+
+class FredStub:
+    """
+    Local stand-in for the FRED pages the scrapers read: the search results page, the series
+    page with its download menu and fredgraph.csv (with an ETag, answering conditional requests
+    with 304). Every request is logged, and paths can be made to fail a given number of times.
+    """
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        """
+        :param fixtures_dir: (str) -> the directory holding search/, csv/ and series.html
+        """
+
+        self.fixtures_dir = fixtures_dir
+        self.requests = []
+        self.failures = {}
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._get_handler())
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def requested(self, path):
+        """
+        :param path: (str) -> the request path, without the query
+
+        :return: (list<dict>) -> the query and headers of every request to the path
+        """
+
+        with self._lock:
+            return [r for r in self.requests if r['path'] == path]
+
+    def close(self):
+        """
+        Stops the server.
+
+        :return: None
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_handler(self):
+        """
+        :return: (type) -> the request handler class, bound to this stub
+        """
+
+        stub = self
+
+        class FredHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.requests.append({'path': url.path, 'query': query, 'headers': dict(self.headers)})
+                    n_failures = stub.failures.get(url.path, 0)
+                    if n_failures:
+                        stub.failures[url.path] = n_failures - 1
+
+                if n_failures:
+                    return self._send(503, b'Service Unavailable', 'text/plain')
+
+                if url.path == '/searchresults/':
+                    fpath = os.path.join(stub.fixtures_dir, 'search', query.get('t', '').replace(' ', '_') + '.html')
+                    if not os.path.exists(fpath):
+                        fpath = os.path.join(stub.fixtures_dir, 'search', 'atlantis.html')
+                    return self._send(200, _read(fpath), 'text/html; charset=utf-8')
+
+                if url.path.startswith('/series/'):
+                    series_id = url.path.rstrip('/').split('/')[-1]
+                    page = _read(os.path.join(stub.fixtures_dir, 'series.html')).decode().replace('{series_id}', series_id)
+                    return self._send(200, page.encode(), 'text/html; charset=utf-8')
+
+                if url.path == '/graph/fredgraph.csv':
+                    fpath = os.path.join(stub.fixtures_dir, 'csv', query.get('id', '') + '.csv')
+                    if not os.path.exists(fpath):
+                        return self._send(404, b'Series does not exist', 'text/plain')
+                    body = _read(fpath)
+                    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                    if self.headers.get('If-None-Match') == etag:
+                        return self._send(304, b'', 'text/csv', {'ETag': etag})
+                    return self._send(200, body, 'text/csv', {'ETag': etag, 'Content-Disposition': f'attachment; filename={query["id"]}.csv'})
+
+                return self._send(404, b'Not Found', 'text/plain')
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        return FredHandler
+
+
+def read_fixture_csv(series_id):
+    """
+    :param series_id: (str) -> the FRED series ID
+
+    :return: (bytes) -> the series CSV served by the stub
+    """
+
+    return _read(os.path.join(FIXTURES_DIR, 'csv', f'{series_id}.csv'))
+
+
+def _read(fpath):
+    """
+    :param fpath: (str) -> the fixture filepath
+
+    :return: (bytes) -> the fixture
+    """
+
+    with open(fpath, 'rb') as f:
+        return f.read()
@@ -0,0 +1,43 @@
+import pytest
+
+from src.core.aggregate import refresh_fact_table, check_fields, QUAKE_FIELDS
+from src.utils.database import execute_queries, get_data
+from src.utils.exceptions import TableExistenceError
+
+
+"""
+Constants
+"""
+TABLE_NAMES = ['test_quakes', 'test_rgdp', 'test_facts', 'test_facts_applied']
+
+
+@pytest.fixture
+def tables(engine):
+    drop_tables = [f'DROP TABLE IF EXISTS {table_name};' for table_name in TABLE_NAMES]
+    execute_queries(drop_tables + [
+        'CREATE TABLE test_quakes ("id" TEXT, "date" TEXT, "magnitude" DOUBLE PRECISION, "country" TEXT);',
+        "INSERT INTO test_quakes VALUES ('a', '01/02/2001', 6.5, 'Chile'), ('b', '2001-05-06', 7.5, 'Chile');",
+        'CREATE TABLE test_rgdp ("Country" TEXT, "Year" INTEGER, "rGDP" DOUBLE PRECISION);',
+        "INSERT INTO test_rgdp VALUES ('Chile', 2001, 100.0);"
+    ], engine)
+    yield engine
+    execute_queries(drop_tables, engine)
+
+
+def test_refresh_fact_table_counts_quakes(tables):
+    assert refresh_fact_table('test_quakes', rgdp_table_name='test_rgdp', fact_table_name='test_facts', engine=tables)[0] == 2
+
+    facts = get_data('SELECT country, year, quake_count, max_magnitude FROM test_facts;', tables)
+    assert facts.values.tolist() == [['Chile', 2001, 2, 7.5]]
+
+
+def test_refresh_fact_table_reports_missing_fields(tables):
+    execute_queries(['ALTER TABLE test_quakes RENAME COLUMN "magnitude" TO "mag";'], tables)
+
+    with pytest.raises(ValueError, match=r"test_quakes is missing required fields \['magnitude'\]"):
+        refresh_fact_table('test_quakes', rgdp_table_name='test_rgdp', fact_table_name='test_facts', engine=tables)
+
+
+def test_check_fields_reports_missing_table(tables):
+    with pytest.raises(TableExistenceError, match='no_such_quakes does not exist'):
+        check_fields('no_such_quakes', QUAKE_FIELDS, tables)
@@ -0,0 +1,81 @@
+import pytest
+import os
+
+from src.core import econbot
+from fred_stub import read_fixture_csv, USA_FNAME, VIET_NAM_FNAME
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.is_closed = False
+
+    def quit(self):
+        self.is_closed = True
+
+
+"""
+Browser scraper
+"""
+def test_fred_url_is_read_at_call_time(monkeypatch):
+    monkeypatch.setenv('FRED_URL', 'http://127.0.0.1:8000/')
+    assert econbot.get_fred_url() == 'http://127.0.0.1:8000'
+
+    monkeypatch.delenv('FRED_URL')
+    assert econbot.get_fred_url() == econbot.DEFAULT_FRED_URL
+
+
+def test_driver_pool_reads_environment_at_call_time(monkeypatch):
+    # Set after the module was imported, as main does with load_dotenv
+    monkeypatch.setenv('FRED_URL', 'http://stand-in')
+    monkeypatch.setenv('N_DRIVERS', '3')
+
+    drivers = []
+    downloads = []
+
+    def get_driver():
+        drivers.append(_FakeDriver())
+        return drivers[-1]
+
+    def download(c, driver, keywords_hierarchy, fred_url):
+        downloads.append((c, driver, fred_url))
+        if c == 'atlantis':
+            raise ValueError(f'No matching series found for {c}')
+
+    monkeypatch.setattr(econbot, 'get_driver', get_driver)
+    monkeypatch.setattr(econbot, '_download_country_rgdp', download)
+
+    assert econbot.get_rgdp_data(['usa', 'viet%20nam', 'chile', 'peru', 'japan'])
+    assert len(drivers) == 3
+    assert all(d.is_closed for d in drivers)
+    assert sorted(c for c, _, _ in downloads) == ['chile', 'japan', 'peru', 'usa', 'viet%20nam']
+    assert {driver for _, driver, _ in downloads} <= set(drivers)
+    assert {fred_url for _, _, fred_url in downloads} == {'http://stand-in'}
+
+    # A failed country fails the run after the others finish, and the browsers still close
+    drivers.clear()
+    downloads.clear()
+    with pytest.raises(Exception, match='1 countries'):
+        econbot.get_rgdp_data(['usa', 'atlantis'])
+    assert len(downloads) == 2
+    assert all(d.is_closed for d in drivers)
+
+
+def test_get_rgdp_data_against_stand_in(fred_stub, monkeypatch, tmp_path):
+    try:
+        econbot.get_driver(str(tmp_path)).quit()
+    except Exception as e:
+        pytest.skip(f'Chrome is not available: {e}')
+
+    monkeypatch.setenv('N_DRIVERS', '2')
+    monkeypatch.setattr(econbot, 'PAGE_TIMEOUT', 5)
+
+    assert econbot.get_rgdp_data(['usa', 'viet%20nam'])
+    assert (tmp_path / USA_FNAME).read_bytes() == read_fixture_csv('RGDPNAUSA')
+    assert (tmp_path / VIET_NAM_FNAME).read_bytes() == read_fixture_csv('RGDPNAVNA')
+    assert len(fred_stub.requested('/graph/fredgraph.csv')) == 2
+
+    # No leftover download directories
+    assert sorted(os.listdir(tmp_path)) == sorted([USA_FNAME, VIET_NAM_FNAME])
+
+    with pytest.raises(Exception, match='1 countries'):
+        econbot.get_rgdp_data(['atlantis'])
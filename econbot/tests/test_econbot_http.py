@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+import os
+
+from src.core import econbot
+from src.utils.cache import SeriesCache
+from fred_stub import read_fixture_csv, USA_FNAME, VIET_NAM_FNAME
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SeriesCache(str(tmp_path / 'series_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+"""
+Browserless fetcher
+"""
+def test_get_rgdp_data_http_downloads_best_series(fred_stub, cache, tmp_path):
+    assert econbot.get_rgdp_data_http(['usa', 'viet%20nam'], requests_per_second=0, cache=cache)
+
+    assert (tmp_path / USA_FNAME).read_bytes() == read_fixture_csv('RGDPNAUSA')
+    assert (tmp_path / VIET_NAM_FNAME).read_bytes() == read_fixture_csv('RGDPNAVNA')
+    assert sorted(r['query']['id'] for r in fred_stub.requested('/graph/fredgraph.csv')) == ['RGDPNAUSA', 'RGDPNAVNA']
+    assert cache.get('usa')['series_id'] == 'RGDPNAUSA'
+    assert not any(f.endswith('.part') for f in os.listdir(tmp_path))
+
+
+def test_get_rgdp_data_http_revalidates_cached_series(fred_stub, cache, tmp_path):
+    econbot.get_rgdp_data_http(['usa', 'viet%20nam'], requests_per_second=0, cache=cache)
+    fred_stub.requests.clear()
+    modified_at = os.path.getmtime(tmp_path / USA_FNAME)
+
+    assert econbot.get_rgdp_data_http(['usa', 'viet%20nam'], requests_per_second=0, cache=cache)
+
+    # Cached countries skip the search page and are answered 304 Not Modified
+    assert fred_stub.requested('/searchresults/') == []
+    csv_requests = fred_stub.requested('/graph/fredgraph.csv')
+    assert len(csv_requests) == 2
+    assert all('If-None-Match' in r['headers'] for r in csv_requests)
+    assert os.path.getmtime(tmp_path / USA_FNAME) == modified_at
+
+
+def test_get_rgdp_data_http_searches_again_for_vanished_series(fred_stub, cache, tmp_path):
+    cache.put('usa', 'RGDPNAUSA_RETIRED', 'Real GDP at Constant National Prices for United States', str(tmp_path / USA_FNAME))
+
+    assert econbot.get_rgdp_data_http(['usa'], requests_per_second=0, cache=cache)
+    assert len(fred_stub.requested('/searchresults/')) == 1
+    assert cache.get('usa')['series_id'] == 'RGDPNAUSA'
+
+
+def test_get_rgdp_data_http_retries_transient_errors(fred_stub, cache, tmp_path):
+    fred_stub.failures['/searchresults/'] = 2
+
+    assert econbot.get_rgdp_data_http(['usa'], requests_per_second=0, cache=cache)
+    assert len(fred_stub.requested('/searchresults/')) == 3
+    assert os.path.exists(tmp_path / USA_FNAME)
+
+
+def test_get_rgdp_data_http_reports_unmatched_countries(fred_stub, cache, tmp_path):
+    with pytest.raises(Exception, match='1 countries'):
+        econbot.get_rgdp_data_http(['usa', 'atlantis'], requests_per_second=0, cache=cache)
+
+    # The other countries are still downloaded
+    assert os.path.exists(tmp_path / USA_FNAME)
+    assert cache.get('atlantis') is None
+
+
+def test_downloaded_series_consolidate(fred_stub, cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(econbot, 'DATA_OUTPUT_DIR', str(tmp_path / 'output'))
+    econbot.get_rgdp_data_http(['usa', 'viet%20nam'], requests_per_second=0, cache=cache)
+
+    rgdp_data = econbot.consolidate_rgdp_data('rgdp.csv', econbot.KEYWORDS_HIERARCHY)
+
+    # Missing observations ('.') are dropped
+    assert sorted(rgdp_data['Country'].unique()) == ['Usa', 'Viet Nam']
+    assert len(rgdp_data) == 4 + 3
+    assert rgdp_data.loc[rgdp_data['Country'] == 'Usa', 'Year'].tolist() == [2015, 2016, 2017, 2018]
+    assert pd.read_csv(tmp_path / 'output' / 'rgdp.csv').shape == (7, 3)
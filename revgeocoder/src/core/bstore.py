@@ -0,0 +1,165 @@
+import pandas as pd
+import geopandas as gpd
+import numpy as np
+import shapely
+
+import os
+
+from src.utils.database import write_table, execute_queries
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Terrain code of land boundaries (terrains are coded in sorted order, so LAND sorts before WATER)
+LAND = 'LAND'
+
+# Vertex count from which boundaries get an edge index for containment tests
+PREPARE_MIN_VERTICES = int(os.getenv('PREPARE_MIN_VERTICES', 500))
+
+
+"""
+Boundary store
+"""
+class BoundaryStore:
+    """
+    Compact, array-backed view of the boundary data. Geometries live in a single NumPy object
+    array and names, countries and terrains are integer-coded, so the reverse geocoder can work
+    with boundary ids (row positions in boundaries_gdf, which is also how the R*-tree is keyed)
+    without slicing GeoDataFrames per point.
+    """
+
+    def __init__(self, boundaries_gdf, name_field='name', admin_field='admin'):
+        """
+        :param boundaries_gdf: (gpd.GeoDataFrame) -> the boundary data
+        :param name_field: (str) -> the field holding the province names
+        :param admin_field: (str) -> the field holding the country names
+        """
+
+        # Basic validation
+        if not isinstance(boundaries_gdf, gpd.GeoDataFrame):
+            LOGGER.error('boundaries_gdf must be a GeoDataFrame')
+            raise TypeError('boundaries_gdf must be a GeoDataFrame')
+
+        required_fields = [name_field, admin_field, 'TERRAIN', 'geometry']
+        missing_fields = [field for field in required_fields if field not in boundaries_gdf.columns]
+        if missing_fields:
+            LOGGER.error(f'boundaries_gdf is missing required fields: {missing_fields}')
+            raise ValueError(f'boundaries_gdf is missing required fields: {missing_fields}')
+
+        LOGGER.info('Building boundary store...')
+        print('Building boundary store...', flush=True)
+
+        self.geometries = boundaries_gdf.geometry.to_numpy()
+        self.name_codes, self.names = _encode(boundaries_gdf[name_field])
+        self.admin_codes, self.admins = _encode(boundaries_gdf[admin_field])
+        self.terrain_codes, self.terrains = _encode(boundaries_gdf['TERRAIN'])
+        self.is_land = self.terrains[self.terrain_codes] == LAND
+        prepare_large(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def sort_candidates(self, boundary_ids):
+        """
+        Orders candidate boundaries by terrain (land first), keeping the given order within a terrain.
+
+        :param boundary_ids: (np.ndarray) -> the candidate boundary ids
+
+        :return: (np.ndarray) -> the sorted boundary ids
+        """
+
+        return boundary_ids[np.argsort(self.terrain_codes[boundary_ids], kind='stable')]
+
+    def decode(self, boundary_ids):
+        """
+        Expands boundary ids into province and country names.
+
+        :param boundary_ids: (np.ndarray) -> the boundary ids, -1 where no boundary was found
+
+        :return: (np.ndarray, np.ndarray) -> the provinces, the countries (None where no boundary was found)
+        """
+
+        boundary_ids = np.asarray(boundary_ids, dtype=np.int64)
+        is_found = boundary_ids >= 0
+        safe_ids = np.where(is_found, boundary_ids, 0)
+
+        provinces = np.where(is_found, self.names[self.name_codes[safe_ids]], None)
+        countries = np.where(is_found, self.admins[self.admin_codes[safe_ids]], None)
+
+        return provinces, countries
+
+    def to_locations(self):
+        """
+        Builds the locations dimension table, one row per boundary id.
+
+        :return: (pd.DataFrame) -> the locations (fields: id, province, country, terrain)
+        """
+
+        return pd.DataFrame({
+            'id': np.arange(len(self), dtype=np.int32),
+            'province': self.names[self.name_codes],
+            'country': self.admins[self.admin_codes],
+            'terrain': self.terrains[self.terrain_codes]
+        })
+
+
+def load_locations(boundary_store, locations_table_name, engine):
+    """
+    Writes the locations dimension table that location_id values refer to.
+
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param locations_table_name: (str) -> the name of the locations table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int) -> the number of locations
+    """
+
+    LOGGER.info(f'Loading locations into {locations_table_name}...')
+    print(f'Loading locations into {locations_table_name}...', flush=True)
+
+    locations = boundary_store.to_locations()
+    write_table(locations, table_name=locations_table_name, if_exists='replace', engine=engine)
+    execute_queries([f'ALTER TABLE {locations_table_name} ADD PRIMARY KEY ("id");'], engine)
+
+    return len(locations)
+
+
+def prepare_large(geometries, min_vertices=PREPARE_MIN_VERTICES):
+    """
+    Builds an edge index into every geometry with at least min_vertices vertices. GEOS indexes
+    the edges of a prepared polygon in an interval tree over their y-extents, so a containment
+    test only runs the ray-crossing check on the edges spanning the query point's latitude
+    instead of on every vertex. The huge boundaries (oceans, Russia, Canada, Antarctica) are the
+    ones nearly every point is tested against; small ones are cheaper to test directly.
+
+    :param geometries: (np.ndarray) -> the geometries, prepared in place
+    :param min_vertices: (int) -> the vertex count from which geometries are prepared
+
+    :return: (int) -> the number of geometries prepared
+    """
+
+    is_large = shapely.get_num_coordinates(geometries) >= min_vertices
+    shapely.prepare(geometries[is_large])
+
+    LOGGER.info(f'Prepared {int(is_large.sum())} boundaries with at least {min_vertices} vertices')
+
+    return int(is_large.sum())
+
+
+def _encode(values):
+    """
+    Integer-codes a field.
+
+    :param values: (pd.Series) -> the field values
+
+    :return: (np.ndarray, np.ndarray) -> the codes (int32), the distinct values in sorted order followed by None
+    """
+
+    codes, uniques = pd.factorize(values, sort=True)
+
+    # Missing values get the last code, which decodes to None and sorts after every other value
+    codes[codes < 0] = len(uniques)
+
+    return codes.astype(np.int32), np.append(uniques.to_numpy(dtype=object), None)
@@ -0,0 +1,277 @@
+import pyarrow.parquet as pq
+import pyarrow.ipc as ipc
+import pyarrow as pa
+import numpy as np
+
+import multiprocessing
+import time
+import os
+
+from src.utils.fileio import read_chunks, resolve_columns, CHUNK_SIZE
+from src.utils.batching import AdaptiveBatchSizer, BATCH_SIZE
+from src.utils.progress import ProgressReporter
+from src.core.rgc import geocode_points
+from src import TOP_DIR, LOGGER
+
+
+"""
+Local Constants
+"""
+# Directory holding the extracted coordinate arrays and the location id array
+MEMMAP_DIR = os.getenv('MEMMAP_DIR', os.path.join(TOP_DIR, 'data/memmap/'))
+
+# Array files, one element per input row
+LATITUDE_FNAME = 'latitude.npy'
+LONGITUDE_FNAME = 'longitude.npy'
+ROW_ID_FNAME = 'row_id.npy'
+LOCATION_ID_FNAME = 'location_id.npy'
+
+# Number of geocoding processes (1 geocodes in the calling process)
+WORKERS = int(os.getenv('WORKERS', 1))
+
+# State of a geocoding process, set once when it attaches to the shared data
+_worker_state = {}
+
+
+"""
+Coordinate extraction
+"""
+def extract_coordinates(input_fpath, input_fmt, coords_dir=MEMMAP_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Copies the latitude and longitude columns of the input file into contiguous float64 .npy
+    arrays, along with an int64 array of row ids (each row's position in the file). The arrays
+    are written through memory maps, so the pre-pass holds one chunk in memory at a time.
+
+    :param input_fpath: (str) -> the input filepath
+    :param input_fmt: (str) -> the input format ('CSV', 'PARQUET' or 'ARROW')
+    :param coords_dir: (str) -> the directory the arrays are written to
+    :param chunk_size: (int) -> the number of rows read at a time
+
+    :return: (int) -> the number of rows extracted
+    """
+
+    LOGGER.info(f'Extracting coordinates from {input_fpath} into {coords_dir}...')
+    print(f'Extracting coordinates from {input_fpath} into {coords_dir}...', flush=True)
+
+    os.makedirs(coords_dir, exist_ok=True)
+    n_rows = count_rows(input_fpath, input_fmt, chunk_size=chunk_size)
+    latitude_field, longitude_field = resolve_columns(input_fpath, input_fmt, ['latitude', 'longitude'])
+
+    latitudes = np.lib.format.open_memmap(os.path.join(coords_dir, LATITUDE_FNAME), mode='w+', dtype=np.float64, shape=(n_rows,))
+    longitudes = np.lib.format.open_memmap(os.path.join(coords_dir, LONGITUDE_FNAME), mode='w+', dtype=np.float64, shape=(n_rows,))
+    row_ids = np.lib.format.open_memmap(os.path.join(coords_dir, ROW_ID_FNAME), mode='w+', dtype=np.int64, shape=(n_rows,))
+
+    offset = 0
+    try:
+        for chunk in read_chunks(input_fpath, input_fmt, columns=[latitude_field, longitude_field], chunk_size=chunk_size):
+            end = offset + len(chunk)
+            if end > n_rows:
+                raise ValueError(f'{input_fpath} holds more than the {n_rows} rows counted')
+
+            latitudes[offset:end] = chunk[latitude_field].to_numpy(dtype=np.float64, na_value=np.nan)
+            longitudes[offset:end] = chunk[longitude_field].to_numpy(dtype=np.float64, na_value=np.nan)
+            row_ids[offset:end] = np.arange(offset, end, dtype=np.int64)
+            offset = end
+
+        if offset != n_rows:
+            raise ValueError(f'{input_fpath} holds {offset} rows, {n_rows} were counted')
+    except Exception as e:
+        LOGGER.error(f'Failed to extract coordinates: {e}')
+        raise
+    finally:
+        for array in (latitudes, longitudes, row_ids):
+            array.flush()
+
+    LOGGER.info(f'Extracted {n_rows} coordinates')
+    print(f'Extracted {n_rows} coordinates', flush=True)
+
+    return n_rows
+
+
+def count_rows(fpath, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Counts the rows of a data file. Columnar formats record their row counts; CSV rows are
+    counted by the same parser that reads them, over a single column, since line breaks do not
+    map to rows (quoted fields may hold line breaks and blank lines are skipped).
+
+    :param fpath: (str) -> the filepath
+    :param fmt: (str) -> the file format ('CSV', 'PARQUET' or 'ARROW')
+    :param chunk_size: (int) -> the number of CSV rows parsed at a time
+
+    :return: (int) -> the number of rows
+    """
+
+    if fmt == 'PARQUET':
+        return pq.ParquetFile(fpath).metadata.num_rows
+
+    if fmt == 'ARROW':
+        with pa.memory_map(fpath) as source:
+            reader = ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+    if fmt != 'CSV':
+        LOGGER.error(f'Unsupported format: {fmt}')
+        raise ValueError(f'Unsupported format: {fmt}')
+
+    return sum(len(chunk) for chunk in read_chunks(fpath, fmt, columns=['latitude'], chunk_size=chunk_size))
+
+
+def open_coordinates(coords_dir=MEMMAP_DIR):
+    """
+    Maps the extracted coordinate arrays read-only. Nothing is read until it is sliced.
+
+    :param coords_dir: (str) -> the directory holding the arrays
+
+    :return: (np.memmap, np.memmap, np.memmap) -> the latitudes, the longitudes, the row ids
+    """
+
+    return tuple(np.load(os.path.join(coords_dir, fname), mmap_mode='r')
+                 for fname in (LATITUDE_FNAME, LONGITUDE_FNAME, ROW_ID_FNAME))
+
+
+"""
+Reverse geocoding
+"""
+def geocode_memmap(rtree_obj, boundary_store, coords_dir=MEMMAP_DIR, batch_sizer=None, reporter=None):
+    """
+    Reverse geocodes the extracted coordinates slice by slice and writes the location id of every
+    row (-1 where no boundary was found) into a memory-mapped int32 array. Only the current slice
+    is copied into memory, so the footprint is bounded by the batch size and the OS page cache,
+    not the size of the dataset.
+
+    :param rtree_obj: (rtree.index.Index | HierarchicalIndex) -> the spatial index
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param coords_dir: (str) -> the directory holding the arrays
+    :param batch_sizer: (AdaptiveBatchSizer) -> tunes the slice size between slices, a default one if None
+    :param reporter: (ProgressReporter) -> reports progress after every slice, a default one if None
+
+    :return: (np.memmap) -> the location ids, in row order
+    """
+
+    LOGGER.info('Reverse geocoding memory-mapped coordinates...')
+    print('Reverse geocoding memory-mapped coordinates...', flush=True)
+
+    latitudes, longitudes, _ = open_coordinates(coords_dir)
+    n_rows = len(latitudes)
+    location_ids = np.lib.format.open_memmap(os.path.join(coords_dir, LOCATION_ID_FNAME), mode='w+', dtype=np.int32, shape=(n_rows,))
+
+    if batch_sizer is None:
+        batch_sizer = AdaptiveBatchSizer()
+    if reporter is None:
+        reporter = ProgressReporter(total_rows=n_rows)
+    offset = 0
+    try:
+        while offset < n_rows:
+            end = min(offset + batch_sizer.size, n_rows)
+            LOGGER.info(f'Processing rows {offset}-{end - 1} of {n_rows}...')
+
+            # Page the slice in
+            io_start = time.perf_counter()
+            batch_latitudes = np.array(latitudes[offset:end])
+            batch_longitudes = np.array(longitudes[offset:end])
+            io_time = time.perf_counter() - io_start
+
+            compute_start = time.perf_counter()
+            stats = {'fallbacks': 0, 'errors': 0}
+            location_ids[offset:end] = geocode_points(batch_latitudes, batch_longitudes, rtree_obj, boundary_store, stats=stats)
+            compute_time = time.perf_counter() - compute_start
+
+            batch_sizer.update(end - offset, io_time=io_time, compute_time=compute_time)
+            reporter.update(end - offset, n_fallbacks=stats['fallbacks'], n_errors=stats['errors'])
+            offset = end
+    except Exception as e:
+        LOGGER.error(f'Failed in reverse geocoding process: {e}')
+        raise
+    finally:
+        location_ids.flush()
+        reporter.close()
+
+    LOGGER.info(f'Batch sizing: {batch_sizer.summary()}')
+    print(f'Batch sizing: {batch_sizer.summary()}', flush=True)
+
+    return location_ids
+
+
+def geocode_memmap_parallel(shared_dir, coords_dir=MEMMAP_DIR, n_workers=WORKERS, slice_size=BATCH_SIZE, reporter=None, cache_mb=None):
+    """
+    Reverse geocodes the extracted coordinates with a pool of processes. Each process attaches to
+    the published boundary bundle and to the coordinate and location id arrays through memory
+    maps instead of receiving copies, and the geometry cache budget is split between the
+    processes, so adding processes does not add cache memory. Slices are handed out one at a
+    time and each process writes its results straight into the mapped location id array.
+
+    :param shared_dir: (str) -> the published boundary bundle (see publish_boundaries)
+    :param coords_dir: (str) -> the directory holding the arrays
+    :param n_workers: (int) -> the number of processes
+    :param slice_size: (int) -> the number of rows per slice
+    :param reporter: (ProgressReporter) -> reports progress after every slice, a default one if None
+    :param cache_mb: (float) -> the memory (MB) all processes may spend on decoded geometries, GEOMETRY_CACHE_MB if None
+
+    :return: (np.memmap) -> the location ids, in row order
+    """
+
+    from src.core.shared import GEOMETRY_CACHE_MB
+
+    worker_cache_mb = (GEOMETRY_CACHE_MB if cache_mb is None else cache_mb) / n_workers
+
+    LOGGER.info(f'Reverse geocoding memory-mapped coordinates with {n_workers} processes ({worker_cache_mb:.0f} MB geometry cache each)...')
+    print(f'Reverse geocoding memory-mapped coordinates with {n_workers} processes ({worker_cache_mb:.0f} MB geometry cache each)...', flush=True)
+
+    n_rows = len(open_coordinates(coords_dir)[0])
+    location_ids_fpath = os.path.join(coords_dir, LOCATION_ID_FNAME)
+    np.lib.format.open_memmap(location_ids_fpath, mode='w+', dtype=np.int32, shape=(n_rows,)).flush()
+
+    if reporter is None:
+        reporter = ProgressReporter(total_rows=n_rows)
+    slices = [(start, min(start + slice_size, n_rows)) for start in range(0, n_rows, slice_size)]
+    try:
+        # Spawned processes start empty instead of inheriting (and gradually copying) this one's heap
+        with multiprocessing.get_context('spawn').Pool(n_workers, initializer=_attach_worker, initargs=(shared_dir, coords_dir, worker_cache_mb)) as pool:
+            for n_slice_rows, stats in pool.imap_unordered(_geocode_slice, slices):
+                reporter.update(n_slice_rows, n_fallbacks=stats['fallbacks'], n_errors=stats['errors'])
+    except Exception as e:
+        LOGGER.error(f'Failed in reverse geocoding process: {e}')
+        raise
+    finally:
+        reporter.close()
+
+    return np.load(location_ids_fpath, mmap_mode='r')
+
+
+def _attach_worker(shared_dir, coords_dir, cache_mb):
+    """
+    Maps the shared boundary bundle and the arrays into a geocoding process.
+
+    :param shared_dir: (str) -> the published boundary bundle
+    :param coords_dir: (str) -> the directory holding the arrays
+    :param cache_mb: (float) -> the memory (MB) this process may spend on decoded geometries
+
+    :return: None
+    """
+
+    from src.core.shared import SharedBoundaryStore, open_shared_rtree
+
+    _worker_state['rtree_obj'] = open_shared_rtree(shared_dir)
+    _worker_state['boundary_store'] = SharedBoundaryStore(shared_dir, cache_mb=cache_mb)
+    _worker_state['latitudes'], _worker_state['longitudes'], _ = open_coordinates(coords_dir)
+    _worker_state['location_ids'] = np.load(os.path.join(coords_dir, LOCATION_ID_FNAME), mmap_mode='r+')
+
+
+def _geocode_slice(bounds):
+    """
+    Geocodes one slice of rows in a geocoding process.
+
+    :param bounds: (int, int) -> the first row, the row past the end
+
+    :return: (int, dict) -> the number of rows geocoded, the fallback and error counts
+    """
+
+    start, end = bounds
+    stats = {'fallbacks': 0, 'errors': 0}
+    location_ids = _worker_state['location_ids']
+    location_ids[start:end] = geocode_points(np.array(_worker_state['latitudes'][start:end]),
+                                             np.array(_worker_state['longitudes'][start:end]),
+                                             _worker_state['rtree_obj'], _worker_state['boundary_store'], stats=stats)
+    location_ids.flush()
+
+    return end - start, stats
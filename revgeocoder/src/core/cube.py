@@ -0,0 +1,226 @@
+import pandas as pd
+import numpy as np
+
+import os
+
+from src.utils.fileio import read_chunks, ChunkWriter, CHUNK_SIZE
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Deepest map zoom level binned (slippy-map tiles, 4^z tiles at level z)
+MAX_ZOOM = int(os.getenv('CUBE_MAX_ZOOM', 8))
+
+# Lower bounds of the magnitude bands
+MAGNITUDE_BANDS = np.array([0, 5.5, 6, 6.5, 7, 7.5, 8], dtype=np.float64)
+
+# Latitude limit of the Web Mercator projection
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+# Input fields used by the cube (matched case-insensitively)
+CUBE_FIELDS = ['Date', 'Time', 'Latitude', 'Longitude', 'Magnitude', 'province', 'country']
+
+# Cell keys of each cube
+TILE_KEYS = ['year', 'min_magnitude', 'zoom', 'x', 'y']
+REGION_KEYS = ['year', 'min_magnitude', 'country', 'province']
+
+# Output files
+TILES_FNAME = 'tiles.parquet'
+REGIONS_FNAME = 'regions.parquet'
+
+
+"""
+Cube builder
+"""
+def build_cube(input_fpath, input_fmt, output_dir, chunk_size=CHUNK_SIZE, max_zoom=MAX_ZOOM):
+    """
+    Bins the geocoded earthquakes into two pre-aggregated cubes so map views can filter by
+    year and magnitude without scanning raw rows:
+      - tiles: (year, magnitude band, zoom, x, y) for every zoom level up to max_zoom
+      - regions: (year, magnitude band, country, province)
+    Each cell holds the number of quakes, their centroid and the times of the first and last
+    quake. The input is streamed chunk by chunk and each chunk is folded into the running cells.
+
+    :param input_fpath: (str) -> the geocoded data file (Revgeocoder output)
+    :param input_fmt: (str) -> the file format ('CSV', 'PARQUET' or 'ARROW')
+    :param output_dir: (str) -> the directory the cubes are written to
+    :param chunk_size: (int) -> the number of rows processed at a time
+    :param max_zoom: (int) -> the deepest zoom level binned
+
+    :return: (int, int) -> the number of tile cells, the number of region cells
+    """
+
+    LOGGER.info(f'Building tile and region cubes from {input_fpath}...')
+    print(f'Building tile and region cubes from {input_fpath}...', flush=True)
+
+    tiles = None
+    regions = None
+    n_skipped = 0
+    for chunk in read_chunks(input_fpath, input_fmt, columns=CUBE_FIELDS, chunk_size=chunk_size):
+        chunk.columns = [c.lower() for c in chunk.columns]
+        quakes = _prepare_quakes(chunk)
+        n_skipped += len(chunk) - len(quakes)
+
+        tile_cells = []
+        for zoom in range(max_zoom + 1):
+            x, y = _get_tiles(quakes['latitude'].to_numpy(), quakes['longitude'].to_numpy(), zoom)
+            tile_cells.append(_aggregate(quakes.assign(zoom=zoom, x=x, y=y), TILE_KEYS))
+        tiles = _combine(tiles, pd.concat(tile_cells, ignore_index=True), TILE_KEYS)
+        regions = _combine(regions, _aggregate(quakes, REGION_KEYS), REGION_KEYS)
+
+    if n_skipped:
+        LOGGER.info(f'Skipped {n_skipped} rows with unparsable dates or missing coordinates')
+
+    tiles = _finalize(tiles, TILE_KEYS)
+    regions = _finalize(regions, REGION_KEYS)
+
+    for cells, fname in [(tiles, TILES_FNAME), (regions, REGIONS_FNAME)]:
+        with ChunkWriter(os.path.join(output_dir, fname), 'PARQUET') as writer:
+            writer.write(cells)
+
+    LOGGER.info(f'Wrote {len(tiles)} tile cells and {len(regions)} region cells to {output_dir}')
+    print(f'Wrote {len(tiles)} tile cells and {len(regions)} region cells to {output_dir}', flush=True)
+
+    return len(tiles), len(regions)
+
+
+def parse_timestamps(dates, times):
+    """
+    Parses the Date and Time fields into timestamps in a vectorized fashion. Most dates are
+    MM/DD/YYYY with the time in a separate field; the rest are full ISO 8601 timestamps.
+
+    :param dates: (pd.Series) -> the Date field
+    :param times: (pd.Series) -> the Time field
+
+    :return: (pd.Series) -> the timestamps (NaT where unparsable)
+    """
+
+    dates = dates.astype(str)
+    timestamps = pd.to_datetime(dates, format='%m/%d/%Y', errors='coerce')
+    timestamps = timestamps + pd.to_timedelta(times.astype(str), errors='coerce').fillna(pd.Timedelta(0))
+
+    is_iso = timestamps.isna()
+    if is_iso.any():
+        iso_timestamps = pd.to_datetime(dates[is_iso], format='ISO8601', errors='coerce', utc=True)
+        timestamps[is_iso] = iso_timestamps.dt.tz_localize(None)
+
+    return timestamps
+
+
+def _prepare_quakes(chunk):
+    """
+    Derives the cube dimensions of each quake.
+
+    :param chunk: (pd.DataFrame) -> the geocoded data (lowercased field names)
+
+    :return: (pd.DataFrame) -> the quakes with year, min_magnitude, latitude, longitude, timestamp, country and province
+    """
+
+    timestamps = parse_timestamps(chunk['date'], chunk['time'])
+    magnitudes = chunk['magnitude'].to_numpy(dtype=np.float64)
+    band_idx = np.clip(np.searchsorted(MAGNITUDE_BANDS, magnitudes, side='right') - 1, 0, None)
+
+    quakes = pd.DataFrame({
+        'year': timestamps.dt.year,
+        'min_magnitude': MAGNITUDE_BANDS[band_idx],
+        'latitude': chunk['latitude'].to_numpy(dtype=np.float64),
+        'longitude': chunk['longitude'].to_numpy(dtype=np.float64),
+        'timestamp': timestamps,
+        'country': chunk['country'].to_numpy(dtype=object),
+        'province': chunk['province'].to_numpy(dtype=object)
+    })
+
+    return quakes.dropna(subset=['year', 'latitude', 'longitude'])
+
+
+def _get_tiles(latitudes, longitudes, zoom):
+    """
+    Maps coordinates onto Web Mercator (slippy-map) tiles.
+
+    :param latitudes: (np.ndarray) -> the latitudes
+    :param longitudes: (np.ndarray) -> the longitudes
+    :param zoom: (int) -> the zoom level
+
+    :return: (np.ndarray, np.ndarray) -> the tile x and y indices
+    """
+
+    n = 2 ** zoom
+    latitudes = np.radians(np.clip(latitudes, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE))
+    x = np.floor((longitudes + 180) / 360 * n)
+    y = np.floor((1 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2 * n)
+
+    return np.clip(x, 0, n - 1).astype(np.int32), np.clip(y, 0, n - 1).astype(np.int32)
+
+
+def _aggregate(quakes, keys):
+    """
+    Aggregates quakes into cells.
+
+    :param quakes: (pd.DataFrame) -> the quakes
+    :param keys: (list<str>) -> the cell keys
+
+    :return: (pd.DataFrame) -> the cells with count, coordinate sums and first/last event
+    """
+
+    return quakes.groupby(keys, sort=False, dropna=False).agg(
+        count=('latitude', 'size'),
+        latitude_sum=('latitude', 'sum'),
+        longitude_sum=('longitude', 'sum'),
+        first_event=('timestamp', 'min'),
+        last_event=('timestamp', 'max')
+    ).reset_index()
+
+
+def _combine(cells, new_cells, keys):
+    """
+    Folds new cells into the running cells.
+
+    :param cells: (pd.DataFrame) -> the running cells, None before the first chunk
+    :param new_cells: (pd.DataFrame) -> the cells of the current chunk
+    :param keys: (list<str>) -> the cell keys
+
+    :return: (pd.DataFrame) -> the combined cells
+    """
+
+    if cells is None:
+        return new_cells
+
+    return pd.concat([cells, new_cells], ignore_index=True).groupby(keys, sort=False, dropna=False).agg(
+        count=('count', 'sum'),
+        latitude_sum=('latitude_sum', 'sum'),
+        longitude_sum=('longitude_sum', 'sum'),
+        first_event=('first_event', 'min'),
+        last_event=('last_event', 'max')
+    ).reset_index()
+
+
+def _finalize(cells, keys):
+    """
+    Turns coordinate sums into centroids and narrows the dtypes.
+
+    :param cells: (pd.DataFrame) -> the cells, None if there was no data
+    :param keys: (list<str>) -> the cell keys
+
+    :return: (pd.DataFrame) -> the cells, sorted by key
+    """
+
+    if cells is None:
+        cells = pd.DataFrame(columns=keys + ['count', 'latitude_sum', 'longitude_sum', 'first_event', 'last_event'])
+
+    cells = cells.assign(
+        year=cells['year'].astype(np.int16),
+        min_magnitude=cells['min_magnitude'].astype(np.float32),
+        count=cells['count'].astype(np.int32),
+        latitude=(cells['latitude_sum'] / cells['count']).astype(np.float32),
+        longitude=(cells['longitude_sum'] / cells['count']).astype(np.float32),
+        first_event=pd.to_datetime(cells['first_event']),
+        last_event=pd.to_datetime(cells['last_event'])
+    )
+    if 'zoom' in keys:
+        cells = cells.astype({'zoom': np.int8, 'x': np.int32, 'y': np.int32})
+
+    columns = keys + ['count', 'latitude', 'longitude', 'first_event', 'last_event']
+
+    return cells[columns].sort_values(keys, na_position='last').reset_index(drop=True)
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+
+from src.utils.database import write_table, execute_queries, table_exists
+from src.core.zones import EEZ_THRESHOLD
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# SRID of the boundary data (WGS 84)
+GLOBAL_SRID = 4326
+
+# Boundaries nearest in degrees (GiST KNN order) that are re-ranked by geodesic distance
+KNN_CANDIDATES = 16
+
+
+"""
+Boundary table
+"""
+def load_boundaries(boundaries_gdf, boundary_table_name, engine, name_field='name', admin_field='admin'):
+    """
+    Loads the boundary data into a PostGIS table with a GiST index. Boundaries are keyed by
+    their row position, which is also their location id. An existing table is reused as is
+    (the driver drops it first when it was built from other boundary data).
+
+    :param boundaries_gdf: (gpd.GeoDataFrame) -> the boundary data
+    :param boundary_table_name: (str) -> the name of the boundary table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (bool) -> indicates whether the table was built
+    """
+
+    import geopandas as gpd
+
+    # Basic validation
+    if not isinstance(boundaries_gdf, gpd.GeoDataFrame):
+        LOGGER.error('boundaries_gdf must be a GeoDataFrame')
+        raise TypeError('boundaries_gdf must be a GeoDataFrame')
+
+    execute_queries(['CREATE EXTENSION IF NOT EXISTS postgis;'], engine)
+
+    if table_exists(boundary_table_name, engine):
+        LOGGER.info(f'Boundary table {boundary_table_name} already exists, reusing it...')
+        print(f'Boundary table {boundary_table_name} already exists, reusing it...', flush=True)
+        return False
+
+    LOGGER.info(f'Loading boundaries into {boundary_table_name}...')
+    print(f'Loading boundaries into {boundary_table_name}...', flush=True)
+
+    # Ship geometries as hex WKB through a staging table, then convert them server-side
+    staging_table_name = f'{boundary_table_name}_staging'
+    staging_data = pd.DataFrame({
+        'id': np.arange(len(boundaries_gdf), dtype=np.int32),
+        'name': boundaries_gdf[name_field].to_numpy(),
+        'admin': boundaries_gdf[admin_field].to_numpy(),
+        'terrain': boundaries_gdf['TERRAIN'].to_numpy(),
+        'wkb': boundaries_gdf.geometry.to_wkb(hex=True).to_numpy()
+    })
+    write_table(staging_data, table_name=staging_table_name, if_exists='replace', engine=engine)
+
+    execute_queries([
+        f'''
+        CREATE TABLE {boundary_table_name} AS
+        SELECT id,
+               name,
+               admin,
+               terrain,
+               ST_MakeValid(ST_SetSRID(ST_GeomFromWKB(decode(wkb, 'hex')), {GLOBAL_SRID})) AS geometry
+        FROM {staging_table_name};
+        ''',
+        f'ALTER TABLE {boundary_table_name} ADD PRIMARY KEY (id);',
+        f'CREATE INDEX {boundary_table_name}_geometry_idx ON {boundary_table_name} USING GIST (geometry);',
+        f'DROP TABLE {staging_table_name};',
+        f'ANALYZE {boundary_table_name};'
+    ], engine)
+
+    return True
+
+
+"""
+Reverse geocoding algorithm
+"""
+def reverse_geocode_postgis(data_table_name, boundary_table_name, engine):
+    """
+    Reverse geocodes every point in the data table inside the database with a single
+    set-based UPDATE. Follows the rules of rgc.pip:
+      - points inside a land boundary take it (land wins over water when both contain the point)
+      - points in water, or in no boundary at all, take the nearest land boundary within the
+        EEZ
+      - remaining unmatched points take the nearest boundary of any terrain
+    The nearest boundaries are found differently, so the fallbacks can disagree near coasts:
+    rgc.pip only weighs the boundaries whose envelope holds the point, while this query takes
+    the KNN_CANDIDATES boundaries nearest in degrees (a KNN search over the GiST index) and
+    ranks them by geodesic distance. A boundary across the antimeridian is never among them.
+
+    :param data_table_name: (str) -> the name of the data table
+    :param boundary_table_name: (str) -> the name of the boundary table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (int) -> the number of rows geocoded
+    """
+
+    LOGGER.info('Reverse geocoding coordinates in database...')
+    print('Reverse geocoding coordinates in database...', flush=True)
+
+    geocoding_query = f'''
+        WITH points AS (
+            SELECT ctid AS row_ctid,
+                   ST_SetSRID(ST_MakePoint("longitude", "latitude"), {GLOBAL_SRID}) AS pt
+            FROM {data_table_name}
+        ),
+        enclosing AS (
+            SELECT p.row_ctid, p.pt, e.id, e.terrain
+            FROM points p
+            LEFT JOIN LATERAL (
+                SELECT b.id, b.terrain
+                FROM {boundary_table_name} b
+                WHERE ST_Contains(b.geometry, p.pt)
+                ORDER BY b.terrain ASC
+                LIMIT 1
+            ) e ON TRUE
+        ),
+        resolved AS (
+            SELECT en.row_ctid,
+                   CASE WHEN c.dist_km < {EEZ_THRESHOLD} THEN c.id
+                        WHEN en.id IS NOT NULL THEN en.id
+                        ELSE n.id END AS location_id
+            FROM enclosing en
+            LEFT JOIN LATERAL (
+                SELECT k.id,
+                       ST_Distance(k.geometry::geography, en.pt::geography) / 1000 AS dist_km
+                FROM (
+                    SELECT b.id, b.geometry
+                    FROM {boundary_table_name} b
+                    WHERE b.terrain = 'LAND'
+                    ORDER BY b.geometry <-> en.pt
+                    LIMIT {KNN_CANDIDATES}
+                ) k
+                ORDER BY dist_km, k.id
+                LIMIT 1
+            ) c ON en.terrain IS DISTINCT FROM 'LAND'
+            LEFT JOIN LATERAL (
+                SELECT k.id
+                FROM (
+                    SELECT b.id, b.geometry
+                    FROM {boundary_table_name} b
+                    ORDER BY b.geometry <-> en.pt
+                    LIMIT {KNN_CANDIDATES}
+                ) k
+                ORDER BY ST_Distance(k.geometry::geography, en.pt::geography), k.id
+                LIMIT 1
+            ) n ON en.id IS NULL
+        )
+        UPDATE {data_table_name} d
+        SET "location_id" = r.location_id
+        FROM resolved r
+        WHERE d.ctid = r.row_ctid;
+        '''
+
+    try:
+        rowcount = execute_queries([geocoding_query], engine)[0]
+    except Exception as e:
+        LOGGER.error(f'Failed in PostGIS reverse geocoding process: {e}')
+        raise
+
+    LOGGER.info(f'Reverse geocoded {rowcount} rows in database')
+    print(f'Reverse geocoded {rowcount} rows in database', flush=True)
+
+    return rowcount
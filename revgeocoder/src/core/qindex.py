@@ -1,5 +1,7 @@
 from rtree import index
 import geopandas as gpd
+import numpy as np
+import shapely
 import os
 
 from src import LOGGER
@@ -46,3 +48,86 @@ def build_rtree(mbrs_gdf):
 
 
 
+def build_hierarchical_index(boundary_store):
+    """
+    Builds a two-level spatial index: country outlines (the LAND boundaries of each country,
+    dissolved) at the top, each pointing to an R*-tree of that country's own boundaries.
+
+    :param boundary_store: (BoundaryStore) -> the boundary data
+
+    :return: (HierarchicalIndex) -> the index
+    """
+
+    LOGGER.info('Building hierarchical country/province index...')
+    print('Building hierarchical country/province index...', flush=True)
+
+    try:
+        hierarchical_index = HierarchicalIndex(boundary_store)
+    except Exception as e:
+        LOGGER.error(f'Failed to build hierarchical index: {e}')
+        raise
+
+    LOGGER.info(f'Indexed {len(hierarchical_index.province_trees)} countries')
+
+    return hierarchical_index
+
+
+class HierarchicalIndex:
+    """
+    Country-then-province index. A point inside a country outline only has to be tested
+    against that country's boundaries; points outside every outline (at sea, or in gaps
+    between outlines) fall back to the boundaries of every country whose outline box holds
+    them, which is what a flat R*-tree would return.
+    """
+
+    def __init__(self, boundary_store):
+        """
+        :param boundary_store: (BoundaryStore) -> the boundary data
+        """
+
+        n_countries = len(boundary_store.admins)
+        boundary_ids = np.arange(len(boundary_store), dtype=np.int64)
+
+        self.outlines = np.full(n_countries, None, dtype=object)
+        self.province_trees = {}
+        country_entries = []
+        for admin_code in np.unique(boundary_store.admin_codes):
+            country_ids = boundary_ids[boundary_store.admin_codes == admin_code]
+            geometries = boundary_store.geometries[country_ids]
+
+            # Boundaries of the country (bulk-loaded, keyed by boundary id)
+            self.province_trees[admin_code] = index.Index(
+                ((i, geometry.bounds, None) for i, geometry in zip(country_ids, geometries)))
+
+            # Dissolved land outline of the country (water-only entries such as oceans get none,
+            # so they never restrict the search and coastlines stay reachable from the sea)
+            land_geometries = geometries[boundary_store.is_land[country_ids]]
+            if len(land_geometries):
+                outline = shapely.union_all(land_geometries)
+                shapely.prepare(outline)
+                self.outlines[admin_code] = outline
+            country_entries.append((int(admin_code), shapely.total_bounds(geometries), None))
+
+        self.country_tree = index.Index(iter(country_entries))
+
+    def candidates(self, point):
+        """
+        Finds the boundaries that may contain the point.
+
+        :param point: (shapely.Point) -> the query point
+
+        :return: (np.ndarray) -> the candidate boundary ids
+        """
+
+        admin_codes = list(self.country_tree.intersection(point.bounds))
+        for admin_code in admin_codes:
+            outline = self.outlines[admin_code]
+            if outline is not None and outline.contains(point):
+                admin_codes = [admin_code]
+                break
+
+        candidate_ids = []
+        for admin_code in admin_codes:
+            candidate_ids.extend(self.province_trees[admin_code].intersection(point.bounds))
+
+        return np.array(candidate_ids, dtype=np.int64)
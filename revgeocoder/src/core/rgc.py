@@ -1,5 +1,5 @@
 import pandas as pd
-import geopandas as gpd
+import numpy as np
 
 import rtree
 
@@ -7,156 +7,132 @@ from shapely.geometry import Point, MultiPolygon
 from shapely.ops import nearest_points
 
 import math
-import os
+import time
 
 from src.utils.database import write_table, get_data
+from src.core.bstore import BoundaryStore
+from src.core.sfc import spatial_order
+from src.core.qindex import HierarchicalIndex
+from src.core.zones import EEZ_THRESHOLD
+from src.utils.batching import AdaptiveBatchSizer
+from src.utils.progress import ProgressReporter
 from src import LOGGER
 
 
-"""
-Local Constants
-"""
-# Territorial Zone threshold according to UN (km)
-TERRITORIAL_THRESHOLD = 22.2
-
-# Contiguous Zone threshold according to UN (km)
-CONTIGUOUS_THRESHOLD = 44.4
-
-# Exclusive Economic Zone (EEZ) threshold according to UN (km)
-EEZ_THRESHOLD = 370.4
-
-# Batch size
-BATCH_SIZE = int(os.getenv('BATCH_SIZE'))
-
-
 """
 Reverse geocoding algorithm
 """
-def pip(query_point, possible_region_boundaries, name_field='name', admin_field='admin'):
+def pip(query_point, candidate_ids, boundary_store, stats=None):
     """
     Determines which region the passed point is in.
 
     :param query_point: (Shapely.Point) -> the given point
-    :param possible_region_boundaries: (gpd.GeoDataFrame) -> the boundaries of the candidate regions
+    :param candidate_ids: (np.ndarray) -> the ids of the candidate boundaries, ordered by terrain (land first)
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param stats: (dict) -> counters incremented in place ('fallbacks': points mapped to a coastline from the water), none if None
 
-    :return: (str, str) -> the province of the given point, the country of the given point
+    :return: (int) -> the id of the boundary of the given point, -1 if there are no candidates
     """
     
     # Basic validation
     if not isinstance(query_point, Point):
         LOGGER.error('query_point must be a Shapely Point')
         raise TypeError('query_point must be a Shapely Point')
-    if not isinstance(possible_region_boundaries, gpd.GeoDataFrame):
-        LOGGER.error('possible_region_boundaries must be a GeoDataFrame')
-        raise TypeError('possible_region_boundaries must be a GeoDataFrame')
-
-    # Required fields check
-    required_fields = [name_field, admin_field, 'TERRAIN', 'geometry']
-    if not all(field in possible_region_boundaries.columns for field in required_fields):
-        missing_fields = [field for field in required_fields if field not in possible_region_boundaries.columns]
-        LOGGER.error(f'possible_region_boundaries is missing required fields: {missing_fields}')
-        raise ValueError(f'possible_region_boundaries is missing required fields: {missing_fields}')
-    
+    if not isinstance(boundary_store, BoundaryStore):
+        LOGGER.error('boundary_store must be a BoundaryStore')
+        raise TypeError('boundary_store must be a BoundaryStore')
+
+    if len(candidate_ids) == 0:
+        return -1
+
     try:
-        enclosing_boundary = gpd.GeoDataFrame(columns=['name', 'admin', 'TERRAIN', 'geometry'], geometry='geometry')
-        closest_boundary = gpd.GeoDataFrame(columns=['name', 'admin', 'TERRAIN', 'geometry'], geometry='geometry')
+        enclosing_id = -1
+        closest_id = -1
         min_distance = float('inf')
 
-        for i, region_boundary in possible_region_boundaries.iterrows():
+        for i in candidate_ids:
             try:
-                # Keep track of closest boundary in case query_point misses all boundaries
-                distance = query_point.distance(region_boundary['geometry'])
-                if distance < min_distance:
-                    closest_boundary = region_boundary
-                    min_distance = distance
-
-                # Short-cicruit once enclosing boundary is found
-                if query_point.within(region_boundary['geometry']):
-                    enclosing_boundary = region_boundary
+                # Short-cicruit once enclosing boundary is found (large boundaries are prepared,
+                # so the test only visits the edges crossing the query point's scanline)
+                if boundary_store.geometries[i].contains(query_point):
+                    enclosing_id = i
                     break
             except Exception as e:
-                LOGGER.error(f'Error processing region boundary at index {i}: {e}')
+                LOGGER.error(f'Error processing region boundary {i}: {e}')
                 raise
 
-        
         # Map query_point to closest boundary if it misses all existing boundaries
-        if enclosing_boundary.empty:
-            enclosing_boundary = closest_boundary
+        if enclosing_id == -1:
+            for i in candidate_ids:
+                distance = query_point.distance(boundary_store.geometries[i])
+                if distance < min_distance:
+                    closest_id = i
+                    min_distance = distance
+            enclosing_id = closest_id
 
         # Map ocean query points to nearby land masses, if any
-        if enclosing_boundary['TERRAIN'] == 'WATER':
-            coastline_boundaries = possible_region_boundaries[possible_region_boundaries['TERRAIN'] == 'LAND']
-            if not coastline_boundaries.empty:
-                nearest_coastline_boundary, dist = nearest_coastline(query_point, coastline_boundaries)
+        if not boundary_store.is_land[enclosing_id]:
+            coastline_ids = candidate_ids[boundary_store.is_land[candidate_ids]]
+            if len(coastline_ids) > 0:
+                nearest_coastline_id, dist = nearest_coastline(query_point, coastline_ids, boundary_store)
                 if dist < EEZ_THRESHOLD:
-                    enclosing_boundary = nearest_coastline_boundary
-
-        # Get province, country information and return
-        province = enclosing_boundary[name_field] 
-        country = enclosing_boundary[admin_field]
+                    enclosing_id = nearest_coastline_id
+                    if stats is not None:
+                        stats['fallbacks'] += 1
     except Exception as e:
         LOGGER.error(f'Failed in point-in-polygon processing: {e}')
         raise
     
-    return province, country
+    return enclosing_id
 
 
-def nearest_coastline(query_point, coastline_boundaries):
+def nearest_coastline(query_point, coastline_ids, boundary_store):
     """
     Finds the nearest coastline to the passed point.
     
     :param query_point: (Shapely.Point) -> the query point
-    :param coastline_boundaries: (gpd.GeoDataFrame) -> boundaries of nearby coastlines
+    :param coastline_ids: (np.ndarray) -> the ids of nearby coastline boundaries
+    :param boundary_store: (BoundaryStore) -> the boundary data
 
-    :return: (gpd.GeoDataFrame, float) -> the nearest coastline, the distance to the nearest coastline (km)
+    :return: (int, float) -> the id of the nearest coastline, the distance to the nearest coastline (km)
     """
 
     # Validate input types
     if not isinstance(query_point, Point):
         LOGGER.error('query_point must be a Shapely Point')
         raise TypeError('query_point must be a Shapely Point')
-    if not isinstance(coastline_boundaries, gpd.GeoDataFrame):
-        LOGGER.error('coastline_boundaries must be a GeoDataFrame')
-        raise TypeError('coastline_boundaries must be a GeoDataFrame')
 
-    # Check for empty GeoDataFrame
-    if coastline_boundaries.empty:
+    # Check for empty candidates
+    if len(coastline_ids) == 0:
         LOGGER.error('No coastline boundaries provided')
-        raise ValueError('coastline_boundaries is empty')
+        raise ValueError('coastline_ids is empty')
 
     try:
         min_dist = float('inf')
-        nearest_coastline_boundary = None
+        nearest_coastline_id = -1
 
         # Search for nearest coastline
-        for i, coastline in coastline_boundaries.iterrows():
+        for i in coastline_ids:
             try:
-                geom = coastline['geometry']
+                geom = boundary_store.geometries[i]
                 
                 # Go through all constituent polygons if geo is MultiPolygon
-                if isinstance(geom, MultiPolygon):
-                    for polygon in geom.geoms:
-                        # Compute distance to nearest point on coastline
-                        nearest_point = nearest_points(query_point, polygon)[1]
-                        dist = _distance_km(query_point, nearest_point)
-                        if dist < min_dist:
-                            min_dist = dist
-                            nearest_coastline_boundary = coastline
-                else:
+                polygons = geom.geoms if isinstance(geom, MultiPolygon) else [geom]
+                for polygon in polygons:
                     # Compute distance to nearest point on coastline
-                    nearest_point = nearest_points(query_point, geom)[1]
+                    nearest_point = nearest_points(query_point, polygon)[1]
                     dist = _distance_km(query_point, nearest_point)
                     if dist < min_dist:
                         min_dist = dist
-                        nearest_coastline_boundary = coastline
+                        nearest_coastline_id = i
             except Exception as e:
-                LOGGER.error(f'Error processing coastline at index {i}: {e}')
+                LOGGER.error(f'Error processing coastline {i}: {e}')
                 raise
     except Exception as e:
         LOGGER.error(f'Failed in searching nearest coastline: {e}')
         raise
     
-    return nearest_coastline_boundary, min_dist
+    return nearest_coastline_id, min_dist
 
 def _distance_km(point_a, point_b):
     """
@@ -194,72 +170,115 @@ def _distance_km(point_a, point_b):
 
     return distance
 
-def reverse_geocode(rtree_obj, boundaries_gdf, data_table_name, location_table_name, engine):
+def geocode_points(latitudes, longitudes, rtree_obj, boundary_store, stats=None):
+    """
+    Reverse geocodes a set of points. Points are visited along the space-filling curve set by
+    SPATIAL_ORDER (if any) so consecutive lookups touch the same index nodes and boundaries;
+    results are returned in input order either way.
+
+    :param latitudes: (np.ndarray) -> the latitudes
+    :param longitudes: (np.ndarray) -> the longitudes
+    :param rtee_obj: (rtree.index.Index | HierarchicalIndex) -> the spatial index
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param stats: (dict) -> counters incremented in place ('fallbacks': points mapped to a coastline from the water,
+                            'errors': points that failed), none if None
+
+    :return: (np.ndarray) -> the boundary id of each point, -1 where no boundary was found
+    """
+
+    boundary_ids = np.full(len(latitudes), -1, dtype=np.int64)
+    for index in spatial_order(latitudes, longitudes):
+        try:
+            # Get coordinate point
+            coordinates = Point(longitudes[index], latitudes[index])
+            LOGGER.debug(f'Reverse geocoding {coordinates}...')
+            # Narrow down options with the spatial index
+            if isinstance(rtree_obj, HierarchicalIndex):
+                candidate_ids = rtree_obj.candidates(coordinates)
+            else:
+                candidate_ids = np.fromiter(rtree_obj.intersection(coordinates.bounds), dtype=np.int64)
+            candidate_ids = boundary_store.sort_candidates(candidate_ids)
+            LOGGER.debug(f'Possible regions: {candidate_ids}')
+            # Run Point-in-Polygon on coordinate
+            boundary_ids[index] = pip(coordinates, candidate_ids, boundary_store, stats=stats)
+            LOGGER.debug(f'Result: {boundary_ids[index]}')
+            LOGGER.debug('\n-----------------------------------------------------------------------------------------------------\n')
+        except Exception as e:
+            LOGGER.error(f"Error in reverse geocoding for batch index {index}: {e}")
+            if stats is not None:
+                stats['errors'] += 1
+
+    return boundary_ids
+
+
+def reverse_geocode(rtree_obj, boundary_store, data_table_name, location_table_name, engine, batch_sizer=None, reporter=None):
     """
     Reverse geocode points and write results back to database.
 
-    :param rtee_obj: (rtree.index.Index) -> the R*-tree
-    :param boundaries_gdf: (gpd.GeoDataFrame) -> the boundary data
+    :param rtee_obj: (rtree.index.Index | HierarchicalIndex) -> the spatial index
+    :param boundary_store: (BoundaryStore) -> the boundary data
     :param table_name: (str) -> the target table name
     :param engine: (SQLAlchemy.engine) -> the engine used to interface with database
+    :param batch_sizer: (AdaptiveBatchSizer) -> tunes the batch size between batches, a default one if None
+    :param reporter: (ProgressReporter) -> reports progress after every batch, one over the row count of the table if None
 
     :return: None
     """
 
     # Validate input types
-    if not isinstance(rtree_obj, rtree.index.Index):
-        LOGGER.error('rtree_obj must be an rtree.index.Index')
-        raise TypeError('rtree_obj must be an rtree.index.Index')
-    if not isinstance(boundaries_gdf, gpd.GeoDataFrame):
-        LOGGER.error('boundaries_gdf must be a GeoDataFrame')
-        raise TypeError('boundaries_gdf must be a GeoDataFrame')
+    if not isinstance(rtree_obj, (rtree.index.Index, HierarchicalIndex)):
+        LOGGER.error('rtree_obj must be an rtree.index.Index or a HierarchicalIndex')
+        raise TypeError('rtree_obj must be an rtree.index.Index or a HierarchicalIndex')
+    if not isinstance(boundary_store, BoundaryStore):
+        LOGGER.error('boundary_store must be a BoundaryStore')
+        raise TypeError('boundary_store must be a BoundaryStore')
 
     LOGGER.info('Reverse geocoding coordinates...')
     print('Reverse geocoding coordinates...', flush=True)
+    if batch_sizer is None:
+        batch_sizer = AdaptiveBatchSizer()
+    if reporter is None:
+        reporter = ProgressReporter(total_rows=int(get_data(f'SELECT count(*) AS n FROM {data_table_name};', engine)['n'][0]))
     offset = 0
+    n_batches = 0
     try:
-        while True:
-            LOGGER.info(f'Processing batch {offset / BATCH_SIZE}...')
-            print(f'Processing batch {offset / BATCH_SIZE}...', flush=True)
-            # Get batch
-            query = f'SELECT "latitude", "longitude" FROM {data_table_name} LIMIT {BATCH_SIZE} OFFSET {offset};'
+        # Hold one pooled connection for the whole run instead of one per batch
+        with engine.connect() as connection:
+            while True:
+                batch_size = batch_sizer.size
+                LOGGER.info(f'Processing batch {n_batches} ({batch_size} rows from row {offset})...')
+                # Get batch
+                query = f'SELECT "latitude", "longitude" FROM {data_table_name} LIMIT {batch_size} OFFSET {offset};'
             
-            batch = get_data(query, engine)
+                io_start = time.perf_counter()
+                batch = get_data(query, engine, connection=connection)
+                io_time = time.perf_counter() - io_start
             
-            if batch.empty:
-                return
-            batch_results = []
-            # Reverse geocode points in batch
-            for index, row in batch.iterrows():
-                try:
-                    # Get coordinate point
-                    longitude = row['longitude']
-                    latitude = row['latitude']
-                    coordinates = Point(longitude, latitude)
-                    LOGGER.debug(f'Reverse geocoding {coordinates}...')
-                    # Narrow down options with R*-tree
-                    possible_region_boundaries_idx = list(rtree_obj.intersection(coordinates.bounds))
-                    possible_region_boundaries = boundaries_gdf.loc[possible_region_boundaries_idx]
-                    possible_region_boundaries = possible_region_boundaries.sort_values(by='TERRAIN', ascending=True)
-                    LOGGER.debug(f'Possible regions:\n{possible_region_boundaries}')
-                    # Run Point-in-Polygon on coordinate
-                    province, country = pip(coordinates, possible_region_boundaries)
-                    LOGGER.debug(f'Result: ({province}, {country})')
-                    LOGGER.debug('\n-----------------------------------------------------------------------------------------------------\n')
-                    # Add results to batch_results
-                    batch_results.append({'province': province, 'country': country})
-                except Exception as e:
-                    LOGGER.error(f"Error in reverse geocoding for batch index {index}: {e}")
-            # Package batch_results into DataFrame
-            batch_results = pd.DataFrame(batch_results, columns=['province', 'country'])
-
-            # Write batch_results to staging table
-            write_table(batch_results, table_name=location_table_name, if_exists='append', engine=engine)
+                if batch.empty:
+                    LOGGER.info(f'Batch sizing: {batch_sizer.summary()}')
+                    print(f'Batch sizing: {batch_sizer.summary()}', flush=True)
+                    return
+                compute_start = time.perf_counter()
+                # Reverse geocode points in batch (boundary ids double as location ids)
+                stats = {'fallbacks': 0, 'errors': 0}
+                batch_ids = geocode_points(batch['latitude'].to_numpy(), batch['longitude'].to_numpy(), rtree_obj, boundary_store, stats=stats)
+                # Package batch results into DataFrame (points without a boundary get a NULL location)
+                batch_results = pd.DataFrame({'location_id': pd.array(batch_ids, dtype='Int32')})
+                batch_results.loc[batch_ids < 0, 'location_id'] = pd.NA
+                compute_time = time.perf_counter() - compute_start
+
+                # Write batch_results to staging table
+                io_start = time.perf_counter()
+                write_table(batch_results, table_name=location_table_name, if_exists='append', engine=engine, connection=connection)
+                io_time += time.perf_counter() - io_start
             
-            # Increment offset
-            offset += BATCH_SIZE
+                # Increment offset and pick the next batch size from what this batch cost
+                offset += len(batch)
+                n_batches += 1
+                batch_sizer.update(len(batch), io_time=io_time, compute_time=compute_time)
+                reporter.update(len(batch), n_fallbacks=stats['fallbacks'], n_errors=stats['errors'])
     except Exception as e:
         LOGGER.error(f'Failed in reverse geocoding process: {e}')
         raise
-
-
+    finally:
+        reporter.close()
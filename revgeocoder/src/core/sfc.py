@@ -0,0 +1,134 @@
+import numpy as np
+
+import os
+
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Point ordering applied before lookup ('HILBERT', 'ZORDER' or unset for input order)
+SPATIAL_ORDER = os.getenv('SPATIAL_ORDER')
+
+# Bits per coordinate of the curve grid (2^16 cells span ~600 m of longitude at the equator)
+CURVE_ORDER = 16
+
+
+"""
+Space-filling curves
+"""
+def spatial_order(latitudes, longitudes, curve=SPATIAL_ORDER):
+    """
+    Computes the permutation that visits points along a space-filling curve, so consecutive
+    lookups hit the same R*-tree nodes and boundaries.
+
+    :param latitudes: (np.ndarray) -> the latitudes
+    :param longitudes: (np.ndarray) -> the longitudes
+    :param curve: (str) -> 'HILBERT', 'ZORDER', or None to keep the input order
+
+    :return: (np.ndarray) -> the indices of the points in visiting order
+    """
+
+    if not curve:
+        return np.arange(len(latitudes))
+
+    x, y = _quantize(latitudes, longitudes, CURVE_ORDER)
+    if curve == 'HILBERT':
+        keys = hilbert_keys(x, y, CURVE_ORDER)
+    elif curve == 'ZORDER':
+        keys = zorder_keys(x, y)
+    else:
+        LOGGER.error(f'Unsupported spatial order: {curve}')
+        raise ValueError(f'Unsupported spatial order: {curve}')
+
+    return np.argsort(keys, kind='stable')
+
+
+def hilbert_keys(x, y, order):
+    """
+    Maps grid cells to their distance along a Hilbert curve (vectorized form of the classic
+    xy2d algorithm).
+
+    :param x: (np.ndarray) -> the cell columns (< 2^order)
+    :param y: (np.ndarray) -> the cell rows (< 2^order)
+    :param order: (int) -> the bits per coordinate
+
+    :return: (np.ndarray) -> the curve distances (uint64)
+    """
+
+    n = np.uint64(1 << order)
+    x = x.astype(np.uint64)
+    y = y.astype(np.uint64)
+    keys = np.zeros(len(x), dtype=np.uint64)
+
+    s = np.uint64(1 << (order - 1))
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((np.uint64(3) * rx.astype(np.uint64)) ^ ry.astype(np.uint64))
+
+        # Rotate the quadrant so the sub-curve is traversed in the right orientation
+        flip = ~ry & rx
+        x = np.where(flip, n - np.uint64(1) - x, x)
+        y = np.where(flip, n - np.uint64(1) - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+
+        s >>= np.uint64(1)
+
+    return keys
+
+
+def zorder_keys(x, y):
+    """
+    Maps grid cells to their Morton (Z-order) codes by interleaving the coordinate bits.
+
+    :param x: (np.ndarray) -> the cell columns (< 2^32)
+    :param y: (np.ndarray) -> the cell rows (< 2^32)
+
+    :return: (np.ndarray) -> the Morton codes (uint64)
+    """
+
+    return _spread_bits(x.astype(np.uint64)) | (_spread_bits(y.astype(np.uint64)) << np.uint64(1))
+
+
+def _spread_bits(v):
+    """
+    Inserts a zero bit between each of the lower 32 bits of v.
+
+    :param v: (np.ndarray) -> the values (uint64)
+
+    :return: (np.ndarray) -> the spread values (uint64)
+    """
+
+    v = v & np.uint64(0x00000000FFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+
+    return v
+
+
+def _quantize(latitudes, longitudes, order):
+    """
+    Snaps coordinates onto a 2^order x 2^order grid.
+
+    :param latitudes: (np.ndarray) -> the latitudes
+    :param longitudes: (np.ndarray) -> the longitudes
+    :param order: (int) -> the bits per coordinate
+
+    :return: (np.ndarray, np.ndarray) -> the cell columns, the cell rows (uint64)
+    """
+
+    max_cell = (1 << order) - 1
+    x = np.clip((np.asarray(longitudes, dtype=np.float64) + 180) / 360 * max_cell, 0, max_cell)
+    y = np.clip((np.asarray(latitudes, dtype=np.float64) + 90) / 180 * max_cell, 0, max_cell)
+
+    # Missing coordinates are snapped to the corner cell rather than breaking the cast
+    x = np.nan_to_num(x, nan=max_cell)
+    y = np.nan_to_num(y, nan=max_cell)
+
+    return x.astype(np.uint64), y.astype(np.uint64)
@@ -0,0 +1,200 @@
+from collections import OrderedDict
+from rtree import index
+import numpy as np
+import shapely
+
+import json
+import os
+
+from src.core.bstore import BoundaryStore, PREPARE_MIN_VERTICES
+from src import TOP_DIR, LOGGER
+
+
+"""
+Local Constants
+"""
+# Directory holding the published boundary bundle
+SHARED_DIR = os.getenv('SHARED_DIR', os.path.join(TOP_DIR, 'data/shared/'))
+
+# Memory (MB) all geocoding processes together may spend on decoded geometries (each process
+# gets an equal share, see geocode_memmap_parallel)
+GEOMETRY_CACHE_MB = float(os.getenv('GEOMETRY_CACHE_MB', 256))
+
+# Estimated memory of a decoded geometry per byte of its WKB, without and with its edge index
+# (measured on 200k-vertex polygons after point-in-polygon queries)
+DECODED_BYTES_PER_WKB_BYTE = 1.5
+PREPARED_BYTES_PER_WKB_BYTE = 4
+
+# Bundle files
+WKB_FNAME = 'wkb.npy'
+OFFSETS_FNAME = 'wkb_offsets.npy'
+CODES_FNAMES = {'name_codes': 'name_codes.npy', 'admin_codes': 'admin_codes.npy', 'terrain_codes': 'terrain_codes.npy', 'is_land': 'is_land.npy'}
+LABELS_FNAME = 'labels.json'
+RTREE_BASENAME = 'rtree'
+
+
+"""
+Publish boundaries
+"""
+def publish_boundaries(boundary_store, shared_dir=SHARED_DIR):
+    """
+    Writes the boundary data and its R*-tree to a directory of flat files that any number of
+    processes can map without copying: the geometries as one WKB byte array plus offsets, the
+    integer codes as .npy arrays, and the R*-tree as a disk-based index keyed by boundary id.
+    Every process attaching to the bundle shares the same pages of the OS page cache.
+
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param shared_dir: (str) -> the directory the bundle is written to
+
+    :return: (str) -> the bundle directory
+    """
+
+    LOGGER.info(f'Publishing boundaries to {shared_dir}...')
+    print(f'Publishing boundaries to {shared_dir}...', flush=True)
+
+    os.makedirs(shared_dir, exist_ok=True)
+    try:
+        # Geometries: concatenated WKB, boundary i spans offsets[i]:offsets[i + 1]
+        wkbs = shapely.to_wkb(boundary_store.geometries)
+        offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+        np.cumsum([len(wkb) for wkb in wkbs], out=offsets[1:])
+        np.save(os.path.join(shared_dir, WKB_FNAME), np.frombuffer(b''.join(wkbs), dtype=np.uint8))
+        np.save(os.path.join(shared_dir, OFFSETS_FNAME), offsets)
+
+        # Codes and the small label tables they refer to
+        for attribute, fname in CODES_FNAMES.items():
+            np.save(os.path.join(shared_dir, fname), getattr(boundary_store, attribute))
+        with open(os.path.join(shared_dir, LABELS_FNAME), 'w') as f:
+            json.dump({'names': boundary_store.names.tolist(),
+                       'admins': boundary_store.admins.tolist(),
+                       'terrains': boundary_store.terrains.tolist()}, f)
+
+        # R*-tree, bulk loaded from the geometry bounds
+        rtree_basename = os.path.join(shared_dir, RTREE_BASENAME)
+        for extension in ('.dat', '.idx'):
+            if os.path.exists(rtree_basename + extension):
+                os.remove(rtree_basename + extension)
+        bounds = shapely.bounds(boundary_store.geometries)
+        rtree_obj = index.Index(rtree_basename, ((int(i), tuple(b), None) for i, b in enumerate(bounds)))
+        rtree_obj.close()
+    except Exception as e:
+        LOGGER.error(f'Failed to publish boundaries: {e}')
+        raise
+
+    return shared_dir
+
+
+"""
+Attach to boundaries
+"""
+class SharedBoundaryStore(BoundaryStore):
+    """
+    BoundaryStore backed by a published bundle. The codes are memory-mapped and geometries are
+    decoded from the mapped WKB on first use (and kept in a per-process cache capped by memory),
+    so a process attaching to the bundle costs a few MB plus the cache however large the
+    boundary data is.
+    """
+
+    def __init__(self, shared_dir=SHARED_DIR, cache_mb=GEOMETRY_CACHE_MB):
+        """
+        :param shared_dir: (str) -> the bundle directory
+        :param cache_mb: (float) -> the memory (MB) the decoded geometries kept may use
+        """
+
+        LOGGER.info(f'Attaching to boundaries in {shared_dir}...')
+
+        try:
+            self.geometries = GeometryView(np.load(os.path.join(shared_dir, WKB_FNAME), mmap_mode='r'),
+                                           np.load(os.path.join(shared_dir, OFFSETS_FNAME), mmap_mode='r'),
+                                           cache_mb=cache_mb)
+            for attribute, fname in CODES_FNAMES.items():
+                setattr(self, attribute, np.load(os.path.join(shared_dir, fname), mmap_mode='r'))
+            with open(os.path.join(shared_dir, LABELS_FNAME)) as f:
+                labels = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.error(f'No boundary bundle in {shared_dir}: {e}')
+            raise FileNotFoundError(f'No boundary bundle in {shared_dir}: {e}')
+
+        self.names = np.array(labels['names'], dtype=object)
+        self.admins = np.array(labels['admins'], dtype=object)
+        self.terrains = np.array(labels['terrains'], dtype=object)
+
+
+class GeometryView:
+    """
+    Read-only, indexable view of the geometries in a mapped WKB array. Decoded geometries are
+    kept in a least-recently-used cache capped by their estimated memory rather than their
+    number, since one prepared coastline can outweigh thousands of small boundaries. The most
+    recent geometry is always kept, so a process holds at most max(cache_mb, its largest
+    geometry) of decoded geometries.
+    """
+
+    def __init__(self, wkb, offsets, cache_mb=GEOMETRY_CACHE_MB):
+        """
+        :param wkb: (np.memmap) -> the concatenated WKB bytes
+        :param offsets: (np.memmap) -> the start of each geometry, followed by the end of the last one
+        :param cache_mb: (float) -> the memory (MB) the decoded geometries kept may use
+        """
+
+        self.wkb = wkb
+        self.offsets = offsets
+        self.cache_bytes = cache_mb * 2**20
+        self.cached_bytes = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i][0]
+
+        geometry, n_bytes = self._decode(i)
+        self._cache[i] = (geometry, n_bytes)
+        self.cached_bytes += n_bytes
+
+        # Evict the least recently used geometries, never the one just decoded
+        while self.cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, (_, evicted_bytes) = self._cache.popitem(last=False)
+            self.cached_bytes -= evicted_bytes
+
+        return geometry
+
+    def _decode(self, i):
+        """
+        Decodes one geometry and estimates its memory.
+
+        :param i: (int) -> the boundary id
+
+        :return: (shapely.Geometry, float) -> the geometry, its estimated memory (bytes)
+        """
+
+        n_wkb_bytes = int(self.offsets[i + 1] - self.offsets[i])
+        geometry = shapely.from_wkb(self.wkb[self.offsets[i]:self.offsets[i + 1]].tobytes())
+
+        # Large boundaries get their edge index when first decoded, and keep it while cached
+        if shapely.get_num_coordinates(geometry) >= PREPARE_MIN_VERTICES:
+            shapely.prepare(geometry)
+            return geometry, n_wkb_bytes * PREPARED_BYTES_PER_WKB_BYTE
+
+        return geometry, n_wkb_bytes * DECODED_BYTES_PER_WKB_BYTE
+
+
+def open_shared_rtree(shared_dir=SHARED_DIR):
+    """
+    Opens the published R*-tree. Nodes are read from disk on demand, so the tree is shared
+    through the OS page cache rather than copied into each process.
+
+    :param shared_dir: (str) -> the bundle directory
+
+    :return: (rtree.index.Index) -> the R*-tree
+    """
+
+    rtree_basename = os.path.join(shared_dir, RTREE_BASENAME)
+    if not os.path.exists(rtree_basename + '.dat'):
+        LOGGER.error(f'No R*-tree in {shared_dir}')
+        raise FileNotFoundError(f'No R*-tree in {shared_dir}')
+
+    return index.Index(rtree_basename)
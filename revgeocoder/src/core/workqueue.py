@@ -0,0 +1,363 @@
+from sqlalchemy import text
+
+from contextlib import contextmanager
+
+import numpy as np
+
+import socket
+import time
+import os
+
+from src.utils.database import execute_queries, get_data
+from src.utils.exceptions import LeaseLostError
+from src.core.rgc import geocode_points
+from src.utils.progress import ProgressReporter
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Number of rows per work item
+RANGE_SIZE = int(os.getenv('RANGE_SIZE', 10000))
+
+# Time (s) a worker holds a claimed range before other workers may reclaim it
+LEASE_SECONDS = int(os.getenv('LEASE_SECONDS', 600))
+
+# Number of times a range is attempted before it is marked as failed
+MAX_ATTEMPTS = 3
+
+# Time (s) an idle worker waits before checking for expired leases again
+POLL_INTERVAL = 5
+
+# Suffix of the one-row table recording the job a work queue belongs to
+JOB_TABLE_SUFFIX = '_job'
+
+
+"""
+Job setup
+"""
+@contextmanager
+def job_lock(lock_name, engine):
+    """
+    Holds a PostgreSQL advisory lock for the duration of the block, so only one container at
+    a time sets up (or inspects) a job.
+
+    :param lock_name: (str) -> the lock name
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: None
+    """
+
+    with engine.connect() as connection:
+        connection.execute(text('SELECT pg_advisory_lock(hashtext(:lock_name));'), {'lock_name': lock_name})
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(hashtext(:lock_name));'), {'lock_name': lock_name})
+            connection.commit()
+
+
+def create_work_queue(data_table_name, queue_table_name, engine, range_size=RANGE_SIZE, fingerprint=None):
+    """
+    Splits the data table into row_id ranges and records them in a work-queue table, along with
+    the job they belong to (see get_job). A previous queue of the same name is replaced. Data
+    tables without a row_id get one.
+
+    :param data_table_name: (str) -> the name of the data table
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param range_size: (int) -> the number of rows per range
+    :param fingerprint: (str) -> identifies the job's input (see is_new_job)
+
+    :return: (int) -> the number of ranges
+    """
+
+    LOGGER.info(f'Creating work queue {queue_table_name} over {data_table_name}...')
+    print(f'Creating work queue {queue_table_name} over {data_table_name}...', flush=True)
+
+    has_row_id = not get_data(f'''
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = '{data_table_name}' AND column_name = 'row_id';
+        ''', engine).empty
+    if not has_row_id:
+        execute_queries([f'ALTER TABLE {data_table_name} ADD COLUMN "row_id" BIGSERIAL PRIMARY KEY;'], engine)
+
+    job_table_name = f'{queue_table_name}{JOB_TABLE_SUFFIX}'
+    n_ranges = execute_queries([
+        f'DROP TABLE IF EXISTS {queue_table_name}, {job_table_name};',
+        f'''
+        CREATE TABLE {queue_table_name} (
+            range_id SERIAL PRIMARY KEY,
+            start_id BIGINT NOT NULL,
+            end_id BIGINT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_expires TIMESTAMPTZ,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            completed_at TIMESTAMPTZ
+        );
+        ''',
+        f'''
+        INSERT INTO {queue_table_name} (start_id, end_id)
+        SELECT s, s + {range_size}
+        FROM generate_series((SELECT min("row_id") FROM {data_table_name}),
+                             (SELECT max("row_id") FROM {data_table_name}),
+                             {range_size}) s;
+        ''',
+        f'CREATE INDEX {queue_table_name}_status_idx ON {queue_table_name} (status, range_id);',
+        f'CREATE TABLE {job_table_name} (fingerprint TEXT, created_at TIMESTAMPTZ NOT NULL DEFAULT now(), exported_at TIMESTAMPTZ);',
+        f'INSERT INTO {job_table_name} (fingerprint) VALUES (:fingerprint);'
+    ], engine, params={'fingerprint': fingerprint})[2]
+
+    LOGGER.info(f'Queued {n_ranges} ranges of {range_size} rows')
+    print(f'Queued {n_ranges} ranges of {range_size} rows', flush=True)
+
+    return n_ranges
+
+
+def get_job(queue_table_name, engine):
+    """
+    Describes the job a work queue belongs to.
+
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (dict) -> fingerprint (None for queues that predate job records), created_at, exported_at,
+                       open_ranges (pending or running), live_leases (running and unexpired); None if there is no queue
+    """
+
+    job_table_name = f'{queue_table_name}{JOB_TABLE_SUFFIX}'
+    tables = get_data(f"SELECT to_regclass('{queue_table_name}') IS NOT NULL AS has_queue, to_regclass('{job_table_name}') IS NOT NULL AS has_job;", engine)
+    if not tables['has_queue'][0]:
+        return None
+
+    ranges = get_data(f'''
+        SELECT count(*) FILTER (WHERE status IN ('pending', 'running')) AS open_ranges,
+               count(*) FILTER (WHERE status = 'running' AND lease_expires > now()) AS live_leases
+        FROM {queue_table_name};
+        ''', engine)
+    job = {'fingerprint': None, 'created_at': None, 'exported_at': None,
+           'open_ranges': int(ranges['open_ranges'][0]), 'live_leases': int(ranges['live_leases'][0])}
+
+    if tables['has_job'][0]:
+        record = get_data(f'SELECT fingerprint, created_at, exported_at FROM {job_table_name} LIMIT 1;', engine)
+        if not record.empty:
+            job.update({field: None if record[field].isna()[0] else record[field][0] for field in ('fingerprint', 'created_at', 'exported_at')})
+
+    return job
+
+
+def is_new_job(job, fingerprint, queue_table_name):
+    """
+    Decides whether a container sets up a new job or joins the one in the work queue:
+      - no queue, a finished and exported job, or a job for other input nobody is geocoding
+        any more: set up a new job
+      - a job for the same input that is unfinished (or finished but not exported): join it
+    A queue without a fingerprint, or a job for other input whose ranges are still leased,
+    cannot be judged or replaced safely and is reported instead.
+
+    :param job: (dict) -> the job in the queue (see get_job), None if there is no queue
+    :param fingerprint: (str) -> identifies this container's input
+    :param queue_table_name: (str) -> the name of the work-queue table
+
+    :return: (bool) -> indicates whether to set up a new job
+    """
+
+    if job is None:
+        return True
+
+    if job['fingerprint'] is None:
+        LOGGER.error(f'{queue_table_name} does not record its job; drop it to start a new job')
+        raise ValueError(f'{queue_table_name} does not record its job; drop it to start a new job')
+
+    if job['fingerprint'] == fingerprint:
+        return job['open_ranges'] == 0 and job['exported_at'] is not None
+
+    if job['live_leases'] > 0:
+        LOGGER.error(f'{queue_table_name} holds another job (created {job["created_at"]}) with {job["live_leases"]} ranges being geocoded; '
+                     f'wait for it to finish or drop the queue')
+        raise ValueError(f'{queue_table_name} holds another job (created {job["created_at"]}) with {job["live_leases"]} ranges being geocoded; '
+                         f'wait for it to finish or drop the queue')
+
+    LOGGER.info(f'{queue_table_name} holds a job for other input (created {job["created_at"]}), replacing it')
+    print(f'{queue_table_name} holds a job for other input (created {job["created_at"]}), replacing it', flush=True)
+
+    return True
+
+
+def mark_exported(queue_table_name, engine):
+    """
+    Records that the results of the job were exported.
+
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: None
+    """
+
+    execute_queries([f'UPDATE {queue_table_name}{JOB_TABLE_SUFFIX} SET exported_at = now();'], engine)
+
+
+"""
+Workers
+"""
+def run_worker(rtree_obj, boundary_store, data_table_name, queue_table_name, engine, worker_id=None):
+    """
+    Claims ranges from the work queue and geocodes them until every range is done or failed.
+    Any number of workers, on any number of machines, can run against the same queue. Ranges
+    whose lease expired (e.g. because their worker died) are claimed again, and results are
+    written idempotently, so a range geocoded twice ends up with the same locations.
+
+    :param rtree_obj: (rtree.index.Index) -> the R*-tree
+    :param boundary_store: (BoundaryStore) -> the boundary data
+    :param data_table_name: (str) -> the name of the data table
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param worker_id: (str) -> the worker name recorded on claimed ranges, host:pid if None
+
+    :return: (int) -> the number of ranges this worker completed
+    """
+
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    # Each worker only sees its own share of the rows, so it reports without a total
+    reporter = ProgressReporter()
+
+    LOGGER.info(f'Worker {worker_id} consuming {queue_table_name}...')
+    print(f'Worker {worker_id} consuming {queue_table_name}...', flush=True)
+
+    n_completed = 0
+    while True:
+        work_item = claim_range(queue_table_name, engine, worker_id)
+        if work_item is None:
+            remaining = get_data(f"SELECT count(*) AS n FROM {queue_table_name} WHERE status IN ('pending', 'running');", engine)['n'][0]
+            if remaining == 0:
+                break
+            # Other workers hold the remaining ranges; wait in case their leases expire
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        range_id, start_id, end_id = work_item
+        LOGGER.info(f'Worker {worker_id} geocoding range {range_id} (rows {start_id}-{end_id - 1})...')
+        print(f'Worker {worker_id} geocoding range {range_id} (rows {start_id}-{end_id - 1})...', flush=True)
+
+        try:
+            points = get_data(f'''
+                SELECT "row_id", "latitude", "longitude" FROM {data_table_name}
+                WHERE "row_id" >= {start_id} AND "row_id" < {end_id};
+                ''', engine)
+            stats = {'fallbacks': 0, 'errors': 0}
+            boundary_ids = geocode_points(points['latitude'].to_numpy(), points['longitude'].to_numpy(), rtree_obj, boundary_store, stats=stats)
+            complete_range(range_id, points['row_id'].to_numpy(), boundary_ids, data_table_name, queue_table_name, engine, worker_id)
+            n_completed += 1
+            reporter.update(len(points), n_fallbacks=stats['fallbacks'], n_errors=stats['errors'])
+        except LeaseLostError as e:
+            # Another worker holds the range now and writes its results
+            LOGGER.info(f'Worker {worker_id} discarded range {range_id}: {e}')
+            print(f'Worker {worker_id} discarded range {range_id}: {e}', flush=True)
+        except Exception as e:
+            # Leave the range to be reclaimed once its lease expires
+            LOGGER.error(f'Worker {worker_id} failed on range {range_id}: {e}')
+
+    reporter.close()
+
+    LOGGER.info(f'Worker {worker_id} completed {n_completed} ranges')
+    print(f'Worker {worker_id} completed {n_completed} ranges', flush=True)
+
+    return n_completed
+
+
+def claim_range(queue_table_name, engine, worker_id):
+    """
+    Claims the next pending range, or a running range whose lease expired. Concurrent workers
+    skip rows locked by each other, so no two of them claim the same range.
+
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param worker_id: (str) -> the worker name
+
+    :return: (int, int, int) -> the range id, the first row_id, the row_id past the end; None if nothing is claimable
+    """
+
+    # Ranges that exhausted their attempts are set aside
+    execute_queries([f'''
+        UPDATE {queue_table_name} SET status = 'failed'
+        WHERE status = 'running' AND lease_expires < now() AND attempts >= {MAX_ATTEMPTS};
+        '''], engine)
+
+    claimed = get_data(f'''
+        UPDATE {queue_table_name}
+        SET status = 'running',
+            worker = :worker_id,
+            lease_expires = now() + interval '{LEASE_SECONDS} seconds',
+            attempts = attempts + 1
+        WHERE range_id = (
+            SELECT range_id FROM {queue_table_name}
+            WHERE status = 'pending' OR (status = 'running' AND lease_expires < now())
+            ORDER BY range_id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING range_id, start_id, end_id;
+        ''', engine, params={'worker_id': worker_id})
+
+    if claimed.empty:
+        return None
+
+    return tuple(int(v) for v in claimed.iloc[0])
+
+
+def complete_range(range_id, row_ids, boundary_ids, data_table_name, queue_table_name, engine, worker_id):
+    """
+    Writes the locations of a range and marks it done in one transaction, provided the worker
+    still holds the range. A worker whose lease expired and whose range was claimed by another
+    worker writes nothing, so it never overwrites or races the new holder's results.
+
+    :param range_id: (int) -> the range id
+    :param row_ids: (np.ndarray) -> the row_ids of the geocoded points
+    :param boundary_ids: (np.ndarray) -> the boundary id of each point, -1 where no boundary was found
+    :param data_table_name: (str) -> the name of the data table
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param worker_id: (str) -> the worker name
+
+    :return: None
+    """
+
+    location_ids = [int(i) if i >= 0 else None for i in boundary_ids]
+
+    # One statement: the locations are only written if closing the lease matched the range
+    n_leases = get_data(f'''
+        WITH lease AS (
+            UPDATE {queue_table_name}
+            SET status = 'done', completed_at = now()
+            WHERE range_id = :range_id AND worker = :worker_id AND status = 'running'
+            RETURNING range_id
+        ), located AS (
+            UPDATE {data_table_name} d
+            SET "location_id" = u.location_id
+            FROM unnest(CAST(:row_ids AS BIGINT[]), CAST(:location_ids AS INTEGER[])) AS u(row_id, location_id)
+            WHERE d."row_id" = u.row_id AND EXISTS (SELECT 1 FROM lease)
+        )
+        SELECT count(*) AS n FROM lease;
+        ''', engine, params={'row_ids': np.asarray(row_ids, dtype=np.int64).tolist(), 'location_ids': location_ids,
+                             'range_id': range_id, 'worker_id': worker_id})['n'][0]
+
+    if n_leases == 0:
+        raise LeaseLostError(f'range {range_id} is no longer leased to {worker_id}')
+
+
+def get_queue_status(queue_table_name, engine):
+    """
+    Counts the ranges in each state.
+
+    :param queue_table_name: (str) -> the name of the work-queue table
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (dict <K: status, V: int>) -> the number of ranges per status
+    """
+
+    counts = get_data(f'SELECT status, count(*) AS n FROM {queue_table_name} GROUP BY status;', engine)
+
+    return dict(zip(counts['status'], counts['n'].astype(int)))
@@ -0,0 +1,15 @@
+# Maritime zone widths shared by the Python and PostGIS geocoders. This module imports nothing,
+# so the PostGIS path can use them without loading the geospatial stack.
+
+
+"""
+Local Constants
+"""
+# Territorial Zone threshold according to UN (km)
+TERRITORIAL_THRESHOLD = 22.2
+
+# Contiguous Zone threshold according to UN (km)
+CONTIGUOUS_THRESHOLD = 44.4
+
+# Exclusive Economic Zone (EEZ) threshold according to UN (km)
+EEZ_THRESHOLD = 370.4
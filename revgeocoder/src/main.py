@@ -1,12 +1,15 @@
-import pandas as pd
-import geopandas as gpd
 import shutil
+import json
+import sys
 import os
 
-from src.utils.database import get_db_engine, init_database, get_data, merge_tables
+from contextlib import nullcontext
+
+from src.utils.database import get_db_engine, init_database, merge_tables, table_exists, execute_queries, create_location_view
+from src.utils.database import get_table_comment, set_table_comment
+from src.utils.bundle import bundle_version, file_checksum
+from src.utils.fileio import find_input, read_chunks, ChunkWriter, export_table, export_passthrough, export_located, OUTPUT_FNAMES
 from src.utils.validate import validate_data
-from src.core.qindex import build_rtree
-from src.core.rgc import reverse_geocode
 
 from src import USER_DATA_DIR, INPUT_DIR, OUTPUT_DIR, INTERNAL_DATA_DIR, LOGS_DIR
 from src import LOGGER
@@ -25,49 +28,284 @@ Local Constants
 """
 DATA_TABLE_NAME = os.getenv('DATA_TABLE_NAME')
 LOCATION_TABLE_NAME = os.getenv('LOCATION_TABLE_NAME')
+BOUNDARY_TABLE_NAME = os.getenv('BOUNDARY_TABLE_NAME', 'boundaries')
+LOCATIONS_TABLE_NAME = os.getenv('LOCATIONS_TABLE_NAME', 'locations')
+RESULTS_VIEW_NAME = f'{DATA_TABLE_NAME}_located'
+IS_POSTGIS = os.getenv('POSTGIS') == 'TRUE'
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT')
+IS_CUBE = os.getenv('BUILD_CUBE') == 'TRUE'
+IS_DISTRIBUTED = os.getenv('DISTRIBUTED') == 'TRUE'
+IS_HIERARCHICAL = os.getenv('SPATIAL_INDEX') == 'HIERARCHICAL'
+IS_MEMMAP = os.getenv('MEMMAP') == 'TRUE'
+BOUNDARY_TIER = os.getenv('BOUNDARY_TIER', 'full')
+BOUNDARIES_FNAME = 'boundaries.geojson' if BOUNDARY_TIER == 'full' else f'boundaries_{BOUNDARY_TIER}.geojson'
+MBRS_FNAME = 'mbrs.geojson' if BOUNDARY_TIER == 'full' else f'mbrs_{BOUNDARY_TIER}.geojson'
+QUEUE_TABLE_NAME = f'{DATA_TABLE_NAME}_queue'
+
+
+def read_boundaries(fname):
+    """
+    Reads a boundary file from the internal data directory, checking it against the bundle
+    manifest if there is one. The geospatial stack is only imported here, so runs that never
+    touch boundary files (e.g. PostGIS reruns) skip it.
+
+    :param fname: (str) -> the file name (e.g. 'boundaries.geojson')
+
+    :return: (gpd.GeoDataFrame) -> the boundary data
+    """
+
+    import geopandas as gpd
+    from src.utils.bundle import verify_bundle_file
+
+    verify_bundle_file(fname, INTERNAL_DATA_DIR)
+
+    return gpd.read_file(os.path.join(INTERNAL_DATA_DIR, fname))
+
+
+def get_boundary_stamp():
+    """
+    Describes the boundary data in use (bundle version and tier). Tables built from boundary
+    data carry the stamp as their comment, so they are rebuilt once either changes.
+
+    :return: (str) -> the stamp, as JSON
+    """
+
+    return json.dumps({'bundle': bundle_version(BOUNDARIES_FNAME, INTERNAL_DATA_DIR), 'tier': BOUNDARY_TIER}, sort_keys=True)
+
+
+def is_built_from(table_name, boundary_stamp, engine):
+    """
+    Checks that a table exists and was built from the boundary data in use.
+
+    :param table_name: (str) -> the table name
+    :param boundary_stamp: (str) -> the stamp of the boundary data in use (see get_boundary_stamp)
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (bool) -> indicates whether the table can be reused
+    """
+
+    if not table_exists(table_name, engine):
+        return False
+
+    table_stamp = get_table_comment(table_name, engine)
+    if table_stamp != boundary_stamp:
+        LOGGER.info(f'{table_name} was built from boundary data {table_stamp}, not {boundary_stamp}; rebuilding it')
+        print(f'{table_name} was built from boundary data {table_stamp}, not {boundary_stamp}; rebuilding it', flush=True)
+        return False
+
+    return True
+
+
+def get_job_fingerprint(input_fpath, boundary_stamp):
+    """
+    Identifies a distributed job by its input (name and checksum, so every container holding
+    the same file agrees) and the boundary data it is geocoded against.
+
+    :param input_fpath: (str) -> the input filepath
+    :param boundary_stamp: (str) -> the stamp of the boundary data in use (see get_boundary_stamp)
+
+    :return: (str) -> the fingerprint, as JSON
+    """
+
+    return json.dumps({'input': os.path.basename(input_fpath), 'sha256': file_checksum(input_fpath), 'boundaries': boundary_stamp}, sort_keys=True)
+
+
+def build_index(boundary_store):
+    """
+    Builds the spatial index selected by SPATIAL_INDEX.
+
+    :param boundary_store: (BoundaryStore) -> the boundary data
+
+    :return: (rtree.index.Index | HierarchicalIndex) -> the spatial index
+    """
+
+    from src.core.qindex import build_rtree, build_hierarchical_index
+
+    # Create country-then-province index
+    if IS_HIERARCHICAL:
+        return build_hierarchical_index(boundary_store)
+
+    # Create R*-tree over the MBR data (R*-tree ids are row positions, so the files must line up)
+    mbrs_gdf = read_boundaries(MBRS_FNAME)
+    if len(mbrs_gdf) != len(boundary_store):
+        LOGGER.error(f'{MBRS_FNAME} has {len(mbrs_gdf)} rows but {BOUNDARIES_FNAME} has {len(boundary_store)}')
+        raise ValueError(f'{MBRS_FNAME} has {len(mbrs_gdf)} rows but {BOUNDARIES_FNAME} has {len(boundary_store)}')
+
+    return build_rtree(mbrs_gdf)
 
 
 if __name__ == "__main__":
 
     start_time = time.time()
 
-    # Load user data
-    data = pd.read_csv(os.path.join(INPUT_DIR, 'data.csv'))
-    
-    # Validate user data
-    is_valid_data, error_message = validate_data(data)
-    if not is_valid_data:
-        LOGGER.error(f'{error_message}')
-        raise Exception(f'{error_message}')
+    if IS_MEMMAP:
+        from src.core.coords import extract_coordinates, geocode_memmap, geocode_memmap_parallel, WORKERS
+        from src.core.bstore import BoundaryStore
+
+        # Processes share the published R*-tree, there is no shared hierarchical index
+        if WORKERS > 1 and IS_HIERARCHICAL:
+            LOGGER.error('SPATIAL_INDEX=HIERARCHICAL is not supported with WORKERS > 1')
+            raise ValueError('SPATIAL_INDEX=HIERARCHICAL is not supported with WORKERS > 1')
+
+        # Locate user data
+        input_fpath, input_format = find_input(INPUT_DIR)
+        output_format = OUTPUT_FORMAT or input_format
+
+        # Validate user data
+        is_valid_data, error_message = validate_data(lambda: read_chunks(input_fpath, input_format))
+        if not is_valid_data:
+            LOGGER.error(f'{error_message}')
+            raise Exception(f'{error_message}')
+
+        # Extract the coordinates into flat arrays, then geocode them straight from disk
+        extract_coordinates(input_fpath, input_format)
+        if WORKERS > 1:
+            from src.core.shared import publish_boundaries, SharedBoundaryStore, SHARED_DIR
+            from src.utils.bundle import verified_index_dir
+
+            # Map the index of the boundary bundle if it has one, otherwise publish the boundaries
+            # once; either way every process maps the same copy
+            shared_dir = verified_index_dir(INTERNAL_DATA_DIR) if BOUNDARY_TIER == 'full' else None
+            if shared_dir is None:
+                shared_dir = publish_boundaries(BoundaryStore(read_boundaries(BOUNDARIES_FNAME)), SHARED_DIR)
+            boundary_store = SharedBoundaryStore(shared_dir)
+            location_ids = geocode_memmap_parallel(shared_dir)
+        else:
+            boundary_store = BoundaryStore(read_boundaries(BOUNDARIES_FNAME))
+            location_ids = geocode_memmap(build_index(boundary_store), boundary_store)
+
+        # Write output to file
+        output_fpath = os.path.join(OUTPUT_DIR, OUTPUT_FNAMES[output_format])
+        with ChunkWriter(output_fpath, output_format) as writer:
+            export_located(input_fpath, input_format, location_ids, boundary_store, writer=writer)
+    else:
+        # Distributed workers geocode ranges in Python, there is no distributed PostGIS path
+        if IS_POSTGIS and IS_DISTRIBUTED:
+            LOGGER.error('POSTGIS=TRUE is not supported with DISTRIBUTED=TRUE')
+            raise ValueError('POSTGIS=TRUE is not supported with DISTRIBUTED=TRUE')
+
+        # Heavy modules are imported by the code paths that need them to keep cold starts short
+        if IS_DISTRIBUTED:
+            from src.core.workqueue import job_lock, create_work_queue, run_worker, get_queue_status, get_job, is_new_job, mark_exported
+
+        # Get database engine
+        engine = get_db_engine()
+
+        # Locate user data
+        input_fpath, input_format = find_input(INPUT_DIR)
+        output_format = OUTPUT_FORMAT or input_format
+        is_columnar = input_format != 'CSV'
+
+        # In distributed mode, the container that takes the job lock first sets up a new job unless
+        # the work queue holds an unfinished one for the same input and boundaries (see is_new_job);
+        # every container geocodes ranges from the work queue
+        is_coordinator = True
+        boundaries_gdf = None
+        boundary_stamp = get_boundary_stamp()
+        job_fingerprint = get_job_fingerprint(input_fpath, boundary_stamp) if IS_DISTRIBUTED else None
+        with job_lock(QUEUE_TABLE_NAME, engine) if IS_DISTRIBUTED else nullcontext():
+            if IS_DISTRIBUTED:
+                is_coordinator = is_new_job(get_job(QUEUE_TABLE_NAME, engine), job_fingerprint, QUEUE_TABLE_NAME)
+
+            if is_coordinator:
+                # Validate user data
+                is_valid_data, error_message = validate_data(lambda: read_chunks(input_fpath, input_format))
+                if not is_valid_data:
+                    LOGGER.error(f'{error_message}')
+                    raise Exception(f'{error_message}')
+
+                # Drop the results view so the data table can be replaced
+                execute_queries([f'DROP VIEW IF EXISTS {RESULTS_VIEW_NAME};'], engine)
+
+                # Initialize database (columnar inputs only ship their coordinates, keyed by row_id)
+                if is_columnar:
+                    coordinates = read_chunks(input_fpath, input_format, columns=['latitude', 'longitude'], with_row_ids=True)
+                    init_database(coordinates, data_table_name=DATA_TABLE_NAME, location_table_name=LOCATION_TABLE_NAME, engine=engine)
+                    execute_queries([f'ALTER TABLE {DATA_TABLE_NAME} ADD PRIMARY KEY ("row_id");'], engine)
+                else:
+                    data = read_chunks(input_fpath, input_format)
+                    init_database(data, data_table_name=DATA_TABLE_NAME, location_table_name=LOCATION_TABLE_NAME, engine=engine)
+
+                # Load the locations dimension table once per boundary bundle and tier (reused on later runs);
+                # views over a stale table go with it, their location ids no longer match
+                if not is_built_from(LOCATIONS_TABLE_NAME, boundary_stamp, engine):
+                    from src.core.bstore import BoundaryStore, load_locations
+                    boundaries_gdf = read_boundaries(BOUNDARIES_FNAME)
+                    execute_queries([f'DROP TABLE IF EXISTS {LOCATIONS_TABLE_NAME} CASCADE;'], engine)
+                    load_locations(BoundaryStore(boundaries_gdf), locations_table_name=LOCATIONS_TABLE_NAME, engine=engine)
+                    set_table_comment(LOCATIONS_TABLE_NAME, boundary_stamp, engine)
+
+                # Split the data table into ranges for the workers
+                if IS_DISTRIBUTED:
+                    create_work_queue(DATA_TABLE_NAME, queue_table_name=QUEUE_TABLE_NAME, engine=engine, fingerprint=job_fingerprint)
+
+        if IS_POSTGIS:
+            from src.core.postgis import load_boundaries, reverse_geocode_postgis
+
+            # Load boundaries into PostGIS once per boundary bundle and tier (reused on later runs)
+            if not is_built_from(BOUNDARY_TABLE_NAME, boundary_stamp, engine):
+                if boundaries_gdf is None:
+                    boundaries_gdf = read_boundaries(BOUNDARIES_FNAME)
+                execute_queries([f'DROP TABLE IF EXISTS {BOUNDARY_TABLE_NAME} CASCADE;'], engine)
+                load_boundaries(boundaries_gdf, boundary_table_name=BOUNDARY_TABLE_NAME, engine=engine)
+                set_table_comment(BOUNDARY_TABLE_NAME, boundary_stamp, engine)
+
+            # Run reverse geocoding algorithm inside the database
+            reverse_geocode_postgis(data_table_name=DATA_TABLE_NAME, boundary_table_name=BOUNDARY_TABLE_NAME, engine=engine)
+        else:
+            from src.core.rgc import reverse_geocode
+            from src.core.bstore import BoundaryStore
 
-    # Get database engine
-    engine = get_db_engine()
+            # Load boundaries data
+            if boundaries_gdf is None:
+                boundaries_gdf = read_boundaries(BOUNDARIES_FNAME)
+            boundary_store = BoundaryStore(boundaries_gdf)
+            rtree_obj = build_index(boundary_store)
 
-    # Initialize database
-    init_database(data, data_table_name=DATA_TABLE_NAME, location_table_name=LOCATION_TABLE_NAME, engine=engine)
+            if IS_DISTRIBUTED:
+                # Geocode ranges from the work queue until none are left
+                run_worker(rtree_obj, boundary_store, data_table_name=DATA_TABLE_NAME, queue_table_name=QUEUE_TABLE_NAME, engine=engine)
+            else:
+                # Run reverse geocoding algorithm
+                reverse_geocode(rtree_obj, boundary_store, data_table_name=DATA_TABLE_NAME, location_table_name=LOCATION_TABLE_NAME, engine=engine)
 
-    # Load boundaries data
-    boundaries_gdf = gpd.read_file(os.path.join(INTERNAL_DATA_DIR, 'boundaries.geojson'))
+                # Merge locations table into data table
+                merge_tables(static_table_name=DATA_TABLE_NAME, merging_table_name=LOCATION_TABLE_NAME, fields=['location_id'], engine=engine)
 
-    # Load MBR data
-    mbrs_gdf = gpd.read_file(os.path.join(INTERNAL_DATA_DIR, 'mbrs.geojson'))
+        # In distributed mode, the first container to find every range finished exports the results,
+        # once; the job lock is held until they are written, so a container dying mid-export leaves
+        # the export to the next one
+        with job_lock(QUEUE_TABLE_NAME, engine) if IS_DISTRIBUTED else nullcontext():
+            if IS_DISTRIBUTED:
+                job = get_job(QUEUE_TABLE_NAME, engine)
+                if job['open_ranges'] > 0 or job['exported_at'] is not None:
+                    LOGGER.info('Leaving the export to the container finishing the last range')
+                    print('Leaving the export to the container finishing the last range', flush=True)
+                    sys.exit(0)
+                LOGGER.info(f'Work queue status: {get_queue_status(QUEUE_TABLE_NAME, engine)}')
+                print(f'Work queue status: {get_queue_status(QUEUE_TABLE_NAME, engine)}', flush=True)
 
-    # Create R*-tree
-    rtree_obj = build_rtree(mbrs_gdf)
+            # Expand location ids into names for readers of the results
+            create_location_view(DATA_TABLE_NAME, locations_table_name=LOCATIONS_TABLE_NAME, view_name=RESULTS_VIEW_NAME, engine=engine)
 
-    # Run reverse geocoding algorithm
-    reverse_geocode(rtree_obj, boundaries_gdf, data_table_name=DATA_TABLE_NAME, location_table_name=LOCATION_TABLE_NAME, engine=engine)
+            # Write output to file
+            output_fpath = os.path.join(OUTPUT_DIR, OUTPUT_FNAMES[output_format])
+            with ChunkWriter(output_fpath, output_format) as writer:
+                if is_columnar:
+                    export_passthrough(input_fpath, input_format, data_table_name=RESULTS_VIEW_NAME, engine=engine, writer=writer)
+                elif IS_DISTRIBUTED:
+                    # The work queue added row_id to the data table; it orders the rows but is not part of the output
+                    export_table(data_table_name=RESULTS_VIEW_NAME, engine=engine, writer=writer, order_field='row_id', exclude_fields=['row_id'])
+                else:
+                    export_table(data_table_name=RESULTS_VIEW_NAME, engine=engine, writer=writer)
 
-    # Merge locations table into data table
-    merge_tables(static_table_name=DATA_TABLE_NAME, merging_table_name=LOCATION_TABLE_NAME, fields=['province', 'country'], engine=engine)
+            if IS_DISTRIBUTED:
+                mark_exported(QUEUE_TABLE_NAME, engine)
 
-    # Write output to file
-    get_output_query = f'''
-             SELECT * FROM {DATA_TABLE_NAME};
-             '''
-    output = get_data(get_output_query, engine)
-    output_fpath = os.path.join(OUTPUT_DIR, 'data_out.csv')
-    output.to_csv(output_fpath, index=False)
+    # Pre-aggregate the output for the map visualizations
+    if IS_CUBE:
+        from src.core.cube import build_cube
+        build_cube(output_fpath, output_format, output_dir=OUTPUT_DIR)
 
     
     # Copy log file to user_data for user visibility
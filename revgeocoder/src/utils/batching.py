@@ -0,0 +1,152 @@
+import resource
+import sys
+import os
+
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Initial batch size and the bounds the batch size is tuned within
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', 10000))
+MIN_BATCH_SIZE = int(os.getenv('MIN_BATCH_SIZE', 1000))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 200000))
+
+# Resident memory (MB) above which batches are shrunk
+MAX_RSS_MB = float(os.getenv('MAX_RSS_MB', 2048))
+
+# Share of a batch's time spent on database round trips above which batches are grown
+MAX_IO_SHARE = 0.2
+
+# Relative throughput change treated as noise
+THROUGHPUT_TOLERANCE = 0.05
+
+# Factors applied when growing or shrinking the batch size
+GROWTH_FACTOR = 1.5
+SHRINK_FACTOR = 0.5
+
+
+"""
+Adaptive batch sizing
+"""
+class AdaptiveBatchSizer:
+    """
+    Tunes the batch size between batches from what the last batch cost:
+      - memory first: if the process RSS exceeds MAX_RSS_MB, the batch size is halved
+      - round trips next: if database round trips take more than MAX_IO_SHARE of a batch, it grows
+      - otherwise it hill-climbs on rows/s, continuing in the direction that last improved
+        throughput and turning around when throughput drops
+    The size always stays within [min_size, max_size] and every decision is logged.
+    """
+
+    def __init__(self, initial_size=BATCH_SIZE, min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE, max_rss_mb=MAX_RSS_MB):
+        """
+        :param initial_size: (int) -> the size of the first batch
+        :param min_size: (int) -> the smallest batch size
+        :param max_size: (int) -> the largest batch size
+        :param max_rss_mb: (float) -> the resident memory (MB) above which batches are shrunk
+        """
+
+        if min_size < 1 or min_size > max_size:
+            LOGGER.error(f'Invalid batch size bounds: [{min_size}, {max_size}]')
+            raise ValueError(f'Invalid batch size bounds: [{min_size}, {max_size}]')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_rss_mb = max_rss_mb
+        self.size = self._clamp(initial_size)
+        self.history = []
+        self._direction = 1
+        self._last_throughput = None
+
+    def update(self, n_rows, io_time, compute_time):
+        """
+        Records the cost of the last batch and picks the size of the next one.
+
+        :param n_rows: (int) -> the number of rows in the last batch
+        :param io_time: (float) -> the time spent on database round trips (s)
+        :param compute_time: (float) -> the time spent geocoding (s)
+
+        :return: (int) -> the size of the next batch
+        """
+
+        total_time = max(io_time + compute_time, 1e-9)
+        throughput = n_rows / total_time
+        io_share = io_time / total_time
+        rss_mb = get_rss_mb()
+
+        # A short batch means the data ran out, so there is nothing to learn from it
+        if n_rows < self.size:
+            reason = 'last batch'
+            next_size = self.size
+        elif rss_mb > self.max_rss_mb:
+            reason = f'RSS {rss_mb:.0f} MB above {self.max_rss_mb:.0f} MB'
+            self._direction = -1
+            next_size = self.size * SHRINK_FACTOR
+        elif io_share > MAX_IO_SHARE:
+            reason = f'round trips take {io_share:.0%} of the batch'
+            self._direction = 1
+            next_size = self.size * GROWTH_FACTOR
+        else:
+            if self._last_throughput is not None and throughput < self._last_throughput * (1 - THROUGHPUT_TOLERANCE):
+                self._direction = -self._direction
+                reason = 'throughput dropped'
+            else:
+                reason = 'throughput held'
+            next_size = self.size * GROWTH_FACTOR if self._direction > 0 else self.size / GROWTH_FACTOR
+
+        self.history.append({'size': self.size, 'rows': n_rows, 'rows_per_sec': throughput,
+                             'io_time': io_time, 'compute_time': compute_time, 'rss_mb': rss_mb})
+        self._last_throughput = throughput
+
+        next_size = self._clamp(next_size)
+        LOGGER.info(f'Batch of {n_rows} rows: {throughput:.0f} rows/s, round trips {io_time:.2f}s, '
+                    f'geocoding {compute_time:.2f}s, RSS {rss_mb:.0f} MB -> next batch size {next_size} ({reason})')
+        self.size = next_size
+
+        return next_size
+
+    def summary(self):
+        """
+        Summarizes the batch sizes chosen so far.
+
+        :return: (str) -> the summary
+        """
+
+        if not self.history:
+            return 'No batches processed'
+
+        sizes = [h['size'] for h in self.history]
+        best = max(self.history, key=lambda h: h['rows_per_sec'])
+
+        return (f'{len(self.history)} batches, sizes {min(sizes)}-{max(sizes)}, '
+                f'best {best["rows_per_sec"]:.0f} rows/s at size {best["size"]}')
+
+    def _clamp(self, size):
+        """
+        Rounds a batch size and keeps it within bounds.
+
+        :param size: (float) -> the batch size
+
+        :return: (int) -> the bounded batch size
+        """
+
+        return int(min(max(round(size), self.min_size), self.max_size))
+
+
+def get_rss_mb():
+    """
+    Measures the resident memory of the process.
+
+    :return: (float) -> the current RSS (MB), or the peak RSS where the current one is unavailable
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in bytes on macOS and in KB elsewhere
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss / 2**20 if sys.platform == 'darwin' else peak_rss / 2**10
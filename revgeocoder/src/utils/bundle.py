@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+
+from src import INTERNAL_DATA_DIR, LOGGER
+
+
+"""
+Local Constants
+"""
+# Manifest listing the files of a bundle with their checksums and row counts
+MANIFEST_FNAME = 'manifest.json'
+
+# Subdirectory holding the published geometry and R*-tree of the full tier (see core/shared.py)
+INDEX_DIRNAME = 'index'
+
+# Bytes hashed at a time
+HASH_BLOCK_SIZE = 2**24
+
+
+"""
+Verify bundle
+"""
+def file_checksum(fpath):
+    """
+    Computes the SHA-256 of a file.
+
+    :param fpath: (str) -> the filepath
+
+    :return: (str) -> the hex digest
+    """
+
+    digest = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def verify_bundle_file(fname, bundle_dir=INTERNAL_DATA_DIR):
+    """
+    Checks a bundle file against the manifest. Directories without a manifest (hand-made data)
+    and files the manifest does not list pass unchecked.
+
+    :param fname: (str) -> the file name, relative to the bundle directory
+    :param bundle_dir: (str) -> the bundle directory
+
+    :return: (dict) -> the file's manifest entry, None if unchecked
+    """
+
+    manifest_fpath = os.path.join(bundle_dir, MANIFEST_FNAME)
+    if not os.path.exists(manifest_fpath):
+        return None
+
+    with open(manifest_fpath) as f:
+        manifest = json.load(f)
+    entry = manifest['files'].get(fname)
+    if entry is None:
+        return None
+
+    if file_checksum(os.path.join(bundle_dir, fname)) != entry['sha256']:
+        LOGGER.error(f'{fname} does not match boundary bundle {manifest["version"]}, rebuild it with python -m src.utils.preprocess')
+        raise ValueError(f'{fname} does not match boundary bundle {manifest["version"]}, rebuild it with python -m src.utils.preprocess')
+
+    LOGGER.info(f'{fname} matches boundary bundle {manifest["version"]}')
+
+    return entry
+
+
+def verified_index_dir(bundle_dir=INTERNAL_DATA_DIR):
+    """
+    Locates the bundle's published index (geometry and R*-tree of the full tier), so geocoding
+    processes can map it directly instead of the boundaries being loaded and published again.
+
+    :param bundle_dir: (str) -> the bundle directory
+
+    :return: (str) -> the index directory, None if the bundle has no manifest or no index
+    """
+
+    manifest_fpath = os.path.join(bundle_dir, MANIFEST_FNAME)
+    if not os.path.exists(manifest_fpath):
+        return None
+
+    with open(manifest_fpath) as f:
+        index_fnames = [fname for fname in json.load(f)['files'] if fname.startswith(INDEX_DIRNAME + os.sep)]
+    if not index_fnames:
+        return None
+
+    for fname in index_fnames:
+        verify_bundle_file(fname, bundle_dir)
+
+    return os.path.join(bundle_dir, INDEX_DIRNAME)
+
+
+def bundle_version(fname, bundle_dir=INTERNAL_DATA_DIR):
+    """
+    Identifies the data behind a bundle file without reading it where possible: the bundle
+    version if the manifest lists the file, otherwise the file's checksum (hand-made data).
+
+    :param fname: (str) -> the file name, relative to the bundle directory
+    :param bundle_dir: (str) -> the bundle directory
+
+    :return: (str) -> the bundle version or 'sha256:<checksum>'
+    """
+
+    manifest_fpath = os.path.join(bundle_dir, MANIFEST_FNAME)
+    if os.path.exists(manifest_fpath):
+        with open(manifest_fpath) as f:
+            manifest = json.load(f)
+        if fname in manifest['files']:
+            return manifest['version']
+
+    fpath = os.path.join(bundle_dir, fname)
+    if not os.path.isfile(fpath):
+        LOGGER.error(f'No {fname} in {bundle_dir}')
+        raise FileNotFoundError(f'No {fname} in {bundle_dir}')
+
+    return f'sha256:{file_checksum(fpath)}'
@@ -1,27 +1,49 @@
 import pandas as pd
 
-from sqlalchemy import create_engine, MetaData, Table, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import URL
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy import exc as sqlalchemy_exc
 
-import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
-
-from prettytable import PrettyTable
-
 from dotenv import load_dotenv
+from contextlib import contextmanager
+import argparse
+import sys
+import time
 import os
 
 from src.utils.exceptions import DatabaseConnectionError, AuthenticationTokenError, DataPushError, QueryExecutionError, TableExistenceError
 from src import LOGGER
 
+"""
+Local Constants
+"""
+# Number of connections kept open in the pool
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+
+# Number of connections allowed beyond POOL_SIZE under load
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 2))
+
+# Age (s) after which pooled connections are replaced
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 600))
+
+# Per-statement timeout (ms), 0 disables it
+STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+
+# Lifetime (s) of a cached RDS auth token (tokens expire after 15 minutes)
+AUTH_TOKEN_TTL = 600
+
+# Number of rows previewed per table by inspect_database
+INSPECT_ROWS = 20
+
+
 """
 Establish database connection
 """
 def get_db_engine():
     """
     Connects to PostGreSQL database with SQLAlchemy Engine using credentials from .env file.
+    The engine keeps a pool of warm, pre-pinged connections. On RDS, no password is baked
+    into the URL; a fresh auth token is generated whenever the pool opens a new connection.
 
     :return: (SQLAlchemy.engine) -> the engine
     """
@@ -40,36 +62,20 @@ def get_db_engine():
     is_rds = os.getenv('RDS') == 'TRUE'
     
     # Build RDS connection URL if  database is on RDS instance
-    cert_path = None
-    region = None
     if is_rds:
         region = os.getenv('REGION')
         cert_fpath = os.getenv('DB_CERT_FPATH')
-    
-        try:
-            # Generate an auth token to use as password
-            rds_client = boto3.client('rds', region_name=region)
-            auth_token = rds_client.generate_db_auth_token(
-                DBHostname=host,
-                Port=port,
-                DBUsername=username,
-                Region=region
-        )
-        except (NoCredentialsError, ClientError)  as e: # Handle AWS-side issues
-            LOGGER.error(f'Error generating authentication token: {e}')
-            raise AuthenticationTokenError(f'Error generating authentication token: {e}')
-        except Exception as e:                          # Catch-all
-            LOGGER.error(f'Unexpected error: {e}')
-            raise AuthenticationTokenError(f'Unexpected error: {e}')
-    
+
+        # Fail fast on bad AWS credentials rather than on first connection
+        token_provider = _get_auth_token_provider(host, port, username, region)
+        token_provider()
     
         # Construct connection string
-        connection_url = URL (
+        connection_url = URL.create(
             drivername='postgresql+psycopg2',
             username=username,
-            password=auth_token,
             host=host,
-            port=port,
+            port=int(port),
             database=dbname,
             query={'sslmode': 'verify-full', 'sslrootcert': cert_fpath})
 
@@ -78,8 +84,23 @@ def get_db_engine():
         password = os.getenv('DB_PASSWORD')
         connection_url = f'postgresql+psycopg2://{username}:{password}@{host}:{port}/{dbname}?sslmode=require'
 
+    connect_args = {}
+    if STATEMENT_TIMEOUT > 0:
+        connect_args['options'] = f'-c statement_timeout={STATEMENT_TIMEOUT}'
+
     try:
-        engine = create_engine(connection_url)
+        engine = create_engine(connection_url,
+                               pool_size=POOL_SIZE,
+                               max_overflow=MAX_OVERFLOW,
+                               pool_recycle=POOL_RECYCLE,
+                               pool_pre_ping=True,
+                               connect_args=connect_args)
+
+        # Inject a current auth token every time the pool opens a connection
+        if is_rds:
+            @event.listens_for(engine, 'do_connect')
+            def _provide_auth_token(dialect, conn_rec, cargs, cparams):
+                cparams['password'] = token_provider()
     except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection issues
         LOGGER.error(f'Error connecting to database: {e}')
         raise DatabaseConnectionError(f'Error connecting to database: {e}')
@@ -93,6 +114,71 @@ def get_db_engine():
     return engine
 
 
+def _get_auth_token_provider(host, port, username, region):
+    """
+    Creates a function returning a valid RDS auth token, regenerating it once the cached
+    one is older than AUTH_TOKEN_TTL.
+
+    :param host: (str) -> the database hostname
+    :param port: (str) -> the database port
+    :param username: (str) -> the database username
+    :param region: (str) -> the AWS region
+
+    :return: (function) -> the token provider
+    """
+
+    # Only RDS deployments need the AWS SDK, so it is not imported at startup
+    import boto3
+    from botocore.exceptions import NoCredentialsError, ClientError
+
+    rds_client = boto3.client('rds', region_name=region)
+    cache = {'token': None, 'expires_at': 0.0}
+
+    def get_auth_token():
+        if cache['token'] is not None and time.monotonic() < cache['expires_at']:
+            return cache['token']
+
+        LOGGER.info('Generating database authentication token...')
+        try:
+            # Generate an auth token to use as password
+            cache['token'] = rds_client.generate_db_auth_token(
+                DBHostname=host,
+                Port=port,
+                DBUsername=username,
+                Region=region
+            )
+            cache['expires_at'] = time.monotonic() + AUTH_TOKEN_TTL
+        except (NoCredentialsError, ClientError)  as e: # Handle AWS-side issues
+            LOGGER.error(f'Error generating authentication token: {e}')
+            raise AuthenticationTokenError(f'Error generating authentication token: {e}')
+        except Exception as e:                          # Catch-all
+            LOGGER.error(f'Unexpected error: {e}')
+            raise AuthenticationTokenError(f'Unexpected error: {e}')
+
+        return cache['token']
+
+    return get_auth_token
+
+
+@contextmanager
+def _connection_scope(engine, connection=None):
+    """
+    Yields the given connection as is, or checks one out of the engine's pool for the
+    duration of the block.
+
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param connection: (SQLAlchemy.connection) -> an open connection to reuse, if any
+
+    :return: (SQLAlchemy.connection) -> the connection
+    """
+
+    if connection is not None:
+        yield connection
+    else:
+        with engine.connect() as connection:
+            yield connection
+
+
 """
 Initialize database
 """
@@ -102,6 +188,7 @@ def init_database(data, data_table_name, location_table_name, engine):
     containing the coordinates and the location table which will eventually store
     the results of the reverse geocoding algorithm.
 
+    :param data: (pd.DataFrame | iterable<pd.DataFrame>) -> the data, either whole or as a stream of chunks
     :param data_table_name: (str) -> the name of the data table
     :param location_table_name: (str) -> the name of the location table
     :param engine: (SQLAlchemy.engine) -> the database engine
@@ -112,14 +199,18 @@ def init_database(data, data_table_name, location_table_name, engine):
     LOGGER.info('Initializing database...')
     print('Initializing database...', flush=True)
     
-    # Create table in database (after lower-casing all field names for simplicity and adding province/country columns)
-    data.columns = [col.lower() for col in data.columns]
-    write_table(data=data, table_name=data_table_name, if_exists='replace', engine=engine)
-    add_fields(table_name=data_table_name, fields={'province': 'TEXT', 'country':'TEXT'}, engine=engine) 
+    # Create table in database (after lower-casing all field names for simplicity and adding a location_id column)
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    if_exists = 'replace'
+    for chunk in chunks:
+        chunk.columns = [col.lower() for col in chunk.columns]
+        write_table(data=chunk, table_name=data_table_name, if_exists=if_exists, engine=engine)
+        if_exists = 'append'
+    add_fields(table_name=data_table_name, fields={'location_id': 'INTEGER'}, engine=engine) 
 
 
     # Create empty location table
-    location_data = pd.DataFrame(columns=['province', 'country'])
+    location_data = pd.DataFrame({'location_id': pd.Series(dtype='Int32')})
     write_table(data=location_data, table_name=location_table_name, if_exists='replace', engine=engine)
 
     return True
@@ -128,13 +219,14 @@ def init_database(data, data_table_name, location_table_name, engine):
 """""
 Modify database
 """
-def write_table(data, table_name, if_exists, engine):
+def write_table(data, table_name, if_exists, engine, connection=None):
     """
     Pushes data to PSQL database on RDS instance.
 
     :param data: (pd.DataFrame) -> the data
     :param table_name: (str) -> the table name
     :param engine: (sqlalchemy.engine) -> the SQLAlchemy engine
+    :param connection: (sqlalchemy.connection) -> an open connection to reuse, if any
     """
 
     LOGGER.debug(f'Writing to {table_name}...')
@@ -144,7 +236,11 @@ def write_table(data, table_name, if_exists, engine):
         raise DataPushError('Provided data is not a pandas DataFrame')
     
     try:
-        data.to_sql(table_name, engine, if_exists=if_exists, index=False)
+        if connection is None:
+            data.to_sql(table_name, engine, if_exists=if_exists, index=False)
+        else:
+            data.to_sql(table_name, connection, if_exists=if_exists, index=False)
+            connection.commit()
     except sqlalchemy_exc.DBAPIError as e:      # Catch DB connection error
         LOGGER.error(f'Error connecting to database: {e}')
         raise DatabaseConnectionError(f'Error connecting to database: {e}')
@@ -227,7 +323,6 @@ def _table_exists(table_name, connection):
 def merge_tables(static_table_name, merging_table_name, fields, engine):
     """"
     Merges columns from merging table into static table.
-    (Presently limited to merging only two fields into static table)
 
     :param static_table_name: (str) -> the name of the static table
     :param merging_table_name: (str) -> the name of the merging table
@@ -252,8 +347,7 @@ def merge_tables(static_table_name, merging_table_name, fields, engine):
     # Query to perform the merger
     merging_query = f'''
                     UPDATE {static_table_name}
-                    SET {fields[0]} = {merging_table_name}.{fields[0]},
-                        {fields[1]} = {merging_table_name}.{fields[1]}
+                    SET {', '.join(f'{field} = {merging_table_name}.{field}' for field in fields)}
                     FROM {merging_table_name}
                     WHERE {static_table_name}.temp_id = {merging_table_name}.temp_id;
                     '''
@@ -296,15 +390,131 @@ def merge_tables(static_table_name, merging_table_name, fields, engine):
     return True
 
 
+def create_location_view(data_table_name, locations_table_name, view_name, engine):
+    """
+    Creates a view of the data table with the location ids expanded into province and country
+    names, so names are only materialized when read.
+
+    :param data_table_name: (str) -> the name of the data table (must hold location_id)
+    :param locations_table_name: (str) -> the name of the locations table
+    :param view_name: (str) -> the name of the view
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (bool) -> indicates the success of the operation
+    """
+
+    LOGGER.debug(f'Creating {view_name} over {data_table_name} and {locations_table_name}...')
+
+    fields = [field for field in get_data(f'SELECT * FROM {data_table_name} LIMIT 0;', engine).columns if field != 'location_id']
+    selected_fields = ', '.join(f'd."{field}"' for field in fields)
+
+    execute_queries([
+        f'DROP VIEW IF EXISTS {view_name};',
+        f'''
+        CREATE VIEW {view_name} AS
+        SELECT {selected_fields}, l."province", l."country"
+        FROM {data_table_name} d
+        LEFT JOIN {locations_table_name} l ON l."id" = d."location_id";
+        '''
+    ], engine)
+
+    return True
+
+
+def execute_queries(queries, engine, connection=None, params=None):
+    """
+    Executes a sequence of statements in a single transaction.
+
+    :param queries: (list<str>) -> the SQL statements
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param connection: (SQLAlchemy.connection) -> an open connection to reuse, if any
+    :param params: (dict) -> bound parameters shared by the statements, if any
+
+    :return: (list<int>) -> the number of rows affected by each statement
+    """
+
+    try:
+        with _connection_scope(engine, connection) as connection:
+            rowcounts = []
+            for query in queries:
+                LOGGER.debug(f'Executing query: {query}...')
+                result = connection.execute(text(query), params or {})
+                rowcounts.append(result.rowcount)
+            connection.commit()
+    except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
+        LOGGER.error(f'Error connecting to database {e}')
+        raise DatabaseConnectionError(f'Error connecting to database {e}')
+    except sqlalchemy_exc.SQLAlchemyError as e: # Handle SQLAlchemy query execution error
+        LOGGER.error(f'Error executing query: {e}')
+        raise QueryExecutionError(f'Error executing query: {e}')
+    except Exception as e:                      # Catch-all
+        LOGGER.error(f'Unexpected error: {e}')
+        raise QueryExecutionError(f'Unexpected error: {e}')
+
+    return rowcounts
+
+
+def table_exists(table_name, engine):
+    """
+    Checks if passed table exists.
+
+    :param table_name: (str) -> the table name
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (bool) -> indicates table existence
+    """
+
+    try:
+        with engine.connect() as connection:
+            return _table_exists(table_name, connection)
+    except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
+        LOGGER.error(f'Error connecting to database {e}')
+        raise DatabaseConnectionError(f'Error connecting to database {e}')
+
+
+def get_table_comment(table_name, engine):
+    """
+    Reads the comment stored on a table.
+
+    :param table_name: (str) -> the table name
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (str) -> the comment, None if the table has none or does not exist
+    """
+
+    data = get_data("SELECT obj_description(to_regclass(:table_name), 'pg_class') AS comment;", engine, params={'table_name': table_name})
+
+    return data['comment'].iloc[0]
+
+
+def set_table_comment(table_name, comment, engine):
+    """
+    Stores a comment on a table, replacing any previous one. The comment is dropped with the table.
+
+    :param table_name: (str) -> the table name
+    :param comment: (str) -> the comment
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: None
+    """
+
+    # COMMENT ON only takes a literal, so the comment is quoted rather than bound (colons are
+    # escaped so SQLAlchemy does not read them as bind parameters)
+    quoted_comment = "'" + comment.replace("'", "''").replace(':', '\\:') + "'"
+    execute_queries([f'COMMENT ON TABLE {table_name} IS {quoted_comment};'], engine)
+
+
 """
 Get data from database
 """
-def get_data(query, engine):
+def get_data(query, engine, connection=None, params=None):
     """
     Executes SELECT statement to get data from database.
 
     :param sql_query: (str) -> the SQL query
     :param engine: (SQLAlchemy.engine) -> the database engine
+    :param connection: (SQLAlchemy.connection) -> an open connection to reuse, if any
+    :param params: (dict) -> bound parameters, if any
     
     :return: (pd.DataFrame) -> the data
     """
@@ -312,11 +522,13 @@ def get_data(query, engine):
     LOGGER.debug(f'Executing SELECT query: {query}...')
 
     try:
-        # Open connection
-        with engine.connect() as connection:
+        # Open connection (or reuse the caller's)
+        with _connection_scope(engine, connection) as connection:
             # Execute the SQL query and fetch the results into a Pandas DataFrame
-            result = connection.execute(text(query))
+            result = connection.execute(text(query), params or {})
             data = pd.DataFrame(result.fetchall(), columns=result.keys())
+            # End the read transaction so a reused connection is not left idle in it
+            connection.commit()
             return data
     except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
         LOGGER.error(f'Error connecting to database {e}')
@@ -329,56 +541,208 @@ def get_data(query, engine):
         raise QueryExecutionError(f'Unexpected error: {e}')
 
 
+def stream_data(query, engine, chunk_size):
+    """
+    Executes SELECT statement and streams the results through a server-side cursor.
+
+    :param query: (str) -> the SQL query
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param chunk_size: (int) -> the number of rows per chunk
+
+    :return: (generator<pd.DataFrame>) -> the data, chunk by chunk
+    """
+
+    LOGGER.debug(f'Streaming SELECT query: {query}...')
+
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(text(query))
+            columns = list(result.keys())
+            for rows in result.partitions(chunk_size):
+                yield pd.DataFrame(rows, columns=columns)
+    except sqlalchemy_exc.DBAPIError as e:      # Handle DB connection error
+        LOGGER.error(f'Error connecting to database {e}')
+        raise DatabaseConnectionError(f'Error connecting to database {e}')
+    except sqlalchemy_exc.SQLAlchemyError as e: # Handle SQLAlchemy query execution error
+        LOGGER.error(f'Error executing query: {e}')
+        raise QueryExecutionError(f'Error executing query: {e}')
+
+
 """
 Display database
 """
-def view_database(engine):
+def inspect_database(engine, table_names=None, n_rows=INSPECT_ROWS, sample_percent=None, output_dir=None):
     """
-    View all tables in the given database.
+    Summarizes tables without loading them: row estimates and sizes from the catalog, per-column
+    statistics from pg_stats (as of the last ANALYZE), and a bounded preview of rows streamed
+    through a server-side cursor, optionally drawn with TABLESAMPLE instead of from the head of
+    the table. Cost does not grow with table size.
 
-    :param engine: (sqlalchemy.engine) -> the SQLAlchemy engine maintaining a connection
-    									  to the database
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param table_names: (list<str>) -> the tables to inspect, every table in the public schema if None
+    :param n_rows: (int) -> the maximum number of rows previewed per table
+    :param sample_percent: (float) -> the percentage of table blocks sampled for the preview (TABLESAMPLE SYSTEM), head of the table if None
+    :param output_dir: (str) -> the directory a <table>.txt report is written to for each table, none if None
 
-    :return: (bool) -> indicates success of operation						
+    :return: (dict <K: table_name, V: str>) -> the report of each table (requested names matching no table are left out)
     """
-    
-    # Open connection
-    with engine.connect() as connection:
-        # Retrieve metadata about database
-        metadata = MetaData()
-        metadata.reflect(bind=engine)
-
-        # Create a new session
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        for table_name in metadata.tables:
-            print(f"\n=== Contents of table '{table_name}': ===\n", flush=True)
-        
-            # Load table
-            table = metadata.tables[table_name]
-            
-            # Query table
-            query = session.query(table)
-            results = query.all()
-
-            # Create PrettyTable instance with columns as field names
-            pretty_table = PrettyTable([column.key for column in table.columns])
-
-            # Add rows to PrettyTable instance
-            for row in results:
-                pretty_table.add_row(row)
-
-            # print table with data
-            print(pretty_table, flush=True)
-            with open(f'{table_name}.txt', 'w') as f:
-                f.write(pretty_table.get_string())
-
-            # Add a separator for better readability between tables
-            print("\n" + "="*60 + "\n", flush=True)
-       
-        # Close session
-        session.close()
 
-    
-    return True
+    # Debugging aid only, so its dependencies are not imported at startup
+    from prettytable import PrettyTable
+
+    overview = get_table_overview(engine, table_names)
+
+    # Report requested names that match no table instead of silently skipping them
+    if table_names is not None:
+        missing_tables = sorted(set(table_names) - set(overview['table_name']))
+        if missing_tables:
+            LOGGER.error(f'No such tables in the public schema: {missing_tables}')
+            print(f'No such tables in the public schema: {missing_tables}', flush=True)
+
+    reports = {}
+    for _, table in overview.iterrows():
+        table_name = table['table_name']
+        lines = [f"=== {table_name}: ~{int(table['estimated_rows'])} rows, "
+                 f"{table['total_size']} total ({table['table_size']} heap) ==="]
+
+        # Per-column statistics
+        column_stats = get_column_stats(table_name, engine)
+        if column_stats.empty:
+            lines.append('(no pg_stats entries, run ANALYZE for column statistics)')
+        else:
+            stats_table = PrettyTable(list(column_stats.columns))
+            for row in column_stats.itertuples(index=False):
+                stats_table.add_row([_truncate(v) for v in row])
+            lines.append(stats_table.get_string())
+
+        # Row preview
+        preview = sample_rows(table_name, engine, n_rows=n_rows, sample_percent=sample_percent)
+        preview_table = PrettyTable(list(preview.columns) or ['(no columns)'])
+        for row in preview.itertuples(index=False):
+            preview_table.add_row([_truncate(v) for v in row])
+        source = f'{sample_percent}% block sample' if sample_percent else 'first rows'
+        lines.append(f'Preview ({len(preview)} rows, {source}):')
+        lines.append(preview_table.get_string())
+
+        reports[table_name] = '\n'.join(lines)
+        print(reports[table_name] + '\n', flush=True)
+
+        if output_dir is not None:
+            with open(os.path.join(output_dir, f'{table_name.replace(os.sep, "_")}.txt'), 'w') as f:
+                f.write(reports[table_name])
+
+    return reports
+
+
+def get_table_overview(engine, table_names=None):
+    """
+    Gets row estimates and on-disk sizes from the catalog, without scanning any table.
+
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param table_names: (list<str>) -> the tables to describe, every table in the public schema if None
+
+    :return: (pd.DataFrame) -> table_name, estimated_rows, table_size, total_size
+    """
+
+    query = '''
+        SELECT c.relname AS table_name,
+               GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+               pg_size_pretty(pg_relation_size(c.oid)) AS table_size,
+               pg_size_pretty(pg_total_relation_size(c.oid)) AS total_size
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm')
+        '''
+    params = {}
+    if table_names is not None:
+        query += ' AND c.relname = ANY(:table_names)'
+        params['table_names'] = list(table_names)
+
+    return get_data(query + ' ORDER BY c.relname;', engine, params=params)
+
+
+def get_column_stats(table_name, engine):
+    """
+    Gets the planner's per-column statistics of a table.
+
+    :param table_name: (str) -> the table name
+    :param engine: (SQLAlchemy.engine) -> the database engine
+
+    :return: (pd.DataFrame) -> column, null_frac, n_distinct, avg_width, most_common_vals, histogram_bounds
+    """
+
+    query = '''
+        SELECT attname AS column, null_frac, n_distinct, avg_width,
+               most_common_vals::text AS most_common_vals,
+               histogram_bounds::text AS histogram_bounds
+        FROM pg_stats
+        WHERE schemaname = 'public' AND tablename = :table_name
+        ORDER BY attname;
+        '''
+
+    return get_data(query, engine, params={'table_name': table_name})
+
+
+def sample_rows(table_name, engine, n_rows=INSPECT_ROWS, sample_percent=None):
+    """
+    Streams at most n_rows rows of a table through a server-side cursor.
+
+    :param table_name: (str) -> the table name
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param n_rows: (int) -> the maximum number of rows
+    :param sample_percent: (float) -> the percentage of blocks sampled (TABLESAMPLE SYSTEM), head of the table if None
+
+    :return: (pd.DataFrame) -> the rows
+    """
+
+    sampling = f' TABLESAMPLE SYSTEM ({float(sample_percent)})' if sample_percent else ''
+    query = f'SELECT * FROM public.{quote_identifier(table_name)}{sampling} LIMIT {int(n_rows)};'
+
+    chunks = list(stream_data(query, engine, chunk_size=max(int(n_rows), 1)))
+
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def quote_identifier(name):
+    """
+    Quotes a name for use as an SQL identifier, so names holding quotes, spaces or upper-case
+    letters refer to the table they name and cannot inject SQL.
+
+    :param name: (str) -> the name
+
+    :return: (str) -> the quoted identifier
+    """
+
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _truncate(value, max_length=60):
+    """
+    Shortens a value for display.
+
+    :param value: (object) -> the value
+    :param max_length: (int) -> the maximum number of characters
+
+    :return: (str) -> the display string
+    """
+
+    text_value = str(value)
+
+    return text_value if len(text_value) <= max_length else text_value[:max_length - 3] + '...'
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Inspect database tables without loading them.')
+    parser.add_argument('tables', nargs='*', help='the tables to inspect (default: all tables)')
+    parser.add_argument('--rows', type=int, default=INSPECT_ROWS, help='the maximum number of rows previewed per table')
+    parser.add_argument('--sample', type=float, default=None, help='preview a TABLESAMPLE SYSTEM sample of this percentage of blocks')
+    parser.add_argument('--output-dir', default=None, help='write a <table>.txt report per table to this directory')
+    args = parser.parse_args()
+
+    reports = inspect_database(get_db_engine(), table_names=args.tables or None, n_rows=args.rows,
+                               sample_percent=args.sample, output_dir=args.output_dir)
+
+    # Fail if any requested table was not found
+    if set(args.tables) - set(reports):
+        sys.exit(1)
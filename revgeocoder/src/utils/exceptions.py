@@ -15,3 +15,6 @@ class TableCreationError(Exception):
 
 class TableExistenceError(Exception):
     pass
+
+class LeaseLostError(Exception):
+    pass
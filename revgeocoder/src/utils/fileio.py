@@ -0,0 +1,318 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.ipc as ipc
+
+import os
+
+from src.utils.database import get_data, stream_data
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Supported input files and their formats, in order of precedence
+INPUT_FNAMES = {'data.csv': 'CSV', 'data.parquet': 'PARQUET', 'data.arrow': 'ARROW', 'data.feather': 'ARROW'}
+
+# Output file for each format
+OUTPUT_FNAMES = {'CSV': 'data_out.csv', 'PARQUET': 'data_out.parquet', 'ARROW': 'data_out.arrow'}
+
+# Number of rows read and written at a time
+CHUNK_SIZE = 100000
+
+
+"""
+Read data files
+"""
+def find_input(input_dir):
+    """
+    Finds the input file in the given directory.
+
+    :param input_dir: (str) -> the input directory
+
+    :return: (str, str) -> the input filepath, the input format ('CSV', 'PARQUET' or 'ARROW')
+    """
+
+    for fname, fmt in INPUT_FNAMES.items():
+        fpath = os.path.join(input_dir, fname)
+        if os.path.exists(fpath):
+            LOGGER.info(f'Found {fmt} input @ {fpath}')
+            return fpath, fmt
+
+    LOGGER.error(f'No input file found in {input_dir}, expected one of {list(INPUT_FNAMES)}')
+    raise FileNotFoundError(f'No input file found in {input_dir}, expected one of {list(INPUT_FNAMES)}')
+
+
+def read_chunks(fpath, fmt, columns=None, chunk_size=CHUNK_SIZE, as_arrow=False, with_row_ids=False):
+    """
+    Streams a data file chunk by chunk. Columnar formats are read one row group
+    (or record batch) at a time and only the requested columns are decoded.
+
+    :param fpath: (str) -> the filepath
+    :param fmt: (str) -> the file format ('CSV', 'PARQUET' or 'ARROW')
+    :param columns: (list<str>) -> the columns to read (matched case-insensitively), all columns if None
+    :param chunk_size: (int) -> the maximum number of rows per chunk
+    :param as_arrow: (bool) -> yield pyarrow Tables instead of DataFrames
+    :param with_row_ids: (bool) -> add a 'row_id' column with each row's position in the file
+
+    :return: (generator<pd.DataFrame | pa.Table>) -> the chunks
+    """
+
+    if columns is not None:
+        columns = resolve_columns(fpath, fmt, columns)
+
+    offset = 0
+
+    # CSV chunks are parsed by pandas already, so skip the round trip through Arrow
+    if fmt == 'CSV' and not as_arrow:
+        for chunk in pd.read_csv(fpath, usecols=columns, chunksize=chunk_size):
+            if with_row_ids:
+                chunk['row_id'] = range(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+        return
+
+    for chunk in _read_arrow_chunks(fpath, fmt, columns, chunk_size):
+        if with_row_ids:
+            chunk = chunk.append_column('row_id', pa.array(range(offset, offset + chunk.num_rows), type=pa.int64()))
+        offset += chunk.num_rows
+        yield chunk if as_arrow else chunk.to_pandas()
+
+
+def resolve_columns(fpath, fmt, columns):
+    """
+    Matches column names case-insensitively against the file's schema.
+
+    :param fpath: (str) -> the filepath
+    :param fmt: (str) -> the file format
+    :param columns: (list<str>) -> the requested column names
+
+    :return: (list<str>) -> the column names as spelled in the file
+    """
+
+    if fmt == 'CSV':
+        available = list(pd.read_csv(fpath, nrows=0).columns)
+    elif fmt == 'PARQUET':
+        available = pq.ParquetFile(fpath).schema_arrow.names
+    else:
+        with pa.memory_map(fpath) as source:
+            available = ipc.open_file(source).schema.names
+
+    lookup = {name.lower(): name for name in available}
+    missing = [c for c in columns if c.lower() not in lookup]
+    if missing:
+        LOGGER.error(f'{fpath} is missing required fields: {missing}')
+        raise ValueError(f'{fpath} is missing required fields: {missing}')
+
+    return [lookup[c.lower()] for c in columns]
+
+
+def _read_arrow_chunks(fpath, fmt, columns, chunk_size):
+    """
+    Yields the file contents as pyarrow Tables of at most chunk_size rows.
+
+    :param fpath: (str) -> the filepath
+    :param fmt: (str) -> the file format
+    :param columns: (list<str>) -> the columns to read, all columns if None
+    :param chunk_size: (int) -> the maximum number of rows per chunk
+
+    :return: (generator<pa.Table>) -> the chunks
+    """
+
+    try:
+        if fmt == 'CSV':
+            for chunk in pd.read_csv(fpath, usecols=columns, chunksize=chunk_size):
+                yield pa.Table.from_pandas(chunk, preserve_index=False)
+        elif fmt == 'PARQUET':
+            parquet_file = pq.ParquetFile(fpath)
+            for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+                yield pa.Table.from_batches([batch])
+        elif fmt == 'ARROW':
+            # Memory-map the IPC file so record batches are read zero-copy
+            with pa.memory_map(fpath) as source:
+                reader = ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    batch = reader.get_batch(i)
+                    if columns is not None:
+                        batch = batch.select(columns)
+                    for start in range(0, batch.num_rows, chunk_size):
+                        yield pa.Table.from_batches([batch.slice(start, chunk_size)])
+        else:
+            raise ValueError(f'Unsupported format: {fmt}')
+    except Exception as e:
+        LOGGER.error(f'Error reading {fpath}: {e}')
+        raise
+
+
+"""
+Write data files
+"""
+class ChunkWriter:
+    """
+    Writes DataFrame or pyarrow Table chunks to a single CSV, Parquet or Arrow IPC file.
+    Columnar outputs get one row group (or record batch) per chunk.
+    """
+
+    def __init__(self, fpath, fmt):
+        """
+        :param fpath: (str) -> the output filepath
+        :param fmt: (str) -> the output format ('CSV', 'PARQUET' or 'ARROW')
+        """
+
+        if fmt not in OUTPUT_FNAMES:
+            LOGGER.error(f'Unsupported output format: {fmt}')
+            raise ValueError(f'Unsupported output format: {fmt}')
+
+        self.fpath = fpath
+        self.fmt = fmt
+        self.schema = None
+        self._is_empty = True
+        self._sink = None
+        self._writer = None
+
+    def write(self, chunk):
+        """
+        Appends a chunk to the file.
+
+        :param chunk: (pd.DataFrame | pa.Table) -> the chunk
+
+        :return: None
+        """
+
+        if self.fmt == 'CSV':
+            if isinstance(chunk, pa.Table):
+                chunk = chunk.to_pandas()
+            chunk.to_csv(self.fpath, mode='w' if self._is_empty else 'a', header=self._is_empty, index=False)
+            self._is_empty = False
+            return
+
+        if isinstance(chunk, pd.DataFrame):
+            chunk = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+
+        if self._writer is None:
+            self.schema = chunk.schema
+            if self.fmt == 'PARQUET':
+                self._writer = pq.ParquetWriter(self.fpath, self.schema)
+            else:
+                self._sink = pa.OSFile(self.fpath, 'wb')
+                self._writer = ipc.new_file(self._sink, self.schema)
+        elif chunk.schema != self.schema:
+            chunk = chunk.cast(self.schema)
+
+        self._writer.write_table(chunk)
+
+    def close(self):
+        """
+        Finalizes the file.
+
+        :return: None
+        """
+
+        if self._writer is not None:
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+"""
+Export results
+"""
+def export_table(data_table_name, engine, writer, chunk_size=CHUNK_SIZE, order_field=None, exclude_fields=None):
+    """
+    Streams the whole data table into the output file.
+
+    :param data_table_name: (str) -> the name of the data table or view
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param writer: (ChunkWriter) -> the output writer
+    :param chunk_size: (int) -> the number of rows per chunk
+    :param order_field: (str) -> the field the rows are written in the order of, table order if None
+    :param exclude_fields: (list<str>) -> internal fields left out of the output (e.g. row_id), none if None
+
+    :return: (int) -> the number of rows written
+    """
+
+    order_by = f' ORDER BY "{order_field}"' if order_field is not None else ''
+
+    n_rows = 0
+    for chunk in stream_data(f'SELECT * FROM {data_table_name}{order_by};', engine, chunk_size):
+        if exclude_fields:
+            chunk = chunk.drop(columns=exclude_fields, errors='ignore')
+        writer.write(chunk)
+        n_rows += len(chunk)
+
+    return n_rows
+
+
+def export_passthrough(input_fpath, input_fmt, data_table_name, engine, writer, chunk_size=CHUNK_SIZE):
+    """
+    Writes the input file back out chunk by chunk with the province and country columns
+    appended. The input columns are copied as Arrow data without ever going through the
+    database, and the locations are looked up by row_id.
+
+    :param input_fpath: (str) -> the input filepath
+    :param input_fmt: (str) -> the input format
+    :param data_table_name: (str) -> the name of the data table or view (must hold row_id, province and country)
+    :param engine: (SQLAlchemy.engine) -> the database engine
+    :param writer: (ChunkWriter) -> the output writer
+    :param chunk_size: (int) -> the number of rows per chunk
+
+    :return: (int) -> the number of rows written
+    """
+
+    offset = 0
+    with engine.connect() as connection:
+        for chunk in read_chunks(input_fpath, input_fmt, chunk_size=chunk_size, as_arrow=True):
+            query = f'''
+                SELECT "province", "country" FROM {data_table_name}
+                WHERE "row_id" >= {offset} AND "row_id" < {offset + chunk.num_rows}
+                ORDER BY "row_id";
+                '''
+            locations = get_data(query, engine, connection=connection)
+            if len(locations) != chunk.num_rows:
+                LOGGER.error(f'Expected {chunk.num_rows} locations for rows {offset}+, found {len(locations)}')
+                raise ValueError(f'Expected {chunk.num_rows} locations for rows {offset}+, found {len(locations)}')
+
+            chunk = chunk.append_column('province', pa.array(locations['province'], type=pa.string()))
+            chunk = chunk.append_column('country', pa.array(locations['country'], type=pa.string()))
+            writer.write(chunk)
+            offset += chunk.num_rows
+
+    return offset
+
+
+def export_located(input_fpath, input_fmt, location_ids, boundary_store, writer, chunk_size=CHUNK_SIZE):
+    """
+    Writes the input file back out chunk by chunk with the province and country columns
+    appended, decoding the location ids geocoded from memory-mapped coordinates. The database
+    is not involved.
+
+    :param input_fpath: (str) -> the input filepath
+    :param input_fmt: (str) -> the input format
+    :param location_ids: (np.ndarray) -> the location id of each row, -1 where no boundary was found
+    :param boundary_store: (BoundaryStore) -> the boundary data the location ids refer to
+    :param writer: (ChunkWriter) -> the output writer
+    :param chunk_size: (int) -> the number of rows per chunk
+
+    :return: (int) -> the number of rows written
+    """
+
+    offset = 0
+    for chunk in read_chunks(input_fpath, input_fmt, chunk_size=chunk_size, as_arrow=True):
+        if offset + chunk.num_rows > len(location_ids):
+            LOGGER.error(f'Expected at most {len(location_ids)} rows in {input_fpath}, found more')
+            raise ValueError(f'Expected at most {len(location_ids)} rows in {input_fpath}, found more')
+
+        provinces, countries = boundary_store.decode(location_ids[offset:offset + chunk.num_rows])
+        chunk = chunk.append_column('province', pa.array(provinces, type=pa.string()))
+        chunk = chunk.append_column('country', pa.array(countries, type=pa.string()))
+        writer.write(chunk)
+        offset += chunk.num_rows
+
+    return offset
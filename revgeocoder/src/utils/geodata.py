@@ -1,12 +1,12 @@
 import pandas as pd
 import geopandas as gpd
-from pyproj import CRS
+import shapely
 from src import LOGGER
 
 """
 Local Constants
 """
-GLOBAL_CRS = CRS("EPSG:4326")
+GLOBAL_CRS = "EPSG:4326"
 
 
 """
@@ -27,19 +27,10 @@ def compute_mbrs(boundaries_gdf, output_fpath, name_field='name'):
     print(f'Computing MBRs...', flush=True)
 
     try:
-        # Compute bounding box for each boundary and store in new Geo dataframe
-        mbr_list = []
-        for index, row in boundaries_gdf.iterrows():
-            LOGGER.debug(f'Processing {row[name_field]}...')
-            try:
-                # Get geographic data
-                geodata_name = row[name_field]
-                mbr = row['geometry'].envelope
-                mbr_list.append({'NAME': geodata_name, 'geometry': mbr})
-            except Exception as e:
-                LOGGER.error(f'Error computing MBR for {row} in boundaries_gdf @ index {index}: {e}')
-                raise
-        mbrs_gdf = gpd.GeoDataFrame(mbr_list, crs=GLOBAL_CRS)
+        # Compute every bounding box in one vectorized call; row i of the output is the MBR of
+        # row i of boundaries_gdf, which is what build_rtree's ids rely on
+        mbrs_gdf = gpd.GeoDataFrame({'NAME': boundaries_gdf[name_field].to_numpy()},
+                                    geometry=shapely.envelope(boundaries_gdf.geometry.to_numpy()), crs=GLOBAL_CRS)
         # Save MBR data in new file
         mbrs_gdf.to_file(output_fpath, driver='GeoJSON')
     except Exception as e:
@@ -0,0 +1,122 @@
+import subprocess
+import argparse
+import sys
+import os
+
+from src import TOP_DIR
+
+
+"""
+Local Constants
+"""
+# Modules that must not be imported at startup (they are only needed by specific code paths)
+DEFERRED_MODULES = ['boto3', 'botocore', 'prettytable', 'sqlalchemy.orm', 'geopandas', 'shapely', 'rtree', 'pyproj']
+
+# Module whose cold start is measured
+ENTRY_MODULE = 'src.main'
+
+# Modules the driver imports on demand for a code path, which must not load the deferred modules
+# either (e.g. the PostGIS path runs in the database and needs no geospatial stack)
+PATH_MODULES = {'POSTGIS': 'src.core.postgis'}
+
+# Maximum cumulative import time (ms) of the entry module, 0 disables the check
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', 0))
+
+# Number of slowest top-level imports reported
+N_REPORTED = 15
+
+
+"""
+Startup benchmark
+"""
+def measure_imports(module=ENTRY_MODULE, n_runs=3):
+    """
+    Imports a module in fresh interpreters under -X importtime and keeps the fastest run.
+
+    :param module: (str) -> the module to import
+    :param n_runs: (int) -> the number of interpreters to start
+
+    :return: (dict <K: module_name, V: (float, int)>) -> the cumulative import time (ms) and
+                                                         nesting level of every imported module
+    """
+
+    best = None
+    for _ in range(n_runs):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   cwd=TOP_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f'Importing {module} failed:\n{completed.stderr}')
+
+        imports = _parse_importtime(completed.stderr)
+        if best is None or imports[module][0] < best[module][0]:
+            best = imports
+
+    return best
+
+
+def check_startup(imports, module=ENTRY_MODULE, budget_ms=IMPORT_BUDGET_MS):
+    """
+    Checks the startup imports against the deferred modules and the time budget.
+
+    :param imports: (dict <K: module_name, V: (float, int)>) -> the measured imports
+    :param module: (str) -> the entry module
+    :param budget_ms: (float) -> the maximum cumulative import time (ms), 0 disables the check
+
+    :return: (list<str>) -> the problems found, if any
+    """
+
+    problems = [f'{name} is imported by {module}' for name in DEFERRED_MODULES if name in imports]
+
+    total_ms = imports[module][0]
+    if budget_ms > 0 and total_ms > budget_ms:
+        problems.append(f'{module} took {total_ms:.0f} ms to import (budget: {budget_ms:.0f} ms)')
+
+    return problems
+
+
+def _parse_importtime(stderr):
+    """
+    Parses -X importtime output.
+
+    :param stderr: (str) -> the interpreter's stderr
+
+    :return: (dict <K: module_name, V: (float, int)>) -> the cumulative import time (ms) and nesting level per module
+    """
+
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        imports[name.strip()] = (int(cumulative_us) / 1000, level)
+
+    return imports
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Measure the cold-start import time of Revgeocoder.')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS, help='fail if importing takes longer (ms)')
+    parser.add_argument('--runs', type=int, default=3, help='number of fresh interpreters to time')
+    args = parser.parse_args()
+
+    imports = measure_imports(n_runs=args.runs)
+
+    print(f'{ENTRY_MODULE}: {imports[ENTRY_MODULE][0]:.0f} ms')
+    top_level = sorted(((ms, name) for name, (ms, level) in imports.items() if level == 1), reverse=True)
+    for ms, name in top_level[:N_REPORTED]:
+        print(f'  {ms:8.1f} ms  {name}')
+
+    problems = check_startup(imports, budget_ms=args.budget_ms)
+
+    # Code paths are only checked for deferred modules, the budget covers startup
+    for path, module in PATH_MODULES.items():
+        path_imports = measure_imports(module, n_runs=1)
+        print(f'{module} ({path}): {path_imports[module][0]:.0f} ms')
+        problems += check_startup(path_imports, module=module, budget_ms=0)
+
+    for problem in problems:
+        print(f'FAIL: {problem}')
+
+    sys.exit(1 if problems else 0)
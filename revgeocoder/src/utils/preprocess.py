@@ -0,0 +1,258 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
+
+import argparse
+import hashlib
+import json
+import os
+
+from src.utils.bundle import file_checksum, MANIFEST_FNAME, INDEX_DIRNAME
+from src.utils.geodata import compute_mbrs, GLOBAL_CRS
+from src import INTERNAL_DATA_DIR, LOGGER
+
+
+"""
+Local Constants
+"""
+# Version of the bundle layout described by the manifest
+BUNDLE_FORMAT = 1
+
+# Simplification tolerance (degrees) of each tier; 'full' keeps every vertex and is the tier
+# written to boundaries.geojson / mbrs.geojson, the others to boundaries_<tier>.geojson / mbrs_<tier>.geojson
+SIMPLIFY_TIERS = {'full': 0.0, 'medium': 0.005, 'coarse': 0.05}
+
+# Number of boundaries handed to a process at a time
+PREPROCESS_CHUNK_SIZE = 64
+
+"""
+Preprocessing pipeline
+"""
+def build_bundle(land_fpath, maritime_fpath, output_dir=INTERNAL_DATA_DIR, tiers=SIMPLIFY_TIERS, n_workers=None,
+                 name_field='name', admin_field='admin'):
+    """
+    Builds the boundary bundle from the Natural Earth land (admin-1) and maritime shapefiles:
+      - tags land boundaries LAND and maritime ones WATER
+      - repairs invalid geometries
+      - splits multipolygons into one boundary per polygon, and polygons crossing the antimeridian
+        into one per side, so every boundary has a tight envelope
+      - simplifies every boundary for each tier
+      - computes the envelopes (MBRs) row for row with the boundaries
+      - publishes the full tier's geometry and R*-tree for memory-mapped use
+      - records every file with its SHA-256 and row count in a versioned manifest
+    Geometry work runs on a process pool, PREPROCESS_CHUNK_SIZE boundaries at a time.
+
+    :param land_fpath: (str) -> the land boundaries (Shapefile or any format GeoPandas reads)
+    :param maritime_fpath: (str) -> the maritime boundaries
+    :param output_dir: (str) -> the bundle directory
+    :param tiers: (dict <K: tier, V: float>) -> the simplification tolerance (degrees) of each tier (must include 'full')
+    :param n_workers: (int) -> the number of processes, one per CPU if None
+    :param name_field: (str) -> the field holding the province names
+    :param admin_field: (str) -> the field holding the country names
+
+    :return: (dict) -> the manifest
+    """
+
+    if 'full' not in tiers:
+        LOGGER.error("tiers must include 'full'")
+        raise ValueError("tiers must include 'full'")
+
+    LOGGER.info(f'Building boundary bundle in {output_dir}...')
+    print(f'Building boundary bundle in {output_dir}...', flush=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    boundaries_gdf = read_sources(land_fpath, maritime_fpath, name_field=name_field, admin_field=admin_field)
+
+    # Repair, split and simplify in parallel (chunks keep their order, so ids are deterministic)
+    chunks = [boundaries_gdf.iloc[start:start + PREPROCESS_CHUNK_SIZE] for start in range(0, len(boundaries_gdf), PREPROCESS_CHUNK_SIZE)]
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            processed = list(executor.map(_process_chunk, chunks, [tiers] * len(chunks)))
+    except Exception as e:
+        LOGGER.error(f'Failed to preprocess boundaries: {e}')
+        raise
+    processed = pd.concat(processed, ignore_index=True)
+
+    LOGGER.info(f'{len(boundaries_gdf)} source boundaries became {len(processed)} polygons')
+    print(f'{len(boundaries_gdf)} source boundaries became {len(processed)} polygons', flush=True)
+
+    files = {}
+    for tier in tiers:
+        suffix = '' if tier == 'full' else f'_{tier}'
+        tier_gdf = gpd.GeoDataFrame(processed[['name', 'admin', 'TERRAIN']], geometry=processed[f'geometry_{tier}'].to_numpy(), crs=GLOBAL_CRS)
+
+        # Simplification can collapse small polygons; drop them before ids are assigned
+        tier_gdf = tier_gdf[~tier_gdf.geometry.is_empty].reset_index(drop=True)
+
+        boundaries_fpath = os.path.join(output_dir, f'boundaries{suffix}.geojson')
+        mbrs_fpath = os.path.join(output_dir, f'mbrs{suffix}.geojson')
+        tier_gdf.to_file(boundaries_fpath, driver='GeoJSON')
+        compute_mbrs(tier_gdf, mbrs_fpath)
+        files[os.path.basename(boundaries_fpath)] = {'rows': len(tier_gdf), 'tier': tier}
+        files[os.path.basename(mbrs_fpath)] = {'rows': len(tier_gdf), 'tier': tier}
+
+        if tier == 'full':
+            # Deferred so the bundle can be built without the core modules' dependencies loaded up front
+            from src.core.bstore import BoundaryStore
+            from src.core.shared import publish_boundaries
+            index_dir = os.path.join(output_dir, INDEX_DIRNAME)
+            publish_boundaries(BoundaryStore(tier_gdf), index_dir)
+            for fname in sorted(os.listdir(index_dir)):
+                files[os.path.join(INDEX_DIRNAME, fname)] = {'rows': len(tier_gdf), 'tier': tier}
+
+    for fname in files:
+        files[fname]['sha256'] = file_checksum(os.path.join(output_dir, fname))
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:12],
+        'created': datetime.now(timezone.utc).isoformat(),
+        'sources': {os.path.basename(fpath): file_checksum(fpath) for fpath in (land_fpath, maritime_fpath) if os.path.isfile(fpath)},
+        'tiers': tiers,
+        'files': files
+    }
+    with open(os.path.join(output_dir, MANIFEST_FNAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    LOGGER.info(f'Wrote boundary bundle {manifest["version"]} ({len(files)} files)')
+    print(f'Wrote boundary bundle {manifest["version"]} ({len(files)} files)', flush=True)
+
+    return manifest
+
+
+def read_sources(land_fpath, maritime_fpath, name_field='name', admin_field='admin'):
+    """
+    Reads the land and maritime boundaries into one GeoDataFrame with the fields the geocoder
+    expects (name, admin, TERRAIN, geometry) in GLOBAL_CRS.
+
+    :param land_fpath: (str) -> the land boundaries
+    :param maritime_fpath: (str) -> the maritime boundaries
+    :param name_field: (str) -> the field holding the province (or body of water) names
+    :param admin_field: (str) -> the field holding the country names (absent from maritime data)
+
+    :return: (gpd.GeoDataFrame) -> the boundaries, land first
+    """
+
+    sources = []
+    for fpath, terrain in ((land_fpath, 'LAND'), (maritime_fpath, 'WATER')):
+        LOGGER.info(f'Reading {terrain} boundaries from {fpath}...')
+        print(f'Reading {terrain} boundaries from {fpath}...', flush=True)
+        try:
+            source_gdf = gpd.read_file(fpath)
+        except Exception as e:
+            LOGGER.error(f'Error reading {fpath}: {e}')
+            raise
+
+        source_gdf = source_gdf.to_crs(GLOBAL_CRS) if source_gdf.crs is not None else source_gdf.set_crs(GLOBAL_CRS)
+        sources.append(gpd.GeoDataFrame({
+            'name': source_gdf[name_field].to_numpy() if name_field in source_gdf.columns else None,
+            'admin': source_gdf[admin_field].to_numpy() if admin_field in source_gdf.columns else None,
+            'TERRAIN': terrain
+        }, geometry=source_gdf.geometry.to_numpy(), crs=GLOBAL_CRS))
+
+    return pd.concat(sources, ignore_index=True)
+
+
+def _process_chunk(chunk_gdf, tiers):
+    """
+    Repairs, splits and simplifies a chunk of boundaries (runs in a pool process).
+
+    :param chunk_gdf: (gpd.GeoDataFrame) -> the boundaries
+    :param tiers: (dict <K: tier, V: float>) -> the simplification tolerance of each tier
+
+    :return: (pd.DataFrame) -> one row per polygon (fields: name, admin, TERRAIN, geometry_<tier>)
+    """
+
+    rows = []
+    for name, admin, terrain, geometry in zip(chunk_gdf['name'], chunk_gdf['admin'], chunk_gdf['TERRAIN'], chunk_gdf.geometry):
+        if geometry is None or geometry.is_empty:
+            continue
+        if not geometry.is_valid:
+            geometry = shapely.make_valid(geometry)
+
+        for polygon in _polygons(geometry):
+            for part in split_antimeridian(polygon):
+                row = {'name': name, 'admin': admin, 'TERRAIN': terrain}
+                for tier, tolerance in tiers.items():
+                    row[f'geometry_{tier}'] = shapely.simplify(part, tolerance, preserve_topology=True) if tolerance > 0 else part
+                rows.append(row)
+
+    return pd.DataFrame(rows, columns=['name', 'admin', 'TERRAIN'] + [f'geometry_{tier}' for tier in tiers])
+
+
+def split_antimeridian(polygon):
+    """
+    Splits a polygon that crosses the antimeridian (drawn with longitudes jumping between +180 and
+    -180, so its envelope spans the globe) into one polygon on each side.
+
+    :param polygon: (shapely.Polygon) -> the polygon
+
+    :return: (list<shapely.Polygon>) -> the polygon, or its parts on each side of the antimeridian
+    """
+
+    # A crossing shows up as an edge jumping more than half way around the globe between points off
+    # the antimeridian (boundaries that span the globe, like Antarctica or the Southern Ocean, run
+    # from -180 to 180 exactly instead)
+    if not any(_crosses_antimeridian(np.asarray(ring.coords)[:, 0]) for ring in [polygon.exterior, *polygon.interiors]):
+        return [polygon]
+
+    # Unwrap to 0..360 so the polygon is contiguous, then cut at 180 and wrap the east side back
+    unwrapped = shapely.transform(polygon, lambda coords: np.where(coords[:, :1] < 0, coords + [360, 0], coords))
+    west = shapely.clip_by_rect(unwrapped, 0, -90, 180, 90)
+    east = shapely.transform(shapely.clip_by_rect(unwrapped, 180, -90, 360, 90), lambda coords: coords - [360, 0])
+
+    return [part for side in (west, east) for part in _polygons(side)]
+
+
+def _crosses_antimeridian(longitudes):
+    """
+    Checks a ring for edges that jump across the antimeridian.
+
+    :param longitudes: (np.ndarray) -> the longitudes of the ring's vertices
+
+    :return: (bool) -> whether any edge crosses the antimeridian
+    """
+
+    is_jump = np.abs(np.diff(longitudes)) > 180
+    is_off_antimeridian = np.abs(longitudes) < 180
+
+    return bool((is_jump & is_off_antimeridian[:-1] & is_off_antimeridian[1:]).any())
+
+
+def _polygons(geometry):
+    """
+    Extracts the polygons of a geometry (dropping the points and lines make_valid can produce).
+
+    :param geometry: (shapely.Geometry) -> the geometry
+
+    :return: (list<shapely.Polygon>) -> the non-empty polygons
+    """
+
+    parts = shapely.get_parts(shapely.get_parts(geometry))
+
+    return [part for part in parts if shapely.get_type_id(part) == 3 and not part.is_empty]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Build the versioned boundary bundle from the Natural Earth shapefiles.')
+    parser.add_argument('land', help='the land (admin-1) boundaries, e.g. ne_10m_admin_1_states_provinces.shp')
+    parser.add_argument('maritime', help='the maritime boundaries, e.g. ne_10m_geography_marine_polys.shp')
+    parser.add_argument('--output-dir', default=INTERNAL_DATA_DIR, help='the bundle directory (default: data/internal/)')
+    parser.add_argument('--workers', type=int, default=None, help='the number of processes (default: one per CPU)')
+    parser.add_argument('--tier', action='append', default=None, metavar='NAME=TOLERANCE',
+                        help="a simplification tier in degrees, repeatable ('full' is always built)")
+    args = parser.parse_args()
+
+    tiers = SIMPLIFY_TIERS
+    if args.tier:
+        tiers = {'full': 0.0}
+        for tier in args.tier:
+            name, tolerance = tier.split('=')
+            tiers[name] = float(tolerance)
+
+    build_bundle(args.land, args.maritime, output_dir=args.output_dir, tiers=tiers, n_workers=args.workers)
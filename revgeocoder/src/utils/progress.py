@@ -0,0 +1,260 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import threading
+import json
+import time
+import os
+
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# File the progress is written to as JSON after every update, none if unset
+PROGRESS_FILE = os.getenv('PROGRESS_FILE')
+
+# Local port serving the progress in the Prometheus text format, none if unset
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+# Interface the metrics endpoint binds to ('0.0.0.0' exposes it beyond this machine)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Weight of the latest batch in the moving-average throughput
+SMOOTHING = 0.2
+
+# Prefix of the exported metric names
+METRIC_PREFIX = 'revgeocoder'
+
+
+"""
+Progress reporting
+"""
+class ProgressReporter:
+    """
+    Tracks geocoding progress against the total row count and reports it after every batch:
+    rows geocoded, instantaneous and moving-average rows/s, ETA, coastline-fallback rate and
+    error count. The same figures are optionally written to a JSON status file and served on
+    a local Prometheus endpoint, whose last-progress timestamp shows when a job has stalled.
+    """
+
+    def __init__(self, total_rows=None, status_fpath=PROGRESS_FILE, metrics_port=METRICS_PORT, metrics_host=METRICS_HOST):
+        """
+        :param total_rows: (int) -> the number of rows to geocode, unknown if None (no ETA)
+        :param status_fpath: (str) -> the JSON status file, none if None
+        :param metrics_port: (int) -> the port of the metrics endpoint, none if 0
+        :param metrics_host: (str) -> the interface the metrics endpoint binds to
+        """
+
+        self.total_rows = total_rows
+        self.status_fpath = status_fpath
+        self.n_rows = 0
+        self.n_fallbacks = 0
+        self.n_errors = 0
+        self.rows_per_sec = 0.0
+        self.avg_rows_per_sec = None
+        self._avg_rows = None
+        self._avg_seconds = None
+        self.start_time = time.time()
+        self.last_update = self.start_time
+        self._lock = threading.Lock()
+        self._server = None
+
+        if metrics_port:
+            self._server = _start_metrics_server(self, metrics_host, metrics_port)
+
+    def update(self, n_rows, n_fallbacks=0, n_errors=0):
+        """
+        Records a geocoded batch and reports the progress.
+
+        :param n_rows: (int) -> the number of rows in the batch
+        :param n_fallbacks: (int) -> the number of rows mapped to a coastline from the water
+        :param n_errors: (int) -> the number of rows that failed
+
+        :return: (dict) -> the progress (see status)
+        """
+
+        with self._lock:
+            now = time.time()
+            elapsed = max(now - self.last_update, 1e-9)
+            self.rows_per_sec = n_rows / elapsed
+
+            # Rows and time are smoothed separately, so bursts of batches finishing together
+            # (e.g. from a process pool) do not dominate the average
+            if self._avg_rows is None:
+                self._avg_rows, self._avg_seconds = n_rows, elapsed
+            else:
+                self._avg_rows = SMOOTHING * n_rows + (1 - SMOOTHING) * self._avg_rows
+                self._avg_seconds = SMOOTHING * elapsed + (1 - SMOOTHING) * self._avg_seconds
+            self.avg_rows_per_sec = self._avg_rows / self._avg_seconds
+            self.n_rows += n_rows
+            self.n_fallbacks += n_fallbacks
+            self.n_errors += n_errors
+            self.last_update = now
+            status = self.status()
+
+        LOGGER.info(self.format(status))
+        print(self.format(status), flush=True)
+        if self.status_fpath is not None:
+            _write_status(status, self.status_fpath)
+
+        return status
+
+    def status(self):
+        """
+        Summarizes the progress.
+
+        :return: (dict) -> rows, total_rows, rows_per_sec, avg_rows_per_sec, eta_seconds,
+                           fallback_rate, fallbacks, errors, elapsed_seconds, last_update
+        """
+
+        eta_seconds = None
+        if self.total_rows is not None and self.avg_rows_per_sec:
+            eta_seconds = max(self.total_rows - self.n_rows, 0) / self.avg_rows_per_sec
+
+        return {
+            'rows': self.n_rows,
+            'total_rows': self.total_rows,
+            'rows_per_sec': self.rows_per_sec,
+            'avg_rows_per_sec': self.avg_rows_per_sec or 0.0,
+            'eta_seconds': eta_seconds,
+            'fallback_rate': self.n_fallbacks / self.n_rows if self.n_rows else 0.0,
+            'fallbacks': self.n_fallbacks,
+            'errors': self.n_errors,
+            'elapsed_seconds': time.time() - self.start_time,
+            'last_update': self.last_update
+        }
+
+    @staticmethod
+    def format(status):
+        """
+        Formats the progress as a single line.
+
+        :param status: (dict) -> the progress (see status)
+
+        :return: (str) -> the progress line
+        """
+
+        if status['total_rows']:
+            done = f"{status['rows']}/{status['total_rows']} rows ({status['rows'] / status['total_rows']:.1%})"
+        else:
+            done = f"{status['rows']} rows"
+        eta = format_duration(status['eta_seconds']) if status['eta_seconds'] is not None else 'unknown'
+
+        return (f"Geocoded {done} | {status['rows_per_sec']:.0f} rows/s (avg {status['avg_rows_per_sec']:.0f}) | "
+                f"ETA {eta} | coastline fallbacks {status['fallback_rate']:.1%} | errors {status['errors']}")
+
+    def to_prometheus(self):
+        """
+        Renders the progress in the Prometheus text exposition format.
+
+        :return: (str) -> the metrics
+        """
+
+        with self._lock:
+            status = self.status()
+
+        metrics = [
+            ('rows_total', 'counter', 'Rows geocoded', status['rows']),
+            ('rows_expected', 'gauge', 'Rows to geocode (-1 if unknown)', status['total_rows'] if status['total_rows'] is not None else -1),
+            ('rows_per_second', 'gauge', 'Throughput of the last batch', status['rows_per_sec']),
+            ('rows_per_second_avg', 'gauge', 'Moving-average throughput', status['avg_rows_per_sec']),
+            ('eta_seconds', 'gauge', 'Estimated time left (-1 if unknown)', status['eta_seconds'] if status['eta_seconds'] is not None else -1),
+            ('coastline_fallbacks_total', 'counter', 'Rows mapped to a coastline from the water', status['fallbacks']),
+            ('errors_total', 'counter', 'Rows that failed', status['errors']),
+            ('elapsed_seconds', 'gauge', 'Time since the job started', status['elapsed_seconds']),
+            ('last_progress_timestamp_seconds', 'gauge', 'Unix time of the last geocoded batch', status['last_update'])
+        ]
+
+        lines = []
+        for name, metric_type, description, value in metrics:
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {metric_type}')
+            lines.append(f'{METRIC_PREFIX}_{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """
+        Stops the metrics endpoint, if any.
+
+        :return: None
+        """
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def format_duration(seconds):
+    """
+    Formats a duration as HH:MM:SS, prefixed with the number of days once it reaches a day.
+
+    :param seconds: (float) -> the duration
+
+    :return: (str) -> the formatted duration (e.g. '05:02:09' or '3d 05:02:09')
+    """
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    hms = f'{hours:02d}:{minutes:02d}:{seconds:02d}'
+
+    return f'{days}d {hms}' if days else hms
+
+
+def _write_status(status, status_fpath):
+    """
+    Replaces the status file atomically, so readers never see a partial write.
+
+    :param status: (dict) -> the progress
+    :param status_fpath: (str) -> the status file
+
+    :return: None
+    """
+
+    try:
+        tmp_fpath = f'{status_fpath}.tmp'
+        with open(tmp_fpath, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp_fpath, status_fpath)
+    except OSError as e:
+        # Progress reporting never stops the job
+        LOGGER.error(f'Error writing progress to {status_fpath}: {e}')
+
+
+def _start_metrics_server(reporter, host, port):
+    """
+    Serves the reporter's metrics on a background thread.
+
+    :param reporter: (ProgressReporter) -> the reporter
+    :param host: (str) -> the interface to bind to
+    :param port: (int) -> the local port
+
+    :return: (ThreadingHTTPServer) -> the server
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = reporter.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            return
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        LOGGER.error(f'Error starting metrics endpoint on {host}:{port}: {e}')
+        return None
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    LOGGER.info(f'Serving progress metrics on {host}:{port}')
+    print(f'Serving progress metrics on {host}:{port}', flush=True)
+
+    return server
@@ -0,0 +1,203 @@
+# Vendored: revgeocoder/src/utils/scan.py is the single source of this module and
+# econbot/src/utils/scan.py is a byte-for-byte copy of it. Edit the revgeocoder file only,
+# then run ./sync-vendored.sh (./sync-vendored.sh --check fails while the copies differ).
+
+import pandas as pd
+import numpy as np
+from src import LOGGER
+
+
+"""
+Local Constants
+"""
+# Maximum number of offending row numbers reported per failed check
+MAX_REPORTED_ROWS = 10
+
+
+"""
+Chunked validation checks
+"""
+def scan_data(data, chunk_size, **checks):
+    """
+    Runs scan_chunks over the data. DataFrames and functions returning chunks can be read
+    twice, so their duplicate candidates are confirmed by comparing values.
+
+    :param data: (pd.DataFrame | iterable<pd.DataFrame> | callable) -> the data, or a function returning its chunks
+    :param chunk_size: (int) -> the number of rows per chunk if data is a DataFrame
+    :param checks: (dict) -> the checks passed on to scan_chunks
+
+    :return: (int, dict <K: check_name, V: np.ndarray>) -> see scan_chunks
+    """
+
+    rescan = None
+    if callable(data) or isinstance(data, pd.DataFrame):
+        rescan = lambda: iter_chunks(data, chunk_size)
+
+    return scan_chunks(iter_chunks(data, chunk_size), rescan=rescan, **checks)
+
+
+def scan_chunks(chunks, required_fields=None, range_fields=None, empty_fields=None, check_duplicates=True, rescan=None):
+    """
+    Runs every validation check over a stream of chunks in a single pass. Each check is
+    one vectorized operation per chunk and duplicate candidates are found by keeping a 64-bit
+    hash per row rather than a second copy of the data. Rows sharing a hash are only reported
+    as duplicates once their values are compared, which takes a second pass over the candidate
+    rows (see rescan); a one-shot stream cannot be re-read, so its duplicates rest on the hash.
+
+    :param chunks: (iterable<pd.DataFrame>) -> the data chunks, in row order
+    :param required_fields: (list<str>) -> fields that must not contain missing values, all fields if None
+    :param range_fields: (dict <K: field_name, V: (min, max)>) -> inclusive valid ranges, None for an open bound
+    :param empty_fields: (list<str>) -> fields that must not contain empty strings, all text fields if None, none if empty
+    :param check_duplicates: (bool) -> indicates whether to check for duplicate records
+    :param rescan: (callable) -> returns the same chunks again to confirm duplicates, none if None
+
+    :return: (int, dict <K: check_name, V: np.ndarray>) -> the number of rows scanned, the offending row numbers
+                                                           of every failed check ('missing', 'empty', 'duplicate'
+                                                           or the name of an out-of-range field)
+    """
+
+    range_fields = range_fields or {}
+    range_names = list(range_fields)
+    lower_bounds = np.array([-np.inf if lo is None else lo for lo, _ in range_fields.values()], dtype=np.float64)
+    upper_bounds = np.array([np.inf if hi is None else hi for _, hi in range_fields.values()], dtype=np.float64)
+
+    offending_rows = {}
+    row_hashes = []
+    offset = 0
+
+    try:
+        for chunk in chunks:
+            row_numbers = np.arange(offset, offset + len(chunk))
+
+            # Missing values
+            fields = chunk.columns if required_fields is None else required_fields
+            missing = chunk[fields].isna().to_numpy().any(axis=1)
+            _record(offending_rows, 'missing', row_numbers[missing])
+
+            # Empty strings (only text columns can hold them)
+            fields = chunk.columns if empty_fields is None else empty_fields
+            text_fields = [f for f in fields if pd.api.types.is_string_dtype(chunk[f].dtype)]
+            if text_fields:
+                empty = (chunk[text_fields] == '').to_numpy().any(axis=1)
+                _record(offending_rows, 'empty', row_numbers[empty])
+
+            # Out-of-range values (missing values compare False and are left to the missing check)
+            if range_names:
+                values = chunk[range_names].to_numpy(dtype=np.float64)
+                out_of_range = (values < lower_bounds) | (values > upper_bounds)
+                for j, field in enumerate(range_names):
+                    _record(offending_rows, field, row_numbers[out_of_range[:, j]])
+
+            # Row hashes for duplicate detection
+            if check_duplicates:
+                row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+
+            offset += len(chunk)
+    except KeyError as e:
+        LOGGER.error(f'Data is missing required fields: {e}')
+        raise ValueError(f'Data is missing required fields: {e}')
+
+    violations = {check: np.concatenate(rows) for check, rows in offending_rows.items()}
+
+    # Duplicate candidates are every repeat of a hash after its first occurrence
+    if check_duplicates and offset > 0:
+        hashes = np.concatenate(row_hashes)
+        order = np.argsort(hashes, kind='stable')
+        is_repeat = hashes[order][1:] == hashes[order][:-1]
+        if is_repeat.any():
+            duplicates = np.sort(order[1:][is_repeat])
+            if rescan is not None:
+                duplicates = _confirm_duplicates(rescan(), hashes, duplicates)
+            if duplicates.size:
+                violations['duplicate'] = duplicates
+
+    return offset, violations
+
+
+def iter_chunks(data, chunk_size):
+    """
+    Yields the data in chunks of at most chunk_size rows.
+
+    :param data: (pd.DataFrame | iterable<pd.DataFrame> | callable) -> the data, or a function returning its chunks
+    :param chunk_size: (int) -> the number of rows per chunk if data is a DataFrame
+
+    :return: (generator<pd.DataFrame>) -> the chunks
+    """
+
+    if callable(data):
+        yield from data()
+        return
+
+    if not isinstance(data, pd.DataFrame):
+        yield from data
+        return
+
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+def format_rows(rows):
+    """
+    Formats offending row numbers for an error message.
+
+    :param rows: (np.ndarray) -> the offending row numbers
+
+    :return: (str) -> the formatted row numbers
+    """
+
+    shown = ', '.join(str(r) for r in rows[:MAX_REPORTED_ROWS])
+    if rows.size > MAX_REPORTED_ROWS:
+        shown += f', ... ({rows.size} rows in total)'
+
+    return f' (rows {shown})'
+
+
+def _confirm_duplicates(chunks, hashes, candidates):
+    """
+    Compares the values of the rows whose hashes repeat, so a hash collision between two
+    different rows is not reported as a duplicate. Only the rows sharing a hash are kept.
+
+    :param chunks: (iterable<pd.DataFrame>) -> the data chunks, in row order
+    :param hashes: (np.ndarray) -> the hash of every row
+    :param candidates: (np.ndarray) -> the row numbers whose hash occurred before
+
+    :return: (np.ndarray) -> the row numbers that repeat an earlier row exactly
+    """
+
+    is_candidate = np.isin(hashes, np.unique(hashes[candidates]))
+
+    candidate_rows = []
+    offset = 0
+    for chunk in chunks:
+        mask = is_candidate[offset:offset + len(chunk)]
+        if mask.any():
+            rows = chunk[mask]
+            candidate_rows.append(rows.set_axis(np.flatnonzero(mask) + offset, axis=0))
+        offset += len(chunk)
+
+    if offset != len(hashes):
+        LOGGER.error(f'Data changed between passes ({len(hashes)} then {offset} rows)')
+        raise ValueError(f'Data changed between passes ({len(hashes)} then {offset} rows)')
+
+    candidate_rows = pd.concat(candidate_rows)
+    duplicates = candidate_rows.index[candidate_rows.duplicated(keep='first')].to_numpy()
+    n_collisions = candidates.size - duplicates.size
+    if n_collisions:
+        LOGGER.info(f'Ignored {n_collisions} hash collisions between distinct rows')
+
+    return duplicates
+
+
+def _record(offending_rows, check, rows):
+    """
+    Adds offending row numbers to the given check.
+
+    :param offending_rows: (dict <K: check_name, V: list<np.ndarray>>) -> the offending rows so far
+    :param check: (str) -> the check name
+    :param rows: (np.ndarray) -> the offending row numbers
+
+    :return: None
+    """
+
+    if rows.size:
+        offending_rows.setdefault(check, []).append(rows)
@@ -1,12 +1,25 @@
-import pandas as pd
+from src.utils.scan import scan_data, format_rows
 from src import LOGGER
 
 
-def validate_data(data):
+"""
+Local Constants
+"""
+# Number of rows validated at a time
+CHUNK_SIZE = 100000
+
+
+"""
+Validation engine
+"""
+def validate_data(data, chunk_size=CHUNK_SIZE):
     """
     Validates the user data
 
-    :data: (pd.Dataframe) -> the data
+    :data: (pd.Dataframe | iterable<pd.DataFrame> | callable) -> the data, either whole, as a stream of chunks or as
+                                                               a function returning the stream (duplicates are then
+                                                               confirmed by a second pass)
+    :param chunk_size: (int) -> the number of rows validated at a time if data is a DataFrame
 
     :return: (bool, str) -> validation status and message regarding error, if any
     """
@@ -17,35 +30,36 @@ def validate_data(data):
     is_valid = True
     error_message = ''
 
+    # Empty strings are not checked: the earthquake fields are numeric and CSV readers load empty cells as missing
+    n_rows, violations = scan_data(data, chunk_size,
+                                   required_fields=['Latitude', 'Longitude', 'Magnitude'],
+                                   range_fields={'Latitude': (-90, 90), 'Longitude': (-180, 180), 'Magnitude': (0, 10)},
+                                   empty_fields=[])
+
     # Check for missing values in the 'Latitude', 'Longitude', and 'Magnitude' columns
-    if data[['Latitude', 'Longitude', 'Magnitude']].isnull().any().any():
+    if 'missing' in violations:
         is_valid = False
-        error_message += 'Data must include "Latitude", "Longitude", and "Magnitude" fields' + '\n'
+        error_message += 'Data must include "Latitude", "Longitude", and "Magnitude" fields' + format_rows(violations['missing']) + '\n'
 
     # Check for out-of-range latitude and longitude values
-    invalid_latitude = data[(data['Latitude'] < -90) | (data['Latitude'] > 90)]
-    invalid_longitude = data[(data['Longitude'] < -180) | (data['Longitude'] > 180)]
-
-    if not invalid_latitude.empty or not invalid_longitude.empty:
-        is_valid = False
-        error_message += 'Invalid data found in "Latitude" and/or "Longitude" fields' + '\n' 
+    for field in ['Latitude', 'Longitude']:
+        if field in violations:
+            is_valid = False
+            error_message += f'Invalid data found in "{field}" field' + format_rows(violations[field]) + '\n'
 
     # Check for valid Magnitude values (adjust range as per your data specifics)
-    invalid_magnitude = data[(data['Magnitude'] < 0) | (data['Magnitude'] > 10)]
-    if not invalid_magnitude.empty:
+    if 'Magnitude' in violations:
         is_valid = False
-        error_message += 'Invalid data found in "Magnitude" field' + '\n'
+        error_message += 'Invalid data found in "Magnitude" field' + format_rows(violations['Magnitude']) + '\n'
 
     # Check for unique records
-    if not data.drop_duplicates().shape[0] == data.shape[0]:
+    if 'duplicate' in violations:
         is_valid = False
-        error_message += 'Data contains duplicate records' + '\n'
+        error_message += 'Data contains duplicate records' + format_rows(violations['duplicate']) + '\n'
 
     # Check for empty records
-    if data.empty:
+    if n_rows == 0:
         is_valid = False
         error_message += 'Data should not be empty' + '\n'
 
     return is_valid, error_message
-
-
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, text
+
+import pytest
+import sys
+import os
+
+# Tests import the package as src, like the driver program
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if TOP_DIR not in sys.path:
+    sys.path.insert(0, TOP_DIR)
+
+
+@pytest.fixture
+def engine():
+    """
+    Connects to the PostgreSQL database at TEST_DATABASE_URL (any local instance will do, e.g.
+    postgresql+psycopg2://postgres@/postgres?host=/tmp/pgdata). Tests using it are skipped if unset.
+    """
+
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
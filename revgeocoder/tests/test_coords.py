@@ -0,0 +1,29 @@
+import numpy as np
+
+from src.core.coords import extract_coordinates, open_coordinates, count_rows
+
+
+"""
+Constants
+"""
+# Quoted line breaks, a blank line between rows and trailing blank lines: 4 rows, 11 line breaks
+TRICKY_CSV = 'Latitude,Longitude,Place\n1,2,"multi\nline"\n\n3,4,x\n5,6,"a\n\nb"\n7,8,y\n\n\n'
+
+
+def test_count_rows_parses_csv(tmp_path):
+    fpath = tmp_path / 'in.csv'
+    fpath.write_text(TRICKY_CSV)
+
+    assert count_rows(str(fpath), 'CSV', chunk_size=2) == 4
+
+
+def test_extract_coordinates_from_tricky_csv(tmp_path):
+    fpath = tmp_path / 'in.csv'
+    fpath.write_text(TRICKY_CSV)
+
+    assert extract_coordinates(str(fpath), 'CSV', coords_dir=str(tmp_path / 'memmap'), chunk_size=2) == 4
+
+    latitudes, longitudes, row_ids = open_coordinates(str(tmp_path / 'memmap'))
+    assert np.array_equal(latitudes, [1, 3, 5, 7])
+    assert np.array_equal(longitudes, [2, 4, 6, 8])
+    assert np.array_equal(row_ids, [0, 1, 2, 3])
@@ -0,0 +1,53 @@
+from sqlalchemy import text
+
+import pytest
+
+from src.utils.database import inspect_database, quote_identifier, execute_queries, get_table_comment, set_table_comment
+
+
+"""
+Constants
+"""
+# Names that only work as quoted identifiers
+TABLE_NAMES = ['test_inspect Weird "T"', 'Test_Inspect_MixedCase']
+
+
+@pytest.fixture
+def tables(engine):
+    with engine.begin() as connection:
+        for i, table_name in enumerate(TABLE_NAMES):
+            connection.execute(text(f'DROP TABLE IF EXISTS {quote_identifier(table_name)};'))
+            connection.execute(text(f'CREATE TABLE {quote_identifier(table_name)} (value INTEGER);'))
+            connection.execute(text(f'INSERT INTO {quote_identifier(table_name)} SELECT generate_series(1, {i + 2});'))
+    yield engine
+    with engine.begin() as connection:
+        for table_name in TABLE_NAMES:
+            connection.execute(text(f'DROP TABLE IF EXISTS {quote_identifier(table_name)};'))
+
+
+def test_quote_identifier():
+    assert quote_identifier('plain') == '"plain"'
+    assert quote_identifier('a "b"') == '"a ""b"""'
+
+
+def test_inspect_database_quotes_names_and_reports_missing_tables(tables, capsys):
+    reports = inspect_database(tables, table_names=TABLE_NAMES + ['no_such_table; DROP TABLE x'], n_rows=5)
+
+    assert sorted(reports) == sorted(TABLE_NAMES)
+    assert 'Preview (2 rows' in reports[TABLE_NAMES[0]]
+    assert 'Preview (3 rows' in reports[TABLE_NAMES[1]]
+    assert "No such tables in the public schema: ['no_such_table; DROP TABLE x']" in capsys.readouterr().out
+
+
+def test_table_comment_round_trip(engine):
+    execute_queries(['DROP TABLE IF EXISTS test_comment;', 'CREATE TABLE test_comment (value INTEGER);'], engine)
+    try:
+        assert get_table_comment('test_comment', engine) is None
+
+        comment = '{"bundle": "sha256:ab\'c", "tier": "full"}'
+        set_table_comment('test_comment', comment, engine)
+        assert get_table_comment('test_comment', engine) == comment
+    finally:
+        execute_queries(['DROP TABLE IF EXISTS test_comment;'], engine)
+
+    assert get_table_comment('test_comment', engine) is None
@@ -0,0 +1,6 @@
+from src.utils.importtime import measure_imports, check_startup, PATH_MODULES, ENTRY_MODULE
+
+
+def test_startup_and_code_paths_defer_heavy_modules():
+    for module in [ENTRY_MODULE] + list(PATH_MODULES.values()):
+        assert check_startup(measure_imports(module, n_runs=1), module=module, budget_ms=0) == []
@@ -0,0 +1,22 @@
+import urllib.request
+
+from src.utils.progress import ProgressReporter, format_duration, _start_metrics_server, METRICS_HOST
+
+
+def test_format_duration_keeps_days():
+    assert format_duration(0) == '00:00:00'
+    assert format_duration(5 * 3600 + 2 * 60 + 9.7) == '05:02:09'
+    assert format_duration(3 * 86400 + 5 * 3600 + 2 * 60 + 9) == '3d 05:02:09'
+
+
+def test_metrics_served_on_loopback_by_default():
+    reporter = ProgressReporter(total_rows=10, status_fpath=None, metrics_port=0)
+    server = _start_metrics_server(reporter, METRICS_HOST, 0)
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/') as response:
+            assert 'revgeocoder_rows_expected 10' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,65 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from src.core.shared import GeometryView, publish_boundaries, DECODED_BYTES_PER_WKB_BYTE
+from src.core.coords import geocode_memmap_parallel, LATITUDE_FNAME, LONGITUDE_FNAME, ROW_ID_FNAME
+from src.core.bstore import BoundaryStore
+
+
+"""
+Helpers
+"""
+def make_view(geometries, cache_mb):
+    wkbs = shapely.to_wkb(geometries)
+    offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+    np.cumsum([len(wkb) for wkb in wkbs], out=offsets[1:])
+
+    return GeometryView(np.frombuffer(b''.join(wkbs), dtype=np.uint8), offsets, cache_mb=cache_mb), offsets
+
+
+def test_cache_is_capped_by_bytes():
+    boxes = [shapely.box(i, 0, i + 1, 1) for i in range(3)]
+    view, offsets = make_view(boxes, cache_mb=0)
+    entry_bytes = (offsets[1] - offsets[0]) * DECODED_BYTES_PER_WKB_BYTE
+    view.cache_bytes = 2 * entry_bytes
+
+    for i in range(3):
+        assert view[i].equals(boxes[i])
+
+    # The least recently used geometry went once a third one was decoded
+    assert list(view._cache) == [1, 2]
+    assert view.cached_bytes == 2 * entry_bytes
+
+    view[1]
+    view[0]
+    assert list(view._cache) == [1, 0]
+
+
+def test_oversized_geometry_is_kept_alone():
+    boxes = [shapely.box(i, 0, i + 1, 1) for i in range(2)]
+    view, _ = make_view(boxes, cache_mb=0)
+
+    view[0]
+    view[1]
+    assert list(view._cache) == [1]
+    assert view[1] is view[1]
+
+
+def test_parallel_geocoding_splits_the_cache(tmp_path, capsys):
+    boxes = [shapely.box(x, y, x + 1, y + 1) for x in range(3) for y in range(3)]
+    boundaries_gdf = gpd.GeoDataFrame({'name': [f'p{i}' for i in range(9)], 'admin': ['A'] * 9, 'TERRAIN': ['LAND'] * 9}, geometry=boxes)
+    shared_dir = publish_boundaries(BoundaryStore(boundaries_gdf), str(tmp_path / 'shared'))
+
+    coords_dir = tmp_path / 'memmap'
+    coords_dir.mkdir()
+    longitudes = np.array([0.5, 1.5, 2.5, 0.5, 2.5])
+    latitudes = np.array([0.5, 0.5, 2.5, 1.5, 0.5])
+    np.save(coords_dir / LATITUDE_FNAME, latitudes)
+    np.save(coords_dir / LONGITUDE_FNAME, longitudes)
+    np.save(coords_dir / ROW_ID_FNAME, np.arange(len(latitudes)))
+
+    location_ids = geocode_memmap_parallel(shared_dir, coords_dir=str(coords_dir), n_workers=2, slice_size=2, cache_mb=8)
+
+    assert list(location_ids) == [0, 3, 8, 1, 6]
+    assert '(4 MB geometry cache each)' in capsys.readouterr().out
@@ -0,0 +1,138 @@
+from sqlalchemy import text
+
+import numpy as np
+import pytest
+
+from src.core.workqueue import create_work_queue, claim_range, complete_range, get_queue_status, get_job, is_new_job, mark_exported
+from src.utils.database import create_location_view
+from src.utils.fileio import export_table, ChunkWriter
+from src.utils.exceptions import LeaseLostError
+
+
+"""
+Constants
+"""
+DATA_TABLE_NAME = 'test_wq_data'
+QUEUE_TABLE_NAME = 'test_wq_queue'
+LOCATIONS_TABLE_NAME = 'test_wq_locations'
+VIEW_NAME = 'test_wq_located'
+JOB_TABLE_NAME = 'test_wq_queue_job'
+FINGERPRINT = '{"input": "in.csv"}'
+
+
+def _sql(engine, query):
+    with engine.begin() as connection:
+        result = connection.execute(text(query))
+        return result.fetchall() if result.returns_rows else None
+
+
+@pytest.fixture
+def queue(engine):
+    """
+    Queues a 25-row data table in ranges of 10 rows.
+    """
+
+    _sql(engine, f'DROP VIEW IF EXISTS {VIEW_NAME};')
+    _sql(engine, f'DROP TABLE IF EXISTS {DATA_TABLE_NAME}, {QUEUE_TABLE_NAME}, {JOB_TABLE_NAME}, {LOCATIONS_TABLE_NAME};')
+    _sql(engine, f'CREATE TABLE {DATA_TABLE_NAME} (id TEXT, latitude DOUBLE PRECISION, longitude DOUBLE PRECISION, location_id INTEGER);')
+    _sql(engine, f"INSERT INTO {DATA_TABLE_NAME} SELECT 'q' || g, g, g, NULL FROM generate_series(0, 24) g;")
+    _sql(engine, f'CREATE TABLE {LOCATIONS_TABLE_NAME} (id INTEGER, province TEXT, country TEXT);')
+    _sql(engine, f"INSERT INTO {LOCATIONS_TABLE_NAME} VALUES (1, 'P1', 'C1'), (2, 'P2', 'C2');")
+
+    assert create_work_queue(DATA_TABLE_NAME, QUEUE_TABLE_NAME, engine, range_size=10, fingerprint=FINGERPRINT) == 3
+    yield engine
+
+    _sql(engine, f'DROP VIEW IF EXISTS {VIEW_NAME};')
+    _sql(engine, f'DROP TABLE IF EXISTS {DATA_TABLE_NAME}, {QUEUE_TABLE_NAME}, {JOB_TABLE_NAME}, {LOCATIONS_TABLE_NAME};')
+
+
+def _complete(engine, work_item, location_id, worker_id):
+    range_id, start_id, end_id = work_item
+    row_ids = np.arange(start_id, end_id)
+    complete_range(range_id, row_ids, np.full(len(row_ids), location_id), DATA_TABLE_NAME, QUEUE_TABLE_NAME, engine, worker_id)
+
+
+def _finish(engine, worker_id='A'):
+    while (work_item := claim_range(QUEUE_TABLE_NAME, engine, worker_id)) is not None:
+        _complete(engine, work_item, 1, worker_id)
+
+
+def test_workers_claim_distinct_ranges(queue):
+    claimed = [claim_range(QUEUE_TABLE_NAME, queue, f'worker-{i}') for i in range(4)]
+
+    assert sorted(w[0] for w in claimed[:3]) == [1, 2, 3]
+    assert claimed[3] is None
+    assert get_queue_status(QUEUE_TABLE_NAME, queue) == {'running': 3}
+
+
+def test_expired_lease_is_reclaimed_and_stale_worker_is_rejected(queue):
+    work_item = claim_range(QUEUE_TABLE_NAME, queue, 'A')
+    _sql(queue, f"UPDATE {QUEUE_TABLE_NAME} SET lease_expires = now() - interval '1 second' WHERE range_id = {work_item[0]};")
+
+    assert claim_range(QUEUE_TABLE_NAME, queue, 'B') == work_item
+
+    # A lost the range: nothing it computed is written
+    with pytest.raises(LeaseLostError):
+        _complete(queue, work_item, 1, 'A')
+    assert _sql(queue, f'SELECT count(location_id) FROM {DATA_TABLE_NAME};')[0][0] == 0
+
+    _complete(queue, work_item, 2, 'B')
+    assert _sql(queue, f'SELECT DISTINCT location_id FROM {DATA_TABLE_NAME} WHERE location_id IS NOT NULL;') == [(2,)]
+
+    # A completed range cannot be completed again
+    with pytest.raises(LeaseLostError):
+        _complete(queue, work_item, 1, 'B')
+    assert _sql(queue, f'SELECT DISTINCT location_id FROM {DATA_TABLE_NAME} WHERE location_id IS NOT NULL;') == [(2,)]
+
+
+def test_export_excludes_row_id_and_keeps_input_order(queue, tmp_path):
+    _finish(queue)
+    assert get_queue_status(QUEUE_TABLE_NAME, queue) == {'done': 3}
+
+    create_location_view(DATA_TABLE_NAME, locations_table_name=LOCATIONS_TABLE_NAME, view_name=VIEW_NAME, engine=queue)
+    output_fpath = str(tmp_path / 'located.csv')
+    with ChunkWriter(output_fpath, 'CSV') as writer:
+        export_table(VIEW_NAME, engine=queue, writer=writer, chunk_size=7, order_field='row_id', exclude_fields=['row_id'])
+
+    with open(output_fpath) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'id,latitude,longitude,province,country'
+    assert [line.split(',')[0] for line in lines[1:]] == [f'q{i}' for i in range(25)]
+
+
+def test_rerun_after_export_starts_a_new_job(queue):
+    assert get_job('no_such_queue', queue) is None
+    assert is_new_job(None, FINGERPRINT, QUEUE_TABLE_NAME)
+
+    # Containers join an unfinished job for the same input
+    assert not is_new_job(get_job(QUEUE_TABLE_NAME, queue), FINGERPRINT, QUEUE_TABLE_NAME)
+
+    # Finished but not exported (e.g. the exporting container died): joined, then exported
+    _finish(queue)
+    job = get_job(QUEUE_TABLE_NAME, queue)
+    assert (job['open_ranges'], job['exported_at']) == (0, None)
+    assert not is_new_job(job, FINGERPRINT, QUEUE_TABLE_NAME)
+
+    # Exported: a rerun over the same input is a new job, and the queue is rebuilt
+    mark_exported(QUEUE_TABLE_NAME, queue)
+    assert is_new_job(get_job(QUEUE_TABLE_NAME, queue), FINGERPRINT, QUEUE_TABLE_NAME)
+    assert create_work_queue(DATA_TABLE_NAME, QUEUE_TABLE_NAME, queue, range_size=10, fingerprint=FINGERPRINT) == 3
+    job = get_job(QUEUE_TABLE_NAME, queue)
+    assert (job['open_ranges'], job['exported_at'], job['fingerprint']) == (3, None, FINGERPRINT)
+
+
+def test_job_for_other_input_is_replaced_once_idle(queue):
+    work_item = claim_range(QUEUE_TABLE_NAME, queue, 'A')
+
+    with pytest.raises(ValueError, match='being geocoded'):
+        is_new_job(get_job(QUEUE_TABLE_NAME, queue), '{"input": "other.csv"}', QUEUE_TABLE_NAME)
+
+    _sql(queue, f"UPDATE {QUEUE_TABLE_NAME} SET lease_expires = now() - interval '1 second' WHERE range_id = {work_item[0]};")
+    assert is_new_job(get_job(QUEUE_TABLE_NAME, queue), '{"input": "other.csv"}', QUEUE_TABLE_NAME)
+
+
+def test_queue_without_job_record_is_reported(queue):
+    _sql(queue, f'DROP TABLE {JOB_TABLE_NAME};')
+
+    with pytest.raises(ValueError, match='does not record its job'):
+        is_new_job(get_job(QUEUE_TABLE_NAME, queue), FINGERPRINT, QUEUE_TABLE_NAME)
@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# Modules shared by both packages. The revgeocoder copy is the single source; the econbot copy is
+# overwritten from it. With --check, nothing is written and the script fails if a copy is stale.
+VENDORED_MODULES="src/utils/scan.py"
+
+cd "$(dirname "$0")"
+
+status=0
+for module in $VENDORED_MODULES; do
+    if [ "$1" == "--check" ]; then
+        if ! cmp -s "revgeocoder/$module" "econbot/$module"; then
+            echo "Error: econbot/$module differs from revgeocoder/$module. Run $0 to sync it."
+            status=1
+        fi
+    else
+        cp "revgeocoder/$module" "econbot/$module"
+        echo "Synced econbot/$module from revgeocoder/$module"
+    fi
+done
+
+exit $status